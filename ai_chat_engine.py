@@ -6,10 +6,14 @@ Supports multiple AI providers: OpenAI, Google Gemini, Anthropic Claude
 """
 
 import os
+import re
 import json
+import atexit
 import requests
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+from ai_payloads import PayloadEncoder
+from usage_tracker import UsageTracker
 
 class AIConfig:
     """Configuration for AI providers"""
@@ -17,20 +21,66 @@ class AIConfig:
     # OpenAI Configuration
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+    OPENAI_CHEAP_MODEL = os.environ.get('OPENAI_CHEAP_MODEL', 'gpt-4o-mini')
+    OPENAI_STRONG_MODEL = os.environ.get('OPENAI_STRONG_MODEL', 'gpt-4o')
     OPENAI_URL = 'https://api.openai.com/v1/chat/completions'
     
     # Google Gemini Configuration
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-pro')
-    GEMINI_URL = f'https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent'
+    GEMINI_CHEAP_MODEL = os.environ.get('GEMINI_CHEAP_MODEL', 'gemini-1.5-flash')
+    GEMINI_STRONG_MODEL = os.environ.get('GEMINI_STRONG_MODEL', 'gemini-1.5-pro')
+    GEMINI_URL_TEMPLATE = 'https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent'
+    GEMINI_URL = GEMINI_URL_TEMPLATE.format(model=GEMINI_MODEL)
     
     # Anthropic Claude Configuration
     CLAUDE_API_KEY = os.environ.get('CLAUDE_API_KEY')
     CLAUDE_MODEL = os.environ.get('CLAUDE_MODEL', 'claude-3-haiku-20240307')
+    CLAUDE_CHEAP_MODEL = os.environ.get('CLAUDE_CHEAP_MODEL', 'claude-3-haiku-20240307')
+    CLAUDE_STRONG_MODEL = os.environ.get('CLAUDE_STRONG_MODEL', 'claude-3-5-sonnet-20241022')
     CLAUDE_URL = 'https://api.anthropic.com/v1/messages'
     
     # Default provider priority
     DEFAULT_PROVIDER = os.environ.get('AI_PROVIDER', 'openai')  # openai, gemini, claude
+    
+    # Usage accounting and budgets (USD, 0 = unlimited)
+    USAGE_LOG = os.environ.get('AI_USAGE_LOG', 'ai_usage.jsonl')
+    USAGE_FLUSH_SECONDS = int(os.environ.get('AI_USAGE_FLUSH_SECONDS', '60'))
+    USER_DAILY_BUDGET = float(os.environ.get('AI_USER_DAILY_BUDGET_USD', '0'))
+    DAILY_BUDGET = float(os.environ.get('AI_DAILY_BUDGET_USD', '0'))
+    BUDGET_DEGRADE_RATIO = float(os.environ.get('AI_BUDGET_DEGRADE_RATIO', '0.8'))
+    
+    # Model cascade: answer with the cheap model (*_CHEAP_MODEL), escalate to the strong one
+    CASCADE_ENABLED = os.environ.get('AI_CASCADE', 'false').lower() == 'true'
+    CASCADE_POLICY = os.environ.get('AI_CASCADE_POLICY')  # JSON overrides per intent
+
+# Intent keywords (same vocabulary as the fallback responses), most specific first
+INTENT_KEYWORDS = {
+    'appointment': ['תור', 'זמן', 'פגישה', 'לקבוע'],
+    'price': ['מחיר', 'עלות', 'כמה', 'עולה'],
+    'location': ['כתובת', 'איפה', 'מיקום', 'נמצא'],
+    'hours': ['שעות', 'פתוח', 'סגור', 'מתי'],
+    'greeting': ['שלום', 'היי', 'בוקר', 'ערב'],
+    'thanks': ['תודה', 'תנקיו'],
+}
+
+# Per-intent cascade policy. `required` lists fact groups; each group needs one match.
+DEFAULT_CASCADE_POLICY = {
+    'greeting': {'escalate': False},
+    'thanks': {'escalate': False},
+    'appointment': {'escalate': True, 'min_length': 40, 'required': [['03-1234567', 'טלפון', 'תור']]},
+    'price': {'escalate': True, 'min_length': 40, 'required': [['03-1234567', '₪', 'מחיר', 'עלות']]},
+    'location': {'escalate': True, 'min_length': 20, 'required': [['הרופאים', 'תל אביב']]},
+    'hours': {'escalate': True, 'min_length': 20, 'required': [['8:00', '08:00', '18:00']]},
+    'general': {'escalate': True, 'min_length': 30},
+}
+
+# Replies that decline or deflect instead of answering
+REFUSAL_PATTERN = re.compile(
+    r"אני לא יכול|אינני יכול|לא אוכל|אין לי מידע|אני לא יודע|"
+    r"I can't|I cannot|I'm sorry|as an AI",
+    re.IGNORECASE
+)
 
 class VIVClinicAI:
     """AI Chat Engine for VIV Clinic Bot"""
@@ -38,6 +88,7 @@ class VIVClinicAI:
     def __init__(self):
         self.config = AIConfig()
         self.conversation_history = {}
+        self.gemini_contents = {}
         
         # VIV Clinic context and personality
         self.system_prompt = """
@@ -67,6 +118,30 @@ class VIVClinicAI:
 חשוב: תמיד תענה בעברית, תהיה מועיל ומקצועי.
 """
         
+        # Static Gemini request parts - the system prompt is sent as systemInstruction
+        self.gemini_system_instruction = {'parts': [{'text': self.system_prompt}]}
+        self.gemini_generation_config = {
+            'temperature': 0.7,
+            'maxOutputTokens': 500
+        }
+        
+        # Request body encoders per (provider, model), built on first use
+        self._encoders = {}
+        
+        # Token and cost accounting with per-user and per-day budgets
+        self.usage = UsageTracker(
+            log_file=self.config.USAGE_LOG,
+            flush_interval=self.config.USAGE_FLUSH_SECONDS,
+            user_daily_budget=self.config.USER_DAILY_BUDGET,
+            daily_budget=self.config.DAILY_BUDGET,
+            degrade_ratio=self.config.BUDGET_DEGRADE_RATIO
+        )
+        atexit.register(self.usage.flush)
+        
+        # Cascade policy per intent and how often each intent escalated
+        self.cascade_policy = self._load_cascade_policy()
+        self.cascade_stats = {}
+        
         # Check which AI provider is available
         self.available_providers = self._check_available_providers()
         self.active_provider = self._select_provider()
@@ -117,33 +192,87 @@ class VIVClinicAI:
             'content': content,
             'timestamp': datetime.now().isoformat()
         })
+        
+        # Maintain the Gemini `contents` window incrementally (same 10-message context)
+        contents = self.gemini_contents.setdefault(user_id, [])
+        contents.append({
+            'role': 'user' if role == 'user' else 'model',
+            'parts': [{'text': content}]
+        })
+        if len(contents) > 10:
+            del contents[:-10]
     
-    def _call_openai(self, messages: List[Dict]) -> str:
+    def _get_gemini_contents(self, user_id: str) -> List[Dict]:
+        """Get the Gemini multi-turn context, starting with a user turn"""
+        contents = self.gemini_contents.get(user_id, [])
+        if contents and contents[0]['role'] == 'model':
+            return contents[1:]
+        return contents
+    
+    def _get_model(self, provider: str, tier: str = 'default') -> str:
+        """Get a provider's model for a tier: 'default', 'cheap' or 'strong'"""
+        prefix = {'openai': 'OPENAI', 'gemini': 'GEMINI'}.get(provider, 'CLAUDE')
+        suffix = {'cheap': '_CHEAP_MODEL', 'strong': '_STRONG_MODEL'}.get(tier, '_MODEL')
+        return getattr(self.config, prefix + suffix)
+    
+    def _get_encoder(self, provider: str, model: str) -> PayloadEncoder:
+        """Get the cached request body encoder for a provider/model"""
+        key = (provider, model)
+        encoder = self._encoders.get(key)
+        if encoder is not None:
+            return encoder
+        
+        if provider == 'openai':
+            encoder = PayloadEncoder(
+                {'model': model, 'max_tokens': 500, 'temperature': 0.7},
+                'messages',
+                leading_items=[{'role': 'system', 'content': self.system_prompt}]
+            )
+        elif provider == 'gemini':
+            encoder = PayloadEncoder(
+                {
+                    'systemInstruction': self.gemini_system_instruction,
+                    'generationConfig': self.gemini_generation_config
+                },
+                'contents'
+            )
+        else:
+            encoder = PayloadEncoder(
+                {'model': model, 'max_tokens': 500, 'system': self.system_prompt},
+                'messages'
+            )
+        
+        self._encoders[key] = encoder
+        return encoder
+    
+    def _call_openai(self, messages: List[Dict], model: Optional[str] = None,
+                     user_id: str = 'unknown') -> str:
         """Call OpenAI GPT API"""
+        model = model or self.config.OPENAI_MODEL
         try:
             headers = {
                 'Authorization': f'Bearer {self.config.OPENAI_API_KEY}',
                 'Content-Type': 'application/json'
             }
             
-            data = {
-                'model': self.config.OPENAI_MODEL,
-                'messages': [
-                    {'role': 'system', 'content': self.system_prompt}
-                ] + messages,
-                'max_tokens': 500,
-                'temperature': 0.7
-            }
+            data = self._get_encoder('openai', model).encode(messages)
             
             response = requests.post(
                 self.config.OPENAI_URL,
                 headers=headers,
-                json=data,
+                data=data,
                 timeout=30
             )
             
             if response.status_code == 200:
                 result = response.json()
+                usage = result.get('usage', {})
+                self.usage.record(
+                    'openai', model, user_id,
+                    usage.get('prompt_tokens', 0),
+                    usage.get('completion_tokens', 0),
+                    (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+                )
                 return result['choices'][0]['message']['content'].strip()
             else:
                 print(f"❌ OpenAI API error: {response.status_code} - {response.text}")
@@ -153,35 +282,35 @@ class VIVClinicAI:
             print(f"❌ OpenAI error: {e}")
             return None
     
-    def _call_gemini(self, messages: List[Dict]) -> str:
-        """Call Google Gemini API"""
+    def _call_gemini(self, contents: List[Dict], model: Optional[str] = None,
+                     user_id: str = 'unknown') -> str:
+        """Call Google Gemini API with native multi-turn contents"""
+        model = model or self.config.GEMINI_MODEL
         try:
-            # Convert messages to Gemini format
-            prompt_parts = [self.system_prompt]
-            for msg in messages:
-                role_prefix = "משתמש: " if msg['role'] == 'user' else "בוט: "
-                prompt_parts.append(f"{role_prefix}{msg['content']}")
-            
-            full_prompt = "\n\n".join(prompt_parts)
-            
-            data = {
-                'contents': [{
-                    'parts': [{'text': full_prompt}]
-                }],
-                'generationConfig': {
-                    'temperature': 0.7,
-                    'maxOutputTokens': 500
-                }
+            headers = {
+                'Content-Type': 'application/json'
             }
             
+            # The system prompt goes out as systemInstruction, cached in the encoder
+            data = self._get_encoder('gemini', model).encode(contents)
+            url = self.config.GEMINI_URL_TEMPLATE.format(model=model)
+            
             response = requests.post(
-                f"{self.config.GEMINI_URL}?key={self.config.GEMINI_API_KEY}",
-                json=data,
+                f"{url}?key={self.config.GEMINI_API_KEY}",
+                headers=headers,
+                data=data,
                 timeout=30
             )
             
             if response.status_code == 200:
                 result = response.json()
+                usage = result.get('usageMetadata', {})
+                self.usage.record(
+                    'gemini', model, user_id,
+                    usage.get('promptTokenCount', 0),
+                    usage.get('candidatesTokenCount', 0),
+                    usage.get('cachedContentTokenCount', 0)
+                )
                 return result['candidates'][0]['content']['parts'][0]['text'].strip()
             else:
                 print(f"❌ Gemini API error: {response.status_code} - {response.text}")
@@ -191,8 +320,10 @@ class VIVClinicAI:
             print(f"❌ Gemini error: {e}")
             return None
     
-    def _call_claude(self, messages: List[Dict]) -> str:
+    def _call_claude(self, messages: List[Dict], model: Optional[str] = None,
+                     user_id: str = 'unknown') -> str:
         """Call Anthropic Claude API"""
+        model = model or self.config.CLAUDE_MODEL
         try:
             headers = {
                 'x-api-key': self.config.CLAUDE_API_KEY,
@@ -200,30 +331,26 @@ class VIVClinicAI:
                 'anthropic-version': '2023-06-01'
             }
             
-            # Convert messages to Claude format
-            claude_messages = []
-            for msg in messages:
-                claude_messages.append({
-                    'role': msg['role'],
-                    'content': msg['content']
-                })
-            
-            data = {
-                'model': self.config.CLAUDE_MODEL,
-                'max_tokens': 500,
-                'system': self.system_prompt,
-                'messages': claude_messages
-            }
+            # Messages are already in Claude's role/content format
+            data = self._get_encoder('claude', model).encode(messages)
             
             response = requests.post(
                 self.config.CLAUDE_URL,
                 headers=headers,
-                json=data,
+                data=data,
                 timeout=30
             )
             
             if response.status_code == 200:
                 result = response.json()
+                usage = result.get('usage', {})
+                cached_tokens = usage.get('cache_read_input_tokens', 0)
+                self.usage.record(
+                    'claude', model, user_id,
+                    usage.get('input_tokens', 0) + cached_tokens,
+                    usage.get('output_tokens', 0),
+                    cached_tokens
+                )
                 return result['content'][0]['text'].strip()
             else:
                 print(f"❌ Claude API error: {response.status_code} - {response.text}")
@@ -259,6 +386,83 @@ class VIVClinicAI:
         else:
             return "תודה על פנייתכם ל-VIV Clinic! 🏥 נציג שלנו יחזור אליכם בהקדם. לשירות מיידי: 03-1234567"
     
+    def _call_provider(self, provider: str, model: str, user_id: str,
+                       api_messages: List[Dict]) -> Optional[str]:
+        """Call one provider/model with the user's current context"""
+        if provider == 'openai':
+            return self._call_openai(api_messages, model, user_id)
+        elif provider == 'gemini':
+            return self._call_gemini(self._get_gemini_contents(user_id), model, user_id)
+        elif provider == 'claude':
+            return self._call_claude(api_messages, model, user_id)
+        return None
+    
+    def _load_cascade_policy(self) -> Dict:
+        """Get the cascade policy, with per-intent overrides from AI_CASCADE_POLICY"""
+        policy = {intent: dict(rules) for intent, rules in DEFAULT_CASCADE_POLICY.items()}
+        if self.config.CASCADE_POLICY:
+            try:
+                for intent, rules in json.loads(self.config.CASCADE_POLICY).items():
+                    policy.setdefault(intent, {}).update(rules)
+            except (ValueError, AttributeError) as e:
+                print(f"⚠️ Invalid AI_CASCADE_POLICY, using defaults: {e}")
+        return policy
+    
+    def _detect_intent(self, text: str) -> str:
+        """Detect the message intent with the fallback keyword lists"""
+        text_lower = text.lower()
+        for intent, keywords in INTENT_KEYWORDS.items():
+            if any(word in text_lower for word in keywords):
+                return intent
+        return 'general'
+    
+    def _confidence_issues(self, response: str, intent: str, policy: Dict) -> List[str]:
+        """Cheap checks on a fast-model reply; any issue means it should escalate"""
+        issues = []
+        
+        if len(response) < policy.get('min_length', 0):
+            issues.append('too_short')
+        
+        if REFUSAL_PATTERN.search(response):
+            issues.append('refusal')
+        
+        for facts in policy.get('required', []):
+            if not any(fact in response for fact in facts):
+                issues.append('missing_facts')
+                break
+        
+        # The reply is about a different topic than the question
+        reply_intent = self._detect_intent(response)
+        if intent != 'general' and reply_intent not in (intent, 'general', 'greeting', 'thanks'):
+            if not any(word in response for word in INTENT_KEYWORDS[intent]):
+                issues.append('intent_mismatch')
+        
+        return issues
+    
+    def _cascade_response(self, provider: str, user_id: str, message: str,
+                          api_messages: List[Dict]) -> Optional[str]:
+        """Answer with the cheap model and escalate to the strong model if needed
+
+        Usage is recorded per model, so each tier's cost shows up under its own model.
+        """
+        intent = self._detect_intent(message)
+        policy = self.cascade_policy.get(intent, self.cascade_policy['general'])
+        stats = self.cascade_stats.setdefault(intent, {'fast': 0, 'escalated': 0, 'reasons': {}})
+        
+        response = self._call_provider(provider, self._get_model(provider, 'cheap'), user_id, api_messages)
+        issues = self._confidence_issues(response, intent, policy) if response else ['no_response']
+        
+        if not issues or not policy.get('escalate', True):
+            stats['fast'] += 1
+            return response
+        
+        stats['escalated'] += 1
+        for issue in issues:
+            stats['reasons'][issue] = stats['reasons'].get(issue, 0) + 1
+        
+        strong_response = self._call_provider(provider, self._get_model(provider, 'strong'), user_id, api_messages)
+        return strong_response or response
+    
     def generate_response(self, user_id: str, message: str) -> Tuple[str, bool]:
         """
         Generate AI response to user message
@@ -280,15 +484,19 @@ class VIVClinicAI:
                         'content': msg['content']
                     })
             
-            # Try AI providers
+            # Enforce budgets: degrade to a cheaper model, then to the fallback
             response = None
+            budget = self.usage.budget_state(user_id)
             
-            if self.active_provider == 'openai':
-                response = self._call_openai(api_messages)
-            elif self.active_provider == 'gemini':
-                response = self._call_gemini(api_messages)
-            elif self.active_provider == 'claude':
-                response = self._call_claude(api_messages)
+            if budget == 'exhausted':
+                print(f"⚠️ AI budget exhausted for {user_id}, using fallback")
+            elif self.active_provider != 'fallback':
+                if self.config.CASCADE_ENABLED and budget == 'ok':
+                    response = self._cascade_response(self.active_provider, user_id, message, api_messages)
+                else:
+                    tier = 'cheap' if budget == 'degrade' else 'default'
+                    model = self._get_model(self.active_provider, tier)
+                    response = self._call_provider(self.active_provider, model, user_id, api_messages)
             
             # Use fallback if AI failed
             if not response:
@@ -306,10 +514,16 @@ class VIVClinicAI:
             print(f"❌ Error generating AI response: {e}")
             return self._fallback_response(message), False
     
+    def record_exchange(self, user_id: str, message: str, response: str):
+        """Record a message and a reply produced outside the engine (e.g. speculative)"""
+        self._save_message(user_id, 'user', message)
+        self._save_message(user_id, 'assistant', response)
+    
     def clear_conversation(self, user_id: str):
         """Clear conversation history for user"""
         if user_id in self.conversation_history:
             del self.conversation_history[user_id]
+        self.gemini_contents.pop(user_id, None)
     
     def get_conversation_summary(self, user_id: str) -> Dict:
         """Get conversation summary for analytics"""
@@ -320,7 +534,8 @@ class VIVClinicAI:
         return {
             'message_count': len(history),
             'last_interaction': history[-1]['timestamp'] if history else None,
-            'provider_used': self.active_provider
+            'provider_used': self.active_provider,
+            'usage_today': self.usage.user_summary(user_id)
         }
 
 # Global AI engine instance
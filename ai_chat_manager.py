@@ -9,6 +9,7 @@ import json
 import requests
 from typing import Dict, List, Optional
 from datetime import datetime
+from ai_payloads import PayloadEncoder
 
 class AIChatManager:
     def __init__(self):
@@ -44,6 +45,27 @@ class AIChatManager:
 5. תמיד היה חיובי ומועיל
 """
 
+        # Static parts of every Gemini request - built once, reused per call
+        self.system_instruction = {"parts": [{"text": self.system_prompt}]}
+        self.generation_config = {
+            "temperature": 0.7,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 200
+        }
+
+        # Serialized once; each request only encodes its `contents`
+        self.gemini_encoder = PayloadEncoder(
+            {
+                "systemInstruction": self.system_instruction,
+                "generationConfig": self.generation_config
+            },
+            "contents"
+        )
+
+        # Per-user Gemini `contents` turns, maintained alongside the history
+        self.gemini_contents = {}
+
     def get_conversation_history(self, user_id: str) -> List[Dict]:
         """Get conversation history for a user"""
         if user_id not in self.conversations:
@@ -61,9 +83,31 @@ class AIChatManager:
             "timestamp": datetime.now().isoformat()
         })
         
+        # Mirror the turn in Gemini format so requests only append the new turn
+        contents = self.gemini_contents.setdefault(user_id, [])
+        contents.append({
+            "role": "user" if role == "user" else "model",
+            "parts": [{"text": content}]
+        })
+        
         # Keep only last 10 messages to avoid token limits
         if len(self.conversations[user_id]) > 10:
             self.conversations[user_id] = self.conversations[user_id][-10:]
+        if len(contents) > 10:
+            del contents[:-10]
+
+    def build_gemini_contents(self, user_message: str, user_id: str = "default") -> List[Dict]:
+        """Build the multi-turn Gemini contents for the next user message"""
+        # Last 5 turns for context; Gemini expects the first turn to be the user's
+        context = self.gemini_contents.get(user_id, [])[-5:]
+        if context and context[0]["role"] == "model":
+            context = context[1:]
+        
+        return context + [{"role": "user", "parts": [{"text": user_message}]}]
+
+    def encode_gemini_request(self, user_message: str, user_id: str = "default") -> bytes:
+        """Encode the Gemini request body for the next user message"""
+        return self.gemini_encoder.encode(self.build_gemini_contents(user_message, user_id))
 
     def generate_response(self, user_message: str, user_id: str = "default") -> str:
         """Generate AI response using Google Gemini"""
@@ -72,33 +116,8 @@ class AIChatManager:
             return self._fallback_response(user_message)
         
         try:
-            # Get conversation history
-            history = self.get_conversation_history(user_id)
-            
-            # Build conversation context
-            conversation_text = self.system_prompt + "\n\nהיסטוריית השיחה:\n"
-            
-            for msg in history[-5:]:  # Last 5 messages for context
-                role_hebrew = "לקוח" if msg["role"] == "user" else "עוזר"
-                conversation_text += f"{role_hebrew}: {msg['content']}\n"
-            
-            conversation_text += f"לקוח: {user_message}\nעוזר:"
-            
             # Prepare API request
-            payload = {
-                "contents": [{
-                    "parts": [{
-                        "text": conversation_text
-                    }]
-                }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 200,
-                    "stopSequences": ["לקוח:", "עוזר:"]
-                }
-            }
+            payload = self.encode_gemini_request(user_message, user_id)
             
             headers = {
                 "Content-Type": "application/json"
@@ -108,7 +127,7 @@ class AIChatManager:
             response = requests.post(
                 f"{self.base_url}?key={self.api_key}",
                 headers=headers,
-                json=payload,
+                data=payload,
                 timeout=10
             )
             
@@ -170,6 +189,7 @@ class AIChatManager:
         """Clear conversation history for a user"""
         if user_id in self.conversations:
             del self.conversations[user_id]
+        self.gemini_contents.pop(user_id, None)
 
     def get_conversation_summary(self, user_id: str) -> Dict:
         """Get conversation summary and statistics"""
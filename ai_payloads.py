@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+AI Payload Encoders for VIV Clinic Bot
+Pre-serialized JSON request bodies for the AI provider APIs
+
+The static part of a request (model, system prompt, generation config) is
+serialized once; each request only serializes its own messages.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+# Use orjson when it is installed, it is several times faster than json
+try:
+    import orjson
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    orjson = None
+    JSON_BACKEND = 'json'
+
+def dumps(obj) -> bytes:
+    """Serialize obj to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class PayloadEncoder:
+    """JSON request body with a cached static portion and one spliced list field"""
+
+    def __init__(self, static_fields: Dict, list_field: str, leading_items: Optional[List] = None):
+        # '{"model":...,"max_tokens":500' + ',"messages":['
+        static = dumps(static_fields)[:-1]
+        separator = b',' if static_fields else b''
+        self._head = static + separator + dumps(list_field) + b':['
+
+        # Items that open every list, e.g. the OpenAI system message
+        self._leading = dumps(leading_items or [])[1:-1]
+
+    def encode(self, items: List) -> bytes:
+        """Encode a full request body around the given list items"""
+        body = dumps(items)[1:-1]
+        if self._leading and body:
+            body = self._leading + b',' + body
+        elif self._leading:
+            body = self._leading
+        return self._head + body + b']}'
@@ -0,0 +1,1129 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for VIV Clinic Bot
+Micro-benchmarks for the bot's hot paths
+
+Usage:
+    python benchmarks.py              # List available benchmarks
+    python benchmarks.py <name> ...   # Run one or more benchmarks
+"""
+
+import json
+import sys
+import time
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a benchmark function under a command-line name"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+def _timeit(func, repeat=200):
+    """Return the average run time of func in microseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+def _sample_conversation(turns):
+    """Build a synthetic Hebrew conversation of user/assistant turns"""
+    user_messages = [
+        "שלום, אני רוצה לקבוע תור לטיפול שיניים",
+        "כמה עולה הלבנת שיניים?",
+        "איפה המרפאה נמצאת?",
+        "מתי אתם פתוחים בשבוע?",
+        "יש לכם מקום חניה?",
+    ]
+    bot_reply = "תודה על פנייתכם ל-VIV Clinic! 🏥 נציג שלנו יחזור אליכם בהקדם. לשירות מיידי: 03-1234567"
+    return [(user_messages[i % len(user_messages)], bot_reply) for i in range(turns)]
+
+def _legacy_gemini_prompt(system_prompt, history, user_message):
+    """The pre-multi-turn AIChatManager payload: one concatenated text part"""
+    conversation_text = system_prompt + "\n\nהיסטוריית השיחה:\n"
+    for msg in history[-5:]:
+        role_hebrew = "לקוח" if msg["role"] == "user" else "עוזר"
+        conversation_text += f"{role_hebrew}: {msg['content']}\n"
+    conversation_text += f"לקוח: {user_message}\nעוזר:"
+    return {
+        "contents": [{"parts": [{"text": conversation_text}]}],
+        "generationConfig": {
+            "temperature": 0.7,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 200,
+            "stopSequences": ["לקוח:", "עוזר:"]
+        }
+    }
+
+@benchmark("gemini-payload")
+def bench_gemini_payload(turns=50):
+    """Gemini request build + serialization cost and size per turn"""
+    from ai_chat_manager import AIChatManager
+
+    manager = AIChatManager()
+    user_id = "bench_user"
+
+    print(f"{'turn':>5} {'legacy µs':>10} {'legacy B':>9} {'multi-turn µs':>14} {'multi-turn B':>13}")
+    totals = [0.0, 0, 0.0, 0]
+
+    for turn, (user_message, bot_reply) in enumerate(_sample_conversation(turns), 1):
+        history = manager.get_conversation_history(user_id)
+
+        legacy_us = _timeit(lambda: json.dumps(_legacy_gemini_prompt(manager.system_prompt, history, user_message)))
+        legacy_size = len(json.dumps(_legacy_gemini_prompt(manager.system_prompt, history, user_message)).encode('utf-8'))
+
+        new_us = _timeit(lambda: manager.encode_gemini_request(user_message, user_id))
+        new_size = len(manager.encode_gemini_request(user_message, user_id))
+
+        totals[0] += legacy_us
+        totals[1] += legacy_size
+        totals[2] += new_us
+        totals[3] += new_size
+
+        if turn == 1 or turn % 10 == 0:
+            print(f"{turn:>5} {legacy_us:>10.1f} {legacy_size:>9} {new_us:>14.1f} {new_size:>13}")
+
+        manager.add_to_history(user_id, "user", user_message)
+        manager.add_to_history(user_id, "assistant", bot_reply)
+
+    print(f"{'avg':>5} {totals[0] / turns:>10.1f} {totals[1] // turns:>9} "
+          f"{totals[2] / turns:>14.1f} {totals[3] // turns:>13}")
+
+def _peak_allocation(func):
+    """Return the peak bytes allocated during one call of func"""
+    import tracemalloc
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+@benchmark("payload-encode")
+def bench_payload_encode(repeat=2000):
+    """Provider payload build time and allocations per request"""
+    import ai_payloads
+    from ai_chat_engine import VIVClinicAI
+
+    engine = VIVClinicAI()
+    messages = []
+    for user_message, bot_reply in _sample_conversation(5):
+        messages.append({'role': 'user', 'content': user_message})
+        messages.append({'role': 'assistant', 'content': bot_reply})
+    messages.append({'role': 'user', 'content': "מתי אפשר להגיע?"})
+
+    def full_dict_dumps():
+        # What requests does with json=...: serialize the whole nested payload
+        data = {
+            'model': engine.config.OPENAI_MODEL,
+            'messages': [{'role': 'system', 'content': engine.system_prompt}] + messages,
+            'max_tokens': 500,
+            'temperature': 0.7
+        }
+        return json.dumps(data).encode('utf-8')
+
+    encoder = engine._get_encoder('openai', engine.config.OPENAI_MODEL)
+
+    print(f"JSON backend: {ai_payloads.JSON_BACKEND}")
+    print(f"{'path':<22} {'µs/request':>11} {'bytes':>7} {'peak alloc B':>13}")
+    for label, func in (("json.dumps(full dict)", full_dict_dumps),
+                        ("PayloadEncoder", lambda: encoder.encode(messages))):
+        elapsed = _timeit(func, repeat)
+        print(f"{label:<22} {elapsed:>11.1f} {len(func()):>7} {_peak_allocation(func):>13}")
+
+REPLAY_MESSAGES = [
+    "שלום",
+    "שלום, אני רוצה לקבוע תור לטיפול שיניים",
+    "כמה עולה הלבנת שיניים?",
+    "כמה עולה השתלה?",
+    "איפה המרפאה נמצאת?",
+    "מתי אתם פתוחים בשבוע?",
+    "יש לכם מקום חניה?",
+    "אפשר לקבוע פגישה למחר בבוקר?",
+    "האם אתם מטפלים בילדים?",
+    "כואבת לי השן כבר שבוע, מה לעשות?",
+    "תודה רבה על המידע!",
+    "מה ההבדל בין יישור שקוף לגשר?",
+]
+
+def _load_replay_corpus(size=300):
+    """Replay corpus: REPLAY_CORPUS file (one message per line) or a synthetic mix"""
+    import os
+
+    path = os.environ.get('REPLAY_CORPUS')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    return [REPLAY_MESSAGES[i % len(REPLAY_MESSAGES)] for i in range(size)]
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+@benchmark("cascade")
+def bench_cascade():
+    """Latency and cost of the model cascade vs single-model mode on a replay corpus"""
+    import zlib
+    from ai_chat_engine import VIVClinicAI
+
+    # Simulated models: (seconds per call, seconds per output token)
+    latency = {'cheap': (0.25, 0.003), 'default': (0.35, 0.004), 'strong': (1.2, 0.012)}
+    corpus = _load_replay_corpus()
+
+    def run(mode):
+        engine = VIVClinicAI()
+        engine.active_provider = 'openai'
+        engine.config.CASCADE_ENABLED = (mode == 'cascade')
+        if mode == 'strong':
+            engine.config.OPENAI_MODEL = engine.config.OPENAI_STRONG_MODEL
+        tiers = {engine.config.OPENAI_CHEAP_MODEL: 'cheap', engine.config.OPENAI_STRONG_MODEL: 'strong'}
+        request_latency = []
+
+        def simulated_call(provider, model, user_id, api_messages):
+            message = api_messages[-1]['content']
+            tier = tiers.get(model, 'default')
+            # Models below the strong one deflect on a deterministic ~1 in 4 of the messages
+            if tier != 'strong' and zlib.crc32(message.encode('utf-8')) % 4 == 0:
+                reply = "מצטער, אני לא יכול לעזור בזה."
+            else:
+                reply = engine._fallback_response(message)
+            input_tokens = (len(engine.system_prompt) + sum(len(m['content']) for m in api_messages)) // 3
+            output_tokens = len(reply) // 3
+            engine.usage.record(provider, model, user_id, input_tokens, output_tokens)
+            base, per_token = latency[tier]
+            request_latency[-1] += base + per_token * output_tokens
+            return reply
+
+        engine._call_provider = simulated_call
+        costs = []
+        for i, message in enumerate(corpus):
+            request_latency.append(0.0)
+            before = engine.usage.snapshot()['totals']['cost_usd']
+            engine.generate_response(f"replay_{i}", message)
+            costs.append(engine.usage.snapshot()['totals']['cost_usd'] - before)
+        return request_latency, costs, engine.cascade_stats, engine.usage.snapshot()['by_model']
+
+    print(f"Replay corpus: {len(corpus)} messages (simulated provider latency)")
+    print(f"{'mode':<10} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'mean $':>10} {'p95 $':>10} {'total $':>9}")
+    for mode in ('fast', 'strong', 'cascade'):
+        latencies, costs, stats, by_model = run(mode)
+        print(f"{mode:<10} {_percentile(latencies, 50):>7.2f} {_percentile(latencies, 95):>7.2f} "
+              f"{max(latencies):>7.2f} {sum(costs) / len(costs):>10.6f} "
+              f"{_percentile(costs, 95):>10.6f} {sum(costs):>9.4f}")
+        if mode == 'cascade':
+            escalated = sum(s['escalated'] for s in stats.values())
+            print(f"cascade escalated {escalated}/{len(corpus)} requests: "
+                  + ", ".join(f"{intent}={s['escalated']}/{s['fast'] + s['escalated']}" for intent, s in stats.items()))
+            print("cascade cost by model: " + ", ".join(f"{model} ${usage['cost_usd']:.4f}" for model, usage in by_model.items()))
+
+CUSTOMER_HEADERS = ["תאריך", "שם", "טלפון", "נושא", "מקור", "סטטוס", "הערות"]
+
+def _bench_sizes(default_max=1_000_000):
+    """Row counts to benchmark at: 1k, 10k, ... up to BENCH_MAX_ROWS"""
+    import os
+
+    max_rows = int(os.environ.get('BENCH_MAX_ROWS', default_max))
+    sizes = []
+    rows = 1_000
+    while rows <= max_rows:
+        sizes.append(rows)
+        rows *= 10
+    return sizes
+
+def _customer_row(i):
+    """Synthetic customer row; every 50th row has a multi-line quoted note"""
+    notes = "הערה בשורה אחת\nוהמשך בשורה שנייה" if i % 50 == 0 else f"Facebook User ID: {i}"
+    return [
+        f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} {i % 24:02d}:{i % 60:02d}",
+        f"לקוח {i}",
+        f"05{i % 100_000_000:08d}",
+        ["טיפול שיניים", "הלבנת שיניים", "השתלות", "יישור שיניים"][i % 4],
+        ["Facebook", "Facebook_comment", "Test_Chat"][i % 3],
+        ["חדש", "ממתין לטיפול", "טופל"][i % 3],
+        notes,
+    ]
+
+def _build_customer_csv(path, rows, start=0):
+    """Write (or extend) a customers CSV with synthetic rows"""
+    import csv
+    import os
+
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(CUSTOMER_HEADERS)
+        for i in range(start, start + rows):
+            writer.writerow(_customer_row(i))
+
+@benchmark("csv-tail")
+def bench_csv_tail():
+    """get_customers(50) latency as the customers file grows"""
+    import csv
+    import os
+    import tempfile
+    from csv_manager import CSVManager
+
+    path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+    built = 0
+
+    print(f"{'rows':>10} {'file MB':>8} {'tail ms':>9} {'DictReader ms':>14}")
+    for rows in _bench_sizes():
+        _build_customer_csv(path, rows - built, start=built)
+        built = rows
+        manager = CSVManager(path)
+
+        tail_ms = _timeit(lambda: manager.get_customers(50), 50) / 1000
+
+        def legacy():
+            with open(path, 'r', encoding='utf-8') as f:
+                return list(csv.DictReader(f))[-50:]
+
+        legacy_ms = _timeit(legacy, 1) / 1000 if rows <= 1_000_000 else float('nan')
+        size_mb = os.path.getsize(path) / 1_000_000
+        print(f"{rows:>10} {size_mb:>8.1f} {tail_ms:>9.3f} {legacy_ms:>14.1f}")
+
+@benchmark("phone-index")
+def bench_phone_index():
+    """Phone index build/load time and lookup latency vs a linear scan"""
+    import csv
+    import os
+    import tempfile
+    from csv_manager import CSVManager
+
+    rows = int(os.environ.get('BENCH_ROWS', 1_000_000))
+    path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+    _build_customer_csv(path, rows)
+    phones = [_customer_row(i)[2] for i in (0, rows // 2, rows - 1)]
+
+    start = time.perf_counter()
+    manager = CSVManager(path)
+    print(f"rows: {rows:,}  index build: {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    manager = CSVManager(path)
+    print(f"index load (validated from size/mtime): {time.perf_counter() - start:.2f} s")
+
+    def linear_scan(phone):
+        with open(path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row['טלפון'] == phone:
+                    return row
+
+    print(f"{'phone position':<16} {'index µs':>10} {'linear scan ms':>15}")
+    for label, phone in zip(("first", "middle", "last"), phones):
+        index_us = _timeit(lambda: manager.search_customer(phone), 1000)
+        linear_ms = _timeit(lambda: linear_scan(phone), 1) / 1000
+        print(f"{label:<16} {index_us:>10.1f} {linear_ms:>15.1f}")
+
+    start = time.perf_counter()
+    report = manager.verify_index()
+    print(f"consistency check: {report['consistent']} ({time.perf_counter() - start:.2f} s)")
+
+@benchmark("status-update")
+def bench_status_update():
+    """update_customer_status cost vs file size: update log vs full rewrite"""
+    import contextlib
+    import csv
+    import io
+    import os
+    import tempfile
+    from csv_manager import CSVManager
+
+    path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+    built = 0
+
+    def legacy_rewrite(phone, new_status):
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            if row['טלפון'] == phone:
+                row['סטטוס'] = new_status
+        with open(path + '.legacy', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CUSTOMER_HEADERS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    print(f"{'rows':>10} {'log update µs':>14} {'rewrite ms':>11} {'compact 1k ms':>14}")
+    for rows in _bench_sizes():
+        _build_customer_csv(path, rows - built, start=built)
+        built = rows
+        manager = CSVManager(path, compact_threshold=10**9)
+        phone = _customer_row(rows // 2)[2]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            update_us = _timeit(lambda: manager.update_customer_status(phone, "טופל"), 1000)
+            start = time.perf_counter()
+            manager.compact()
+            compact_ms = (time.perf_counter() - start) * 1000
+
+        rewrite_ms = _timeit(lambda: legacy_rewrite(phone, "טופל"), 1) / 1000 if rows <= 100_000 else float('nan')
+        print(f"{rows:>10} {update_us:>14.1f} {rewrite_ms:>11.1f} {compact_ms:>14.1f}")
+
+@benchmark("storage-backends")
+def bench_storage_backends(writes=500):
+    """CSV vs SQLite backend: writes/sec, lookup latency and stats latency"""
+    import contextlib
+    import io
+    import os
+    import tempfile
+    from csv_manager import CSVManager
+    from sqlite_manager import SQLiteManager
+
+    print(f"{'rows':>10} {'backend':>8} {'writes/s':>10} {'lookup µs':>10} {'stats ms':>9}")
+    for rows in _bench_sizes(default_max=100_000):
+        # Fresh files per size, since each run appends the benchmark writes
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "customers.csv")
+        _build_customer_csv(path, rows)
+        phone = _customer_row(rows // 2)[2]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            backends = {
+                "csv": CSVManager(path),
+                "sqlite": SQLiteManager(os.path.join(directory, "customers.db"), import_csv_file=path),
+            }
+
+        for name, manager in backends.items():
+            with contextlib.redirect_stdout(io.StringIO()):
+                lookup_us = _timeit(lambda: manager.search_customer(phone), 1000)
+                stats_ms = _timeit(manager.get_stats, 20) / 1000
+                start = time.perf_counter()
+                for i in range(writes):
+                    manager.add_customer(f"bench {i}", f"0599{i:06d}", "טיפול שיניים")
+                writes_per_sec = writes / (time.perf_counter() - start)
+            print(f"{rows:>10} {name:>8} {writes_per_sec:>10.0f} {lookup_us:>10.1f} {stats_ms:>9.2f}")
+
+@benchmark("insert-batching")
+def bench_insert_batching(threads=8, rows_per_thread=500):
+    """Concurrent add_customer throughput: per-row writes vs group commit"""
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import threading
+    from csv_manager import CSVManager
+
+    modes = [
+        ("per-row", 0, "flush"),
+        ("batched", 20, "flush"),
+        ("per-row", 0, "fsync"),
+        ("batched", 20, "fsync"),
+    ]
+
+    print(f"{'mode':>8} {'durability':>10} {'rows/s':>9} {'batches':>8} {'avg batch':>10}")
+    for label, batch_ms, durability in modes:
+        path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = CSVManager(path, write_batch_ms=batch_ms, durability=durability)
+
+            def insert(worker):
+                for i in range(rows_per_thread):
+                    manager.add_customer(f"לקוח {worker}-{i}", f"05{worker:02d}{i:06d}", "טיפול שיניים")
+
+            workers = [threading.Thread(target=insert, args=(n,)) for n in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            manager.flush_writes()
+            elapsed = time.perf_counter() - start
+
+        total = threads * rows_per_thread
+        assert manager.get_stats()["total_customers"] == total
+        buffer_stats = manager.write_buffer.get_stats() if manager.write_buffer else {"batches": total, "average_batch": 1.0}
+        print(f"{label:>8} {durability:>10} {total / elapsed:>9.0f} {buffer_stats['batches']:>8} {buffer_stats['average_batch']:>10}")
+
+def _stress_writer(path, worker, rows, compact_threshold):
+    """One writer process for the write-stress benchmark"""
+    import contextlib
+    import io
+    from csv_manager import CSVManager
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = CSVManager(path, compact_threshold=compact_threshold)
+        for i in range(rows):
+            manager.add_customer(f"w{worker}-{i}", f"05{worker:02d}{i:06d}", "טיפול שיניים")
+            if i % 3 == 2:
+                manager.update_customer_status(f"05{worker:02d}{i - 1:06d}", f"טופל {worker}")
+        manager.save_stats()
+    return manager.get_lock_stats()
+
+@benchmark("write-stress")
+def bench_write_stress(processes=8, rows_per_process=300):
+    """Concurrent writer processes on one CSV: no lost or duplicated rows, lock wait"""
+    import contextlib
+    import io
+    import os
+    import tempfile
+    from collections import Counter
+    from concurrent.futures import ProcessPoolExecutor
+    from csv_manager import CSVManager
+
+    path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(_stress_writer, path, n, rows_per_process, 100) for n in range(processes)]
+        lock_stats = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = CSVManager(path)
+    customers = manager.get_customers(limit=0)
+    names = Counter(customer['שם'] for customer in customers)
+    expected = {f"w{n}-{i}" for n in range(processes) for i in range(rows_per_process)}
+    lost = expected - set(names)
+    duplicated = [name for name, count in names.items() if count > 1]
+    wrong_status = [
+        customer['שם'] for customer in customers
+        if int(customer['שם'].split('-')[1]) % 3 == 1
+        and customer['סטטוס'] != f"טופל {customer['שם'][1:].split('-')[0]}"
+    ]
+
+    total = processes * rows_per_process
+    print(f"processes: {processes}  rows: {total:,}  time: {elapsed:.2f} s  ({total / elapsed:.0f} rows/s)")
+    print(f"lost rows: {len(lost)}  duplicated rows: {len(duplicated)}  unexpected rows: {len(set(names) - expected)}")
+    print(f"missed status updates: {len(wrong_status)}")
+    print(f"index consistent: {manager.verify_index()['consistent']}  "
+          f"stats total: {manager.get_stats()['total_customers']:,}")
+
+    waits = [stats['average_wait_ms'] for stats in lock_stats]
+    print(f"lock wait per acquisition: avg {sum(waits) / len(waits):.3f} ms, "
+          f"worst {max(stats['max_wait_ms'] for stats in lock_stats):.1f} ms "
+          f"over {sum(stats['acquisitions'] for stats in lock_stats):,} acquisitions")
+
+@benchmark("analytics")
+def bench_analytics():
+    """Columnar snapshot build/refresh time and dashboard query latency"""
+    import contextlib
+    import io
+    import os
+    import tempfile
+    from csv_manager import CSVManager
+    from customer_analytics import np
+
+    if np is None:
+        print("⚠️ numpy not installed, skipping")
+        return
+
+    rows = int(os.environ.get('BENCH_ROWS', 1_000_000))
+    path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+    _build_customer_csv(path, rows)
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = CSVManager(path, partitions='off', write_batch_ms=0)
+    analytics = manager.get_analytics()
+
+    start = time.perf_counter()
+    analytics.refresh()
+    print(f"rows: {rows:,}  snapshot build: {time.perf_counter() - start:.2f} s")
+    print(f"refresh, nothing new: {_timeit(analytics.refresh, 100):.0f} µs")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(1000):
+            manager.add_customer(f"חדש {i}", f"0590{i:06d}", "השתלות", source="Facebook")
+        for i in range(100):
+            manager.update_customer_status(_customer_row(i * 7)[2], "טופל")
+    start = time.perf_counter()
+    analytics.refresh()
+    print(f"refresh after 1,000 appends + 100 updates: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    queries = [
+        ("total", lambda: analytics.total()),
+        ("source x status x day", lambda: analytics.count_by("source", "status", "day")),
+        ("top topics", lambda: analytics.top("topic")),
+        ("conversion by source", lambda: analytics.conversion(by="source")),
+        ("March, source x status", lambda: analytics.count_by("source", "status", start_date="2025-03-01", end_date="2025-03-31")),
+    ]
+    print(f"{'query':<26} {'ms':>8}")
+    for label, query in queries:
+        print(f"{label:<26} {_timeit(query, 20) / 1000:>8.2f}")
+
+@benchmark("search")
+def bench_search():
+    """Full-text customer search: index build time and query latency vs a linear substring scan"""
+    import contextlib
+    import csv
+    import io
+    import os
+    import tempfile
+    from csv_manager import CSVManager
+
+    rows = int(os.environ.get('BENCH_ROWS', 1_000_000))
+    path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+    _build_customer_csv(path, rows)
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = CSVManager(path, partitions='off', write_batch_ms=0)
+    index = manager.get_search_index()
+
+    start = time.perf_counter()
+    index.refresh()
+    print(f"rows: {rows:,}  index build: {time.perf_counter() - start:.1f} s  {index.get_stats()}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.add_customer("דנה כהן", "+972-52-777-8888", "ייעוץ ליישור שיניים")
+    start = time.perf_counter()
+    index.refresh()
+    print(f"index one insert: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    middle = rows // 2
+    queries = [
+        ("phone, national", _customer_row(middle)[2]),
+        ("phone, +972 form", "+972-" + _customer_row(middle)[2][1:3] + "-" + _customer_row(middle)[2][3:]),
+        ("phone prefix", _customer_row(middle)[2][:8]),
+        ("name", f"לקוח {middle}"),
+        ("name prefix", f"לקוח {str(middle)[:4]}"),
+        ("Hebrew prefix letter", "בהשתלות"),
+        ("typo", "הלבנת שינים"),
+        ("final letter", "כהנ"),
+    ]
+
+    def linear_scan(text):
+        text = text.lower()
+        with open(path, 'r', encoding='utf-8') as f:
+            return [row for row in csv.DictReader(f)
+                    if text in (row['שם'] + " " + row['טלפון'] + " " + row['נושא']).lower()][:20]
+
+    print(f"{'query':<22} {'results':>8} {'index ms':>9}")
+    for label, query in queries:
+        results = manager.search_customers(query)
+        print(f"{label:<22} {len(results):>8} {_timeit(lambda: manager.search_customers(query), 20) / 1000:>9.2f}")
+    print(f"linear substring scan (one query): {_timeit(lambda: linear_scan(queries[3][1]), 1) / 1000:.0f} ms")
+
+def _export_worker(path, mode, out):
+    """One export for the export benchmark, run in a fresh process"""
+    import contextlib
+    import io
+    import json
+    import resource
+    from csv_manager import CSVManager
+    from customer_export import export_customers
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = CSVManager(path, partitions='off', write_batch_ms=0)
+        loaded_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        start = time.perf_counter()
+        if mode == "json.dump":
+            with open(out, 'w', encoding='utf-8') as f:
+                json.dump(manager.export_to_google_sheets_format(), f, ensure_ascii=False, indent=2)
+        else:
+            export_customers(manager, out, mode)
+        elapsed = time.perf_counter() - start
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, loaded_mb, peak_mb
+
+@benchmark("export")
+def bench_export():
+    """Full customer export: streamed JSON/NDJSON/CSV vs one json.dump (time, peak RSS)"""
+    import contextlib
+    import io
+    import multiprocessing
+    import os
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    from csv_manager import CSVManager
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "customers.csv")
+    context = multiprocessing.get_context("spawn")
+    built = 0
+
+    print(f"{'rows':>10} {'mode':<10} {'export s':>9} {'loaded MB':>10} {'peak MB':>8} {'growth MB':>10}")
+    for rows in _bench_sizes():
+        if rows < 10_000:
+            continue
+        _build_customer_csv(path, rows - built, start=built)
+        built = rows
+        with contextlib.redirect_stdout(io.StringIO()):
+            CSVManager(path, partitions='off', write_batch_ms=0)  # Build the index and stats up front
+
+        for mode in ("json.dump", "json", "ndjson", "csv"):
+            out = os.path.join(directory, f"export.{mode}")
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                elapsed, loaded_mb, peak_mb = pool.submit(_export_worker, path, mode, out).result()
+            print(f"{rows:>10} {mode:<10} {elapsed:>9.2f} {loaded_mb:>10.1f} {peak_mb:>8.1f} {peak_mb - loaded_mb:>10.1f}")
+
+def _scan_worker(path, mode):
+    """One full stats scan for the mmap-scan benchmark, run in a fresh process"""
+    import csv
+    import resource
+    from collections import Counter
+    from csv_scan import scan_columns
+
+    start = time.perf_counter()
+    sources, statuses = Counter(), Counter()
+    if mode == "DictReader":
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                sources[row['מקור']] += 1
+                statuses[row['סטטוס']] += 1
+    elif mode == "scan_columns":
+        columns = [CUSTOMER_HEADERS.index('מקור'), CUSTOMER_HEADERS.index('סטטוס')]
+        with open(path, 'rb') as f:
+            for _, _, (source, status) in scan_columns(f, columns):
+                sources[source] += 1
+                statuses[status] += 1
+    elapsed = time.perf_counter() - start
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, peak_mb, dict(sources), dict(statuses)
+
+@benchmark("mmap-scan")
+def bench_mmap_scan():
+    """Full-file stats scan: mmap column projection vs csv.DictReader (time, peak RSS)"""
+    import multiprocessing
+    import os
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    rows = int(os.environ.get('BENCH_ROWS', 1_000_000))
+    path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+    _build_customer_csv(path, rows)
+    print(f"rows: {rows:,}  file: {os.path.getsize(path) / 1_000_000:.1f} MB")
+
+    # Each mode runs in its own fresh process so peak RSS is not shared
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    print(f"{'mode':<14} {'scan s':>8} {'peak RSS MB':>12}")
+    for mode in ("baseline", "DictReader", "scan_columns"):
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            elapsed, peak_mb, sources, statuses = pool.submit(_scan_worker, path, mode).result()
+        results[mode] = (sources, statuses)
+        print(f"{mode:<14} {elapsed:>8.2f} {peak_mb:>12.1f}")
+
+    print(f"same counts: {results['DictReader'] == results['scan_columns']}")
+
+def _traffic_log(users, seed=7):
+    """Synthetic messenger traffic: (user id, phone or 'Unknown', topic) per message, users interleaved"""
+    import random
+
+    rng = random.Random(seed)
+    topics = ["טיפול שיניים", "הלבנת שיניים", "השתלות", "יישור שיניים"]
+    messages = []
+    for user in range(users):
+        number = f"5{user % 100_000_000:08d}"
+        forms = ["0" + number, f"0{number[:2]}-{number[2:]}", f"+972-{number[:2]}-{number[2:]}", "972" + number]
+        sent = rng.randint(1, 6)
+        phone_at = rng.randrange(sent + 1)  # Some users never leave a phone
+        for i in range(sent):
+            phone = rng.choice(forms) if i >= phone_at else "Unknown"
+            messages.append((rng.random(), f"fb{user}", phone, rng.choice(topics)))
+    messages.sort()
+    return [message[1:] for message in messages]
+
+@benchmark("upsert-dedup")
+def bench_upsert_dedup():
+    """Replayed messenger traffic: rows written by add_customer per message vs upsert_customer"""
+    import contextlib
+    import csv
+    import io
+    import os
+    import tempfile
+    from csv_manager import CSVManager
+
+    users = int(os.environ.get('BENCH_USERS', 20_000))
+    messages = _traffic_log(users)
+    print(f"users: {users:,}  messages: {len(messages):,}")
+
+    directory = tempfile.mkdtemp()
+    print(f"{'path':<16} {'rows':>9} {'us/message':>11}")
+    for mode in ("add_customer", "upsert_customer"):
+        path = os.path.join(directory, f"{mode}.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = CSVManager(path, partitions='off', write_batch_ms=0)
+            start = time.perf_counter()
+            for user_id, phone, topic in messages:
+                if mode == "add_customer":
+                    manager.add_customer(f"Customer_{user_id[-4:]}", phone, topic, notes=f"Facebook User ID: {user_id}")
+                else:
+                    manager.upsert_customer(f"Customer_{user_id[-4:]}", phone, topic, user_id=user_id)
+            elapsed = time.perf_counter() - start
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = sum(1 for _ in csv.reader(f)) - 1
+        print(f"{mode:<16} {rows:>9,} {elapsed / len(messages) * 1_000_000:>11.0f}")
+
+    print(f"rows saved: {1 - rows / len(messages):.1%}  ({manager.get_upsert_stats()})")
+    print(f"history of fb0: {manager.get_customer_history(user_id='fb0')}")
+
+@benchmark("sheets-sync")
+def bench_sheets_sync(inquiries=2000, updates=500):
+    """Google Sheets writes against the local stand-in server: a request per change vs write-behind batches"""
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import threading
+    from werkzeug.serving import make_server
+    import sheets_test_server
+    from google_sheets_manager import GoogleSheetsManager
+    from sheets_sync import SheetsSync
+
+    app = sheets_test_server.create_app()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['GOOGLE_SHEETS_BASE_URL'] = f"http://127.0.0.1:{server.server_port}/v4/spreadsheets"
+
+    import logging
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sheets = GoogleSheetsManager()
+    sheets.sheet_id = "bench"
+    rows = [[f"2025-01-01 10:{i % 60:02d}", f"לקוח {i}", f"05{i:08d}", "טיפול שיניים", "Facebook", f"u{i}", "חדש", ""]
+            for i in range(inquiries)]
+
+    print(f"{'path':<14} {'requests':>9} {'caller ms/change':>17} {'total s':>8}")
+    start = time.perf_counter()
+    for row in rows:
+        sheets.append_values([row])
+    for i in range(updates):
+        sheets.update_statuses({i + 2: ("ממתין לטיפול", "")})
+    elapsed = time.perf_counter() - start
+    changes = inquiries + updates
+    print(f"{'per change':<14} {changes:>9} {elapsed / changes * 1000:>17.3f} {elapsed:>8.2f}")
+
+    before = app.stats["append_requests"] + app.stats["update_requests"]
+    sheets.sheet_id = "bench-sync"
+    sync = SheetsSync(sheets, os.path.join(tempfile.mkdtemp(), "bench.queue"), requests_per_minute=6000)
+    start = time.perf_counter()
+    for row in rows:
+        sync.add_row(row)
+    for i in range(updates):
+        sync.update_status(i + 2, "ממתין לטיפול")
+    queued = time.perf_counter() - start
+    sync.close()
+    elapsed = time.perf_counter() - start
+    requests_made = app.stats["append_requests"] + app.stats["update_requests"] - before
+    print(f"{'write-behind':<14} {requests_made:>9} {queued / changes * 1000:>17.3f} {elapsed:>8.2f}")
+    print(f"same sheet: {app.sheets['bench'] == app.sheets['bench-sync']}  {sync.get_stats()}")
+    server.shutdown()
+
+@benchmark("sheets-mirror")
+def bench_sheets_mirror(rows=20_000, added=100):
+    """Sheet reads against the local stand-in server: an API call per read vs the local mirror"""
+    import contextlib
+    import io
+    import logging
+    import os
+    import threading
+    from werkzeug.serving import make_server
+    import sheets_test_server
+    from google_sheets_manager import GoogleSheetsManager
+    from sheets_mirror import SheetMirror
+
+    app = sheets_test_server.create_app()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['GOOGLE_SHEETS_BASE_URL'] = f"http://127.0.0.1:{server.server_port}/v4/spreadsheets"
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sheets = GoogleSheetsManager()
+    sheets.sheet_id = "bench"
+    inquiry = lambda i: [f"2025-01-01 10:{i % 60:02d}", f"לקוח {i}", f"05{i:08d}", "טיפול שיניים", "Facebook", f"u{i}", "חדש", ""]
+    app.sheets["bench"] = [sheets.headers] + [inquiry(i) for i in range(rows)]
+
+    def api_search(term):
+        data = sheets.get_values("A2:H").json()["values"]
+        return [row for row in data if term in (row[1] + " " + row[2] + " " + row[3]).lower()]
+
+    mirror = SheetMirror(sheets, cache_file=None, max_age=60)
+    print(f"sheet rows: {rows:,}")
+    print(f"{'read':<26} {'ms':>9}")
+    print(f"{'API, first 50 rows':<26} {_timeit(lambda: sheets.get_values('A2:H51').json(), 50) / 1000:>9.2f}")
+    print(f"{'API, search all rows':<26} {_timeit(lambda: api_search('לקוח 1234'), 5) / 1000:>9.2f}")
+    print(f"{'mirror, initial load':<26} {_timeit(lambda: mirror.refresh(force=True), 1) / 1000:>9.2f}")
+    print(f"{'mirror, first 50 rows':<26} {_timeit(lambda: mirror.get_inquiries(50), 50) / 1000:>9.2f}")
+    print(f"{'mirror, search all rows':<26} {_timeit(lambda: mirror.search('לקוח 1234'), 20) / 1000:>9.2f}")
+
+    app.sheets["bench"].extend(inquiry(i) for i in range(rows, rows + added))
+    mirror.refreshed_at = 0  # Stale
+    print(f"{f'mirror, +{added} rows refresh':<26} {_timeit(lambda: mirror.refresh(), 1) / 1000:>9.2f}")
+    print(f"rows: {len(mirror.rows):,}  same as sheet: {mirror.rows == app.sheets['bench'][1:]}  {mirror.get_stats()}")
+    server.shutdown()
+
+def _serve_sheets(port, latency_ms):
+    """Stand-in Sheets server process for the sheets-read benchmark"""
+    import logging
+    import sheets_test_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    sheets_test_server.create_app(latency_ms=latency_ms).run(port=port, threaded=True)
+
+@benchmark("sheets-read")
+def bench_sheets_read(rows=50_000, latency_ms=80):
+    """Whole-sheet read against the stand-in server with added latency: one range vs concurrent chunks"""
+    import contextlib
+    import io
+    import multiprocessing
+    import os
+    import socket
+    import requests
+    from google_sheets_manager import GoogleSheetsManager
+
+    # The server runs in its own process so it doesn't share this one's GIL
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = multiprocessing.get_context("spawn").Process(target=_serve_sheets, args=(port, latency_ms), daemon=True)
+    server.start()
+    os.environ['GOOGLE_SHEETS_BASE_URL'] = f"http://127.0.0.1:{port}/v4/spreadsheets"
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sheets = GoogleSheetsManager()
+    sheets.sheet_id = "bench"
+    values = [sheets.headers] + [
+        [f"2025-01-01 10:{i % 60:02d}", f"לקוח {i}", f"05{i:08d}", "טיפול שיניים", "Facebook", f"u{i}", "חדש"] + ([""] if i % 2 else [])
+        for i in range(rows)
+    ]
+    for _ in range(100):
+        try:
+            sheets.append_values(values)
+            break
+        except requests.ConnectionError:
+            time.sleep(0.1)  # Server still starting
+
+    def single_range():
+        return sheets.get_values("A2:H").json()["values"]
+
+    print(f"rows: {rows:,}  latency: {latency_ms} ms per request")
+    print(f"{'read':<28} {'first row ms':>13} {'total ms':>9} {'rows':>8}")
+    modes = [("one A2:H range", None, None)] + [
+        (f"chunks of {chunk} x {workers} workers", chunk, workers)
+        for chunk, workers in ((2000, 1), (2000, 4), (2000, 8), (5000, 8))
+    ]
+    for label, chunk, workers in modes:
+        start = time.perf_counter()
+        first = None
+        count = 0
+        for _ in (single_range() if chunk is None else sheets.iter_values(2, chunk, workers)):
+            if first is None:
+                first = time.perf_counter() - start
+            count += 1
+        total = time.perf_counter() - start
+        print(f"{label:<28} {first * 1000:>13.0f} {total * 1000:>9.0f} {count:>8,}")
+    server.terminate()
+
+@benchmark("sheets-delta")
+def bench_sheets_delta(changes=50, added=20):
+    """CSV <-> Sheets delta sync against the stand-in server: sync cost vs table size for a fixed number of changes"""
+    import contextlib
+    import io
+    import logging
+    import os
+    import tempfile
+    import threading
+    from werkzeug.serving import make_server
+    import sheets_test_server
+    from csv_manager import CSVManager
+    from customer_sheet_sync import CustomerSheetSync
+    from google_sheets_manager import GoogleSheetsManager
+
+    app = sheets_test_server.create_app()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['GOOGLE_SHEETS_BASE_URL'] = f"http://127.0.0.1:{server.server_port}/v4/spreadsheets"
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    print(f"{changes} status changes + {added} new customers per sync")
+    print(f"{'rows':>10} {'initial s':>10} {'push ms':>8} {'push+pull ms':>13} {'requests':>9} {'full re-upload requests':>24}")
+    for rows in _bench_sizes(int(os.environ.get('BENCH_MAX_ROWS', 100_000))):
+        path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+        _build_customer_csv(path, rows)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = CSVManager(path, partitions='off', write_batch_ms=0, compact_threshold=10 ** 9)
+            sheets = GoogleSheetsManager()
+            sheets.sheet_id = f"bench-{rows}"
+            sync = CustomerSheetSync(manager, sheets, requests_per_minute=60_000)
+
+            start = time.perf_counter()
+            sync.sync()
+            initial = time.perf_counter() - start
+
+            timings = []
+            for pull in (False, True):
+                for i in range(changes):
+                    manager.update_customer_status(_customer_row(i * (rows // changes))[2], "טופל")
+                for i in range(added):
+                    manager.add_customer(f"חדש {i}", f"0591{pull:d}{i:05d}", "השתלות")
+                requests_before = sync.stats["requests"]
+                start = time.perf_counter()
+                sync.sync(pull=pull)
+                timings.append((time.perf_counter() - start) * 1000)
+            requests_made = sync.stats["requests"] - requests_before
+        full_requests = -(-(rows + added * 2) // sync.batch_rows)
+        print(f"{rows:>10,} {initial:>10.2f} {timings[0]:>8.1f} {timings[1]:>13.1f} {requests_made:>9} {full_requests:>24}")
+    server.shutdown()
+
+PHONE_FORMATS = [
+    ("mobile", "050-1234567", "+972501234567"),
+    ("mobile, no dash", "0501234567", "+972501234567"),
+    ("mobile, spaces", "050 123 4567", "+972501234567"),
+    ("mobile, parentheses", "(050) 123-4567", "+972501234567"),
+    ("landline", "03-1234567", "+97231234567"),
+    ("landline, parentheses", "(03) 123 45 67", "+97231234567"),
+    ("landline, dots", "04.123.45.67", "+97241234567"),
+    ("VoIP 07X", "077-1234567", "+972771234567"),
+    ("+972 mobile", "+972-50-1234567", "+972501234567"),
+    ("+972 (0) mobile", "+972 (0)50 123 4567", "+972501234567"),
+    ("+972 landline", "+972 3 123 4567", "+97231234567"),
+    ("00972", "00972501234567", "+972501234567"),
+    ("972, no plus", "972501234567", "+972501234567"),
+    ("order number", "מספר הזמנה 12345678901234", ""),
+    ("date", "אפשר ב-03.12.2024 בשעה 12:30?", ""),
+    ("too many digits", "050-12345678", ""),
+]
+
+def _legacy_extract_phone(text):
+    """The pre-single-pass FacebookBot.extract_phone_number: five patterns tried in turn"""
+    import re
+
+    patterns = [
+        r'0\d{1,2}-?\d{7}',
+        r'\+972-?\d{1,2}-?\d{7}',
+        r'05\d-?\d{7}',
+        r'\d{10}',
+        r'\d{3}-?\d{7}'
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, text)
+        if match:
+            return match.group().replace('-', '').replace(' ', '')
+    return None
+
+@benchmark("phone-extract")
+def bench_phone_extract(size=100_000):
+    """Phone extraction from Hebrew messages: legacy five-regex loop vs the single compiled pattern"""
+    from phone_utils import extract_phone
+
+    print(f"{'format':<22} {'input':<28} {'legacy':<16} {'single pass':<15} ok")
+    for label, text, expected in PHONE_FORMATS:
+        legacy = _legacy_extract_phone(text) or ''
+        new = extract_phone(text)
+        print(f"{label:<22} {text:<28} {legacy:<16} {new:<15} {'✅' if new == expected else '❌'}")
+
+    # Mostly messages without a number, as in real conversations
+    messages = _load_replay_corpus(size)
+    for i in range(0, len(messages), 5):
+        messages[i] = f"{messages[i]} הטלפון שלי {PHONE_FORMATS[i % 13][1]} תודה"
+
+    print(f"\n{len(messages):,} messages")
+    print(f"{'extractor':<14} {'ms':>8} {'messages/s':>12} {'found':>7}")
+    for label, extract in (("legacy", _legacy_extract_phone), ("single pass", extract_phone)):
+        start = time.perf_counter()
+        found = sum(1 for message in messages if extract(message))
+        elapsed = time.perf_counter() - start
+        print(f"{label:<14} {elapsed * 1000:>8.0f} {len(messages) / elapsed:>12,.0f} {found:>7,}")
+
+@benchmark("lead-extract")
+def bench_lead_extract(size=100_000):
+    """Per-message cost of lead extraction (phone, treatment, time, name) vs the phone-and-keywords check it replaces"""
+    from lead_extractor import extract_lead
+    from phone_utils import extract_phone
+
+    extras = ["קוראים לי דנה כהן ואני רוצה לקבוע תור להשתלה מחר בבוקר 050-1234567",
+              "שמי יוסי, אפשר ביום ראשון בשעה 10:30 להלבנה?",
+              "הטלפון שלי +972 (0)52 765 4321, מתאים לי אחה\"צ"]
+    messages = _load_replay_corpus(size)
+    for i in range(0, len(messages), 4):
+        messages[i] = extras[i % len(extras)]
+
+    def phone_and_keywords(message):
+        phone = extract_phone(message)
+        return phone, any(keyword in message.lower() for keyword in ['תור', 'לקבוע', 'פגישה']), message[:100]
+
+    print(f"{len(messages):,} messages, average {sum(map(len, messages)) // len(messages)} chars")
+    print(f"{'path':<22} {'µs/message':>11} {'messages/s':>12}")
+    for label, extract in (("phone + keywords", phone_and_keywords), ("extract_lead", extract_lead)):
+        start = time.perf_counter()
+        for message in messages:
+            extract(message)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<22} {elapsed / len(messages) * 1_000_000:>11.2f} {len(messages) / elapsed:>12,.0f}")
+
+    leads = [extract_lead(message) for message in messages]
+    print(f"\n{'field':<22} {'messages':>9}")
+    for field in ("phone", "name", "treatments", "when", "wants_appointment"):
+        print(f"{field:<22} {sum(1 for lead in leads if getattr(lead, field)):>9,}")
+    print(f"{'stored (is_lead)':<22} {sum(1 for lead in leads if lead.is_lead):>9,}")
+
+def _llm_stand_in(latency_ms, ms_per_record):
+    """Flask app answering OpenAI chat completions for lead enrichment, with made-up token counts"""
+    from flask import Flask, jsonify, request
+    from lead_extractor import TREATMENTS
+
+    app = Flask(__name__)
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def completions():
+        body = request.get_json()
+        prompt = "".join(message['content'] for message in body['messages'])
+        records = json.loads(body['messages'][-1]['content'])
+        leads = [{"id": record["id"], "treatment": list(TREATMENTS)[record["id"] % len(TREATMENTS)],
+                  "when": "", "name": "", "appointment": record["id"] % 3 == 0} for record in records]
+        reply = json.dumps({"leads": leads}, ensure_ascii=False)
+        time.sleep((latency_ms + ms_per_record * len(records)) / 1000)  # Time to first token + generation
+        return jsonify({
+            "choices": [{"message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": len(prompt) // 2, "completion_tokens": len(reply) // 2}
+        })
+
+    return app
+
+@benchmark("lead-enrichment")
+def bench_lead_enrichment(records=400, latency_ms=400, ms_per_record=15):
+    """Batch LLM lead enrichment against a local OpenAI stand-in: records per second and per dollar by batch size"""
+    import contextlib
+    import io
+    import logging
+    import os
+    import tempfile
+    import threading
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, _llm_stand_in(latency_ms, ms_per_record), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['AI_USAGE_LOG'] = os.path.join(tempfile.mkdtemp(), "ai_usage.jsonl")
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    import lead_enrichment
+    from csv_manager import CSVManager
+
+    print(f"{records} customers (those the regexes structure are skipped), stand-in latency {latency_ms} ms + {ms_per_record} ms per record, "
+          f"{lead_enrichment.WORKERS} workers")
+    print(f"{'batch size':>10} {'records':>8} {'requests':>9} {'seconds':>8} {'records/s':>10} {'cost $':>9} {'records/$':>10}")
+    for batch_size in (1, 10, 25, 50):
+        path = os.path.join(tempfile.mkdtemp(), "customers.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = CSVManager(path, partitions='off', write_batch_ms=0)
+            for i in range(records):
+                manager.add_customer(f"לקוח {i}", f"0521{i:06d}", REPLAY_MESSAGES[i % len(REPLAY_MESSAGES)] + f" ({i})")
+            job = lead_enrichment.LeadEnrichment(manager, provider='openai', model='gpt-4o-mini',
+                                                 batch_size=batch_size)
+            job.config.OPENAI_URL = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+            stats = job.run()
+        print(f"{batch_size:>10} {stats['records']:>8} {stats['requests']:>9} {stats['seconds']:>8.2f} {stats['records_per_second']:>10.1f} "
+              f"{stats['cost_usd']:>9.4f} {stats['records_per_dollar'] or 0:>10,}")
+    server.shutdown()
+
+def main():
+    names = sys.argv[1:]
+    if not names:
+        print("📋 Available benchmarks:")
+        for name, func in BENCHMARKS.items():
+            print(f"  - {name}: {func.__doc__}")
+        return
+
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ Unknown benchmark: {name}")
+            continue
+        print(f"\n⏱️  {name}: {BENCHMARKS[name].__doc__}")
+        print("=" * 60)
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,61 @@
 CSV Manager for VIV Clinic - Temporary solution until Google Sheets is connected
 """
 
+import atexit
+import copy
 import csv
 import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
+from typing import BinaryIO, Dict, List, NamedTuple
+from csv_records import encode_row, find_tail_record_starts, iter_records, parse_record, read_record
+from csv_scan import scan_columns
+from customer_keys import TOPIC_LENGTH, CustomerKeys, user_id_from_notes
+from customer_partitions import PartitionStore
+from customer_stats import CustomerStats
+from file_lock import FileLock
+from phone_index import PhoneIndex
+from phone_utils import national_phone
+from status_log import BEFORE, PHONE, STATUS, StatusLog
+from write_buffer import WriteBuffer
+
+# Pending status updates that trigger a background compaction of the CSV
+COMPACT_THRESHOLD = int(os.getenv('CSV_COMPACT_THRESHOLD', '1000'))
+
+# Group commit for add_customer: batch window (0 = write each row directly) and size
+WRITE_BATCH_MS = int(os.getenv('CSV_WRITE_BATCH_MS', '0'))
+WRITE_BATCH_ROWS = int(os.getenv('CSV_WRITE_BATCH_ROWS', '100'))
+
+# 'flush' hands writes to the OS; 'fsync' also waits for them to reach the disk
+DURABILITY = os.getenv('CSV_DURABILITY', 'flush')
+
+# 'off' (the default) keeps everything in one file; 'monthly' seals the CSV's rows
+# into monthly partitions when a new month starts. A size limit (MB, 0 = none) also triggers it.
+PARTITIONS = os.getenv('CSV_PARTITIONS', 'off')
+PARTITION_MODES = ('off', 'monthly')
+PARTITION_MAX_MB = float(os.getenv('CSV_PARTITION_MAX_MB', '0'))
+COMPRESS_PARTITIONS = os.getenv('CSV_COMPRESS_PARTITIONS', '0') == '1'
+
+class CustomerSnapshot(NamedTuple):
+    """A consistent view of the customers files, taken under the write lock"""
+    file: BinaryIO  # The CSV, open for reading; the view is its rows before `end`
+    updates: Dict  # Status log entries by phone, for StatusLog.apply / effective_status
+    end: int
+    sealed: List[Dict]  # Manifest entries of the sealed partitions
+    inode: int  # Of the CSV the offsets refer to; changes when it is compacted or rotated
+    log_entries: List  # Status log entries in order, for readers that track the log
 
 class CSVManager:
-    def __init__(self, csv_file="viv_clinic_customers.csv"):
+    def __init__(self, csv_file="viv_clinic_customers.csv", compact_threshold=COMPACT_THRESHOLD,
+                 write_batch_ms=WRITE_BATCH_MS, write_batch_rows=WRITE_BATCH_ROWS, durability=DURABILITY,
+                 partitions=PARTITIONS, partition_max_mb=PARTITION_MAX_MB, compress_partitions=COMPRESS_PARTITIONS):
+        if partitions not in PARTITION_MODES:
+            raise ValueError(f"unknown partitions mode {partitions!r} (CSV_PARTITIONS): use 'off' or 'monthly'")
         self.csv_file = Path(__file__).parent / csv_file
         self.headers = [
             "תאריך",
@@ -20,7 +68,49 @@ class CSVManager:
             "סטטוס",
             "הערות"
         ]
-        self.init_csv()
+        
+        # Serializes writes across threads and worker processes
+        self._lock = FileLock(self.csv_file.with_name(self.csv_file.name + '.lock'))
+        self._compaction_lock = threading.Lock()
+        self._compacting = False
+        self.compact_threshold = compact_threshold
+        
+        # Phone -> row offsets, so lookups seek straight to the rows
+        self.phone_index = PhoneIndex(self.csv_file, self.headers.index("טלפון"))
+        
+        # Status changes are logged and merged at read time, then compacted in
+        self.status_log = StatusLog(
+            self.csv_file,
+            self.headers.index("טלפון"),
+            self.headers.index("סטטוס"),
+            self.headers.index("הערות")
+        )
+        
+        # Running totals for get_stats, snapshotted next to the CSV
+        self.stats = self._new_stats()
+        
+        # Facebook user ids and phones of known customers, for upserts
+        self.customer_keys = CustomerKeys(self.csv_file)
+        self.upsert_stats = {"inserted": 0, "merged": 0}
+        
+        # Sealed monthly partitions; this CSV holds the current one
+        self.partitions = PartitionStore(self.csv_file, self.headers, compress_partitions)
+        self.partition_mode = partitions
+        self.partition_max_bytes = int(partition_max_mb * 1024 * 1024)
+        
+        with self._lock:
+            self.init_csv()
+            self._load_state()
+        atexit.register(self.save_stats)
+        
+        self.durability = durability
+        self.write_buffer = None
+        if write_batch_ms > 0:
+            self.write_buffer = WriteBuffer(self._append_rows, write_batch_rows, write_batch_ms)
+            atexit.register(self.write_buffer.close)
+        
+        self._analytics = None
+        self._search_index = None
     
     def init_csv(self):
         """Initialize CSV file with headers if it doesn't exist"""
@@ -32,14 +122,114 @@ class CSVManager:
         else:
             print(f"✅ CSV file exists: {self.csv_file}")
     
+    def _load_state(self):
+        """Load the index, update log, stats and partitions for the files as they are on disk"""
+        self.partitions.load()
+        if self.partitions.rotated_inode == self.csv_file.stat().st_ino:
+            self._reset_active_file()  # Finish a rotation interrupted after sealing
+        
+        self.phone_index.load()
+        self.status_log.load()
+        self._load_stats()
+        self._load_customer_keys()
+        self._active_month = self._first_month()
+    
+    def _first_month(self):
+        """Month (YYYY-MM) of the first row in the CSV, or None if it has no rows"""
+        with open(self.csv_file, 'rb') as f:
+            for _, raw in iter_records(f, len(f.readline())):
+                row = parse_record(raw)
+                if row:
+                    return row[0][:7]
+        return None
+    
+    def _rotation_due(self, rows):
+        if self._active_month is None:
+            return False
+        if self.partition_mode == 'monthly' and rows[0][0][:7] != self._active_month:
+            return True
+        return bool(self.partition_max_bytes) and self._synced_size >= self.partition_max_bytes
+    
+    def _rotate(self):
+        """Seal the CSV's rows into partitions and start it over (caller holds the lock)"""
+        rows = []
+        with open(self.csv_file, 'rb') as f:
+            for offset, raw in iter_records(f, len(f.readline()), self._synced_size):
+                row = parse_record(raw)
+                if row:
+                    rows.append(self.status_log.apply(row, offset))
+        
+        self.partitions.seal(rows, self.csv_file.stat().st_ino)
+        if self.partitions.compress:
+            self.partitions.compress_partitions(keep_months=0)
+        self._reset_active_file()
+        print(f"✅ Sealed {len(rows)} customers into monthly partitions")
+    
+    def _reset_active_file(self):
+        """Replace the CSV with a header-only file and empty index, log and stats"""
+        header_line = encode_row(self.headers)
+        fd, temp_file = tempfile.mkstemp(prefix=self.csv_file.name + '.', suffix='.tmp', dir=self.csv_file.parent)
+        os.fchmod(fd, os.stat(self.csv_file).st_mode & 0o777)  # mkstemp creates it 0600
+        with open(fd, 'wb') as f:
+            f.write(header_line)
+            f.flush()
+            os.fsync(f.fileno())
+            new_inode = os.fstat(f.fileno()).st_ino
+        
+        self.status_log.write_file(self.status_log.temp_file, [], new_inode)
+        os.replace(temp_file, self.csv_file)
+        self.status_log.install([])
+        self.phone_index.replace([], len(header_line))
+        self.stats.reset()
+        self._synced_size = len(header_line)
+        self.stats.save(self._stats_state())
+        self._active_month = None
+    
+    def _sync_with_disk(self):
+        """Catch up with rows and updates written by other processes (caller holds the lock)"""
+        csv_stat = self.csv_file.stat()
+        if csv_stat.st_ino != self.phone_index.base_inode:
+            self._load_state()  # Compacted or rotated by another process
+            return
+        self.partitions.sync()
+        self.customer_keys.sync()
+        
+        if csv_stat.st_size > self._synced_size:
+            self.phone_index.sync()
+            with open(self.csv_file, 'rb') as f:
+                self._count_rows(f, self.stats, self._synced_size, csv_stat.st_size)
+            self._synced_size = csv_stat.st_size
+        
+        entries = self.status_log.sync()
+        if entries is None:
+            self._load_state()
+            return
+        for entry in entries:
+            if entry[STATUS] is not None:
+                self._count_status_change(entry[PHONE], entry[BEFORE], entry[STATUS])
+            self.status_log.add_entry(entry)
+    
+    @contextmanager
+    def _exclusive(self):
+        """Hold the write lock with in-memory state caught up with the files"""
+        with self._lock:
+            self._sync_with_disk()
+            yield
+    
+    def get_lock_stats(self):
+        """Get write lock acquisitions and wait times for this process"""
+        return self._lock.get_stats()
+    
     def add_customer(self, name, phone, topic, source="Facebook", status="חדש", notes=""):
         """Add new customer to CSV"""
         try:
             date = datetime.now().strftime("%Y-%m-%d %H:%M")
+            row = [date, name, phone, topic, source, status, notes]
             
-            with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([date, name, phone, topic, source, status, notes])
+            if self.write_buffer:
+                self.write_buffer.add(row)
+            else:
+                self._append_rows([row])
             
             print(f"✅ Added customer: {name} - {phone}")
             return True
@@ -48,116 +238,538 @@ class CSVManager:
             print(f"❌ Error adding customer: {e}")
             return False
     
+    def _append_rows(self, rows, contacts=None):
+        """Append rows to the CSV and index them by phone; contacts default to the rows' own"""
+        encoded = [encode_row(row) for row in rows]
+        phone_column = self.phone_index.phone_column
+        
+        with self._exclusive():
+            if self._rotation_due(rows):
+                self._rotate()
+            if self._active_month is None:
+                self._active_month = rows[0][0][:7]
+            
+            with open(self.csv_file, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(b''.join(encoded))
+                if self.durability == 'fsync':
+                    f.flush()
+                    os.fsync(f.fileno())
+            
+            entries = []
+            for row, raw in zip(rows, encoded):
+                entries.append((offset, offset + len(raw), row[phone_column]))
+                offset += len(raw)
+            self._synced_size = offset
+            self.phone_index.extend(entries)
+            self.stats.add_rows(rows)
+            self._save_stats_if_due()
+            self.customer_keys.append(contacts or [self._contact(row) for row in rows])
+    
+    def _contact(self, row):
+        """Contacts-file entry for a customer row: [date, user id, phone, source, topic]"""
+        date, _, phone, topic, source, _, notes = (row + [''] * len(self.headers))[:len(self.headers)]
+        return [date, user_id_from_notes(notes), phone, source, topic[:TOPIC_LENGTH]]
+    
+    def _load_customer_keys(self):
+        """Catch up on contacts, building the contacts file from the customer rows the first time"""
+        if self.customer_keys.contacts_file.exists():
+            self.customer_keys.sync()
+            return
+        
+        def contacts():
+            for entry in self.partitions.partitions:
+                for row in self.partitions.read_rows(entry):
+                    yield self._contact(row)
+            columns = [self.headers.index(name) for name in ("תאריך", "טלפון", "נושא", "מקור", "הערות")]
+            with open(self.csv_file, 'rb') as f:
+                for _, _, (date, phone, topic, source, notes) in scan_columns(f, columns):
+                    yield self._contact([date, '', phone, topic, source, '', notes])
+        
+        self.customer_keys.seed(contacts())
+    
+    def upsert_customer(self, name, phone, topic, source="Facebook", status="חדש", notes="", user_id=None):
+        """Add a customer, or record another contact from one already known by Facebook user id or phone
+        
+        Phones are stored normalized (0501234567). A known customer gets no new row,
+        just a history entry, unless they gave a phone number they have not used before.
+        """
+        try:
+            date = datetime.now().strftime("%Y-%m-%d %H:%M")
+            phone = national_phone(phone) or phone
+            if user_id and not notes:
+                notes = f"Facebook User ID: {user_id}"
+            
+            self.flush_writes()  # Buffered rows must be on disk before deciding
+            with self._exclusive():
+                if national_phone(phone):
+                    key = self.customer_keys.find(phone=phone)  # A number not stored yet gets its own row
+                else:
+                    key = self.customer_keys.find(user_id)
+                known_phone = key is not None and self.customer_keys.customers[key]["phone"]
+                if key is None:
+                    # The user id goes into the contacts even when notes were given
+                    self._append_rows([[date, name, phone, topic, source, status, notes]],
+                                      [[date, user_id or user_id_from_notes(notes), phone, source, topic[:TOPIC_LENGTH]]])
+                    self.upsert_stats["inserted"] += 1
+                    print(f"✅ Added customer: {name} - {phone}")
+                else:
+                    self.customer_keys.append([[date, user_id or '', phone, source, topic[:TOPIC_LENGTH]]])
+                    self.upsert_stats["merged"] += 1
+                    print(f"✅ Recorded contact from existing customer: {name} - {known_phone or phone}")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error upserting customer: {e}")
+            return False
+    
+    def get_upsert_stats(self):
+        """Customers inserted vs contacts merged into known customers by this process"""
+        return dict(self.upsert_stats)
+    
+    def get_customer_history(self, user_id=None, phone=None):
+        """Recent contacts of a customer by Facebook user id or phone, oldest first"""
+        try:
+            self.flush_writes()
+            with self._exclusive():
+                key = self.customer_keys.find(user_id, phone)
+                return self.customer_keys.history(key) if key else []
+        except Exception as e:
+            print(f"❌ Error reading customer history: {e}")
+            return []
+    
+    def flush_writes(self):
+        """Write buffered customer rows now"""
+        if self.write_buffer:
+            self.write_buffer.flush()
+    
+    @contextmanager
+    def snapshot(self):
+        """Take a CustomerSnapshot for reading the customers outside the write lock
+        
+        The lock is held while the with block runs: read anything else that must
+        match the snapshot (phone_index, partitions) there, and scan the file after
+        the block. The caller closes snapshot.file (`with snapshot.file as f:`).
+        """
+        self.flush_writes()
+        with self._exclusive():
+            snapshot = self._take_snapshot()
+            try:
+                yield snapshot
+            except BaseException:
+                snapshot.file.close()
+                raise
+    
+    def _take_snapshot(self):
+        with self._exclusive():
+            sealed = [dict(entry) for entry in self.partitions.partitions]
+            return CustomerSnapshot(open(self.csv_file, 'rb'), self.status_log.by_phone, self._synced_size, sealed,
+                                    self.phone_index.base_inode, list(self.status_log.entries))
+    
     def get_customers(self, limit=10):
         """Get recent customers from CSV"""
         try:
-            customers = []
+            self.flush_writes()
+            snapshot = self._take_snapshot()
+            updates, end, sealed = snapshot.updates, snapshot.end, snapshot.sealed
+            with snapshot.file as f:
+                header = parse_record(f.readline())
+                data_start = f.tell()
+                
+                if limit <= 0:
+                    start = data_start
+                else:
+                    # Seek from the end and parse only the rows we return
+                    starts = find_tail_record_starts(f, limit, data_start, end)
+                    start = starts[0] if starts else end
+                
+                customers = []
+                for offset, raw in iter_records(f, start, end):
+                    row = parse_record(raw)
+                    if row:
+                        self.status_log.apply(row, offset, updates)
+                        customers.append(dict(zip(header, row)))
             
-            with open(self.csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    customers.append(row)
+            # Older rows come from the newest sealed partitions that are needed
+            older = []
+            for entry in reversed(sealed):
+                if 0 < limit <= len(customers) + len(older):
+                    break
+                older[:0] = islice(self.partitions.read_rows(entry), entry['rows'])
+            if limit > 0:
+                older = older[len(older) - max(limit - len(customers), 0):]
             
-            # Return most recent customers
-            return customers[-limit:] if len(customers) > limit else customers
+            return [dict(zip(self.headers, row)) for row in older] + customers
             
         except Exception as e:
             print(f"❌ Error reading customers: {e}")
             return []
     
+    def iter_customer_rows(self, chunk_size=1000):
+        """Yield all customers as rows in header order, oldest first, chunk_size rows at a time
+        
+        Reads a snapshot without holding the lock, so memory stays at one chunk
+        however many customers there are.
+        """
+        self.flush_writes()
+        snapshot = self._take_snapshot()
+        updates, end = snapshot.updates, snapshot.end
+        with snapshot.file as f:
+            chunk = []
+            for entry in snapshot.sealed:
+                # Rows sealed into this partition after the snapshot are in the CSV below
+                for row in islice(self.partitions.read_rows(entry), entry['rows']):
+                    chunk.append(row)
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+            
+            f.readline()
+            for offset, raw in iter_records(f, f.tell(), end):
+                row = parse_record(raw)
+                if row:
+                    chunk.append(self.status_log.apply(row, offset, updates))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+            if chunk:
+                yield chunk
+    
     def search_customer(self, phone):
         """Search for customer by phone number"""
         try:
-            with open(self.csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['טלפון'] == phone:
-                        return row
-            return None
+            self.flush_writes()
+            with self._exclusive():
+                # The oldest row wins, and sealed partitions are older than the CSV
+                if phone in self.partitions.phones:
+                    row = self.partitions.find_first(phone)
+                    if row:
+                        return dict(zip(self.headers, row))
+                
+                offsets = self.phone_index.lookup(phone)
+                if not offsets:
+                    return None
+                offset = offsets[0]
+                snapshot = self._take_snapshot()
+            
+            with snapshot.file as f:
+                header = parse_record(f.readline())
+                for _, raw in iter_records(f, offset):
+                    row = self.status_log.apply(parse_record(raw), offset, snapshot.updates)
+                    return dict(zip(header, row))
+                return None
             
         except Exception as e:
             print(f"❌ Error searching customer: {e}")
             return None
     
-    def update_customer_status(self, phone, new_status, notes=""):
-        """Update customer status"""
+    def update_customer_status(self, phone, new_status, notes="", clear_notes=False):
+        """Update customer status; empty notes keep the current notes unless clear_notes"""
         try:
-            customers = []
-            updated = False
-            
-            # Read all customers
-            with open(self.csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['טלפון'] == phone:
-                        row['סטטוס'] = new_status
-                        if notes:
-                            row['הערות'] = notes
-                        updated = True
-                    customers.append(row)
-            
-            if updated:
-                # Write back all customers
-                with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=self.headers)
-                    writer.writeheader()
-                    writer.writerows(customers)
-                
-                print(f"✅ Updated customer {phone} status to: {new_status}")
-                return True
-            else:
-                print(f"⚠️  Customer {phone} not found")
-                return False
+            self.flush_writes()
+            with self._exclusive():
+                if not self._update_status(phone, new_status, None if clear_notes else notes):
+                    print(f"⚠️  Customer {phone} not found")
+                    return False
+                self._save_stats_if_due()
+                start_compaction = self._compaction_due()
+            
+            if start_compaction:
+                threading.Thread(target=self._compact_in_background, name="csv-compaction", daemon=True).start()
+            
+            print(f"✅ Updated customer {phone} status to: {new_status}")
+            return True
                 
         except Exception as e:
             print(f"❌ Error updating customer: {e}")
             return False
     
-    def export_to_google_sheets_format(self):
-        """Export CSV in format ready for Google Sheets import"""
+    def append_customer_notes(self, additions):
+        """Append text to customers' notes, keeping each row's status and notes: additions maps phone -> text
+        
+        Returns how many phones were found.
+        """
         try:
-            customers = self.get_customers(limit=1000)  # Get all customers
-            
-            # Create formatted data for Google Sheets
-            sheets_data = []
-            sheets_data.append(self.headers)  # Headers
-            
-            for customer in customers:
-                row = [
-                    customer.get('תאריך', ''),
-                    customer.get('שם', ''),
-                    customer.get('טלפון', ''),
-                    customer.get('נושא', ''),
-                    customer.get('מקור', ''),
-                    customer.get('סטטוס', ''),
-                    customer.get('הערות', '')
-                ]
-                sheets_data.append(row)
+            self.flush_writes()
+            updated = 0
+            with self._exclusive():
+                for phone, text in additions.items():
+                    in_partitions = phone in self.partitions.phones
+                    if in_partitions:
+                        self.partitions.append_notes(phone, text)
+                    if self.phone_index.lookup(phone):
+                        self.status_log.append(phone, self.phone_index.indexed_size, None, text)
+                    elif not in_partitions:
+                        continue
+                    updated += 1
+                start_compaction = self._compaction_due()
+            
+            if start_compaction:
+                threading.Thread(target=self._compact_in_background, name="csv-compaction", daemon=True).start()
+            
+            print(f"✅ Added notes for {updated} of {len(additions)} customers")
+            return updated
+                
+        except Exception as e:
+            print(f"❌ Error updating customer notes: {e}")
+            return 0
+    
+    def _update_status(self, phone, new_status, notes):
+        """Apply one phone's status change, notes None clearing them (caller holds the lock); False if unknown"""
+        in_partitions = phone in self.partitions.phones
+        if not self.phone_index.lookup(phone) and not in_partitions:
+            return False
+        
+        # Sealed partitions are small; rewrite the ones holding this phone
+        if in_partitions:
+            self.partitions.update_status(phone, new_status, notes)
+        
+        if self.phone_index.lookup(phone):
+            # Applies to this phone's rows written so far; folded in by compaction
+            before = self.phone_index.indexed_size
+            self._count_status_change(phone, before, new_status)
+            self.status_log.append(phone, before, new_status, notes)
+        return True
+    
+    def _compaction_due(self):
+        """Claim the background compaction if the status log is long enough (caller holds the lock)"""
+        if len(self.status_log.entries) >= self.compact_threshold and not self._compacting:
+            self._compacting = True
+            return True
+        return False
+    
+    def _count_status_change(self, phone, before, new_status):
+        """Move this phone's rows that start before `before` to new_status in the stats"""
+        with open(self.csv_file, 'rb') as f:
+            for offset in self.phone_index.lookup(phone):
+                if offset < before:
+                    row = self.status_log.apply(read_record(f, offset), offset)
+                    self.stats.change_status(row, new_status)
+    
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"❌ Error compacting customers CSV: {e}")
+        finally:
+            self._compacting = False
+    
+    def compact(self):
+        """Fold logged status updates into the CSV and swap the new file in atomically
+        
+        Only the updated rows are re-encoded; everything else is copied as raw
+        bytes. Appends and updates keep working while the copy runs: rows
+        appended meanwhile are copied over at the swap, and updates logged
+        meanwhile are carried over to the new log.
+        """
+        with self._compaction_lock:
+            self._compact()
+    
+    def _compact(self):
+        with self._exclusive():
+            folded = len(self.status_log.entries)
+            if not folded:
+                return
+            base_inode = self.phone_index.base_inode
+            updates = {}
+            for entry in self.status_log.entries:
+                updates.setdefault(entry[0], []).append(entry)
+            base_size = self._synced_size
+            targets = sorted(
+                offset
+                for phone, entries in updates.items()
+                for offset in self.phone_index.lookup(phone)
+                if offset < max(entry[BEFORE] for entry in entries)
+            )
+        
+        # Unique per compaction, since other processes may be compacting too
+        fd, temp_file = tempfile.mkstemp(prefix=self.csv_file.name + '.', suffix='.tmp', dir=self.csv_file.parent)
+        os.fchmod(fd, os.stat(self.csv_file).st_mode & 0o777)  # mkstemp creates it 0600
+        changes = []
+        with open(self.csv_file, 'rb') as src, open(fd, 'wb') as dst:
+            position = 0
+            for offset in targets:
+                src.seek(position)
+                _copy_bytes(src, dst, offset - position)
+                for _, raw in iter_records(src, offset):
+                    row = self.status_log.apply(parse_record(raw), offset, updates)
+                    new_raw = encode_row(row)
+                    dst.write(new_raw)
+                    changes.append((offset, len(new_raw) - len(raw)))
+                    position = offset + len(raw)
+                    break
             
+            src.seek(position)
+            _copy_bytes(src, dst, base_size - position)
+            
+            with self._exclusive():
+                if self.phone_index.base_inode != base_inode:
+                    dst.close()
+                    os.remove(temp_file)
+                    return  # Another process compacted first
+                
+                # Rows appended while copying
+                src.seek(base_size)
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+                new_size = dst.tell()
+                shift = sum(delta for _, delta in changes)
+                
+                # Updates logged while copying refer to the old size; shift them
+                remaining = [list(entry) for entry in self.status_log.entries[folded:]]
+                for entry in remaining:
+                    entry[BEFORE] += shift
+                
+                # Crash after the CSV swap leaves the new log as .tmp for load()
+                new_inode = os.fstat(dst.fileno()).st_ino
+                self.status_log.write_file(self.status_log.temp_file, remaining, new_inode)
+                os.replace(temp_file, self.csv_file)
+                self.status_log.install(remaining)
+                self.phone_index.remap(changes, new_size)
+                self._synced_size = new_size
+                self.stats.save(self._stats_state())
+        
+        print(f"✅ Compacted {folded} status updates into {self.csv_file.name}")
+    
+    def get_analytics(self):
+        """Columnar snapshot for dashboard queries, refreshed by each query (requires numpy)"""
+        if self._analytics is None:
+            from customer_analytics import CustomerAnalytics
+            self._analytics = CustomerAnalytics(self)
+        return self._analytics
+    
+    def get_search_index(self):
+        """Full-text index over names, phones and topics, caught up by each search"""
+        if self._search_index is None:
+            from customer_search import CustomerSearchIndex
+            self._search_index = CustomerSearchIndex(self)
+        return self._search_index
+    
+    def search_customers(self, query, limit=20):
+        """Search customers by name, phone (any format) or topic words, allowing prefixes and typos"""
+        try:
+            return self.get_search_index().search(query, limit)
+        except Exception as e:
+            print(f"❌ Error searching customers: {e}")
+            return []
+    
+    def verify_index(self):
+        """Check the phone index against a full scan of the CSV"""
+        self.flush_writes()
+        return self.phone_index.verify()
+    
+    def export_to_google_sheets_format(self):
+        """Export all customers in format ready for Google Sheets import (headers first)
+        
+        Builds the whole list; customer_export streams large exports instead.
+        """
+        try:
+            sheets_data = [self.headers]
+            for chunk in self.iter_customer_rows():
+                sheets_data.extend(chunk)
             return sheets_data
             
         except Exception as e:
             print(f"❌ Error exporting to Google Sheets format: {e}")
             return []
     
-    def get_stats(self):
-        """Get customer statistics"""
+    def _stats_state(self):
+        """The CSV state the stats reflect: file identity, size and pending updates"""
+        csv_stat = self.csv_file.stat()
+        return {
+            "inode": csv_stat.st_ino,
+            "size": csv_stat.st_size,
+            "updates": len(self.status_log.entries)
+        }
+    
+    def _load_stats(self):
+        """Load the stats snapshot, catching up on new rows or recomputing if stale"""
+        state = self._stats_state()
+        covered = self.stats.load(state)
+        if covered is None:
+            self.stats.reset()
+        
+        with open(self.csv_file, 'rb') as f:
+            self._count_rows(f, self.stats, covered or None, state["size"])
+        
+        if covered is None:
+            print(f"✅ Recomputed customer stats: {self.stats.total} rows")
+        if self.stats.dirty:
+            self.stats.save(state)
+        self._synced_size = state["size"]
+    
+    def _save_stats_if_due(self):
+        if self.stats.save_due():
+            self.stats.save(self._stats_state())
+    
+    def save_stats(self):
+        """Write the stats snapshot if it has unsaved changes"""
         try:
-            customers = self.get_customers(limit=1000)
-            
-            stats = {
-                "total_customers": len(customers),
-                "sources": {},
-                "statuses": {},
-                "recent_customers": len([c for c in customers if datetime.now().strftime("%Y-%m-%d") in c.get('תאריך', '')])
-            }
-            
-            for customer in customers:
-                source = customer.get('מקור', 'Unknown')
-                status = customer.get('סטטוס', 'Unknown')
-                
-                stats["sources"][source] = stats["sources"].get(source, 0) + 1
-                stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            with self._exclusive():
+                if self.stats.dirty:
+                    self.stats.save(self._stats_state())
+        except Exception as e:
+            print(f"❌ Error saving customer stats: {e}")
+    
+    def _count_rows(self, f, stats, start, end, updates=None, in_range=None):
+        """Add CSV rows start..end to stats, decoding only the columns stats need"""
+        columns = [self.headers.index(name) for name in ("תאריך", "טלפון", "מקור", "סטטוס")]
+        effective_status = self.status_log.effective_status
+        for offset, _, (date, phone, source, status) in scan_columns(f, columns, start, end):
+            if in_range and not in_range((date or '')[:10]):
+                continue
+            if phone is not None and status is not None:
+                status = effective_status(phone, offset, status, updates)
+            stats.add(date, source, status)
+    
+    def _new_stats(self):
+        return CustomerStats(
+            self.csv_file,
+            self.headers.index("תאריך"),
+            self.headers.index("מקור"),
+            self.headers.index("סטטוס")
+        )
+    
+    def get_stats(self, start_date=None, end_date=None):
+        """Get customer statistics, optionally for rows dated start_date..end_date (YYYY-MM-DD)"""
+        try:
+            self.flush_writes()
+            today = datetime.now().strftime("%Y-%m-%d")
+            
+            def in_range(day):
+                return bool(day) and (not start_date or day >= start_date) and (not end_date or day <= end_date)
+            
+            with self._exclusive():
+                stats = self.stats.summary(today)
+                active_inside = not (start_date or end_date) or all(in_range(day) for day in self.stats.days)
+                if not active_inside:
+                    snapshot = self._take_snapshot()
+                    f, updates, end = snapshot.file, snapshot.updates, snapshot.end
+                sealed = [
+                    (copy.deepcopy(entry), inside)
+                    for entry, inside in self.partitions.overlapping(start_date, end_date)
+                ]
+            
+            # Partitions entirely inside the range use their counters; others are scanned
+            if not active_inside:
+                partial = self._new_stats()
+                with f:
+                    self._count_rows(f, partial, None, end, updates, in_range)
+                stats = partial.summary(today)
+            
+            for entry, inside in sealed:
+                if inside:
+                    _merge_stats(stats, {
+                        "total_customers": entry['rows'],
+                        "sources": entry['sources'],
+                        "statuses": entry['statuses'],
+                        "recent_customers": entry['days'].get(today, 0)
+                    })
+                else:
+                    partial = self._new_stats()
+                    partial.add_rows(row for row in self.partitions.read_rows(entry) if in_range(row[0][:10]))
+                    _merge_stats(stats, partial.summary(today))
             
             return stats
             
@@ -165,6 +777,23 @@ class CSVManager:
             print(f"❌ Error getting stats: {e}")
             return {}
 
+def _merge_stats(stats, other):
+    """Add one get_stats result into another"""
+    stats["total_customers"] += other["total_customers"]
+    stats["recent_customers"] += other["recent_customers"]
+    for key in ("sources", "statuses"):
+        for name, count in other[key].items():
+            stats[key][name] = stats[key].get(name, 0) + count
+
+def _copy_bytes(src, dst, length, chunk_size=1024 * 1024):
+    """Copy length bytes from the current position of src to dst"""
+    while length > 0:
+        chunk = src.read(min(chunk_size, length))
+        if not chunk:
+            break
+        dst.write(chunk)
+        length -= len(chunk)
+
 if __name__ == "__main__":
     # Test the CSV manager
     csv_manager = CSVManager()
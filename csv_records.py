@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+CSV Record Helpers for VIV Clinic
+Byte-level access to customer CSV records: encoding, point reads and scans
+
+Records are addressed by the byte offset where they start. The quote and
+newline bytes never occur inside UTF-8 multi-byte characters, so raw bytes
+can be scanned safely.
+"""
+
+import csv
+import io
+
+# Read size when scanning the CSV backward from its end
+TAIL_BLOCK_SIZE = 64 * 1024
+
+def encode_row(values):
+    """Encode one row exactly as csv.writer writes it to the file"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode('utf-8')
+
+def parse_record(raw):
+    """Parse the raw bytes of one record into a list of fields"""
+    text = raw.decode('utf-8')
+    return next(csv.reader(io.StringIO(text, newline=None)), [])
+
+def iter_records(f, start, end=None):
+    """Yield (offset, raw bytes) for each record from `start` in a binary file
+
+    A record continues over newlines while it has an odd number of quotes,
+    so multi-line quoted notes come back as one record.
+    """
+    f.seek(start)
+    offset = start
+    while end is None or offset < end:
+        raw = f.readline()
+        if not raw:
+            break
+        while raw.count(b'"') % 2:
+            more = f.readline()
+            if not more:
+                break
+            raw += more
+        yield offset, raw
+        offset += len(raw)
+
+def read_record(f, offset):
+    """Read and parse the single record starting at offset"""
+    for _, raw in iter_records(f, offset):
+        return parse_record(raw)
+    return []
+
+def find_tail_record_starts(f, limit, data_start, end, block_size=TAIL_BLOCK_SIZE):
+    """Find byte offsets where the last `limit` records before `end` start
+
+    Scans backward in fixed-size blocks. A newline ends a record only if it is
+    outside quotes, i.e. an even number of quote characters follow it up to
+    `end` - so multi-line quoted notes stay intact.
+    """
+    starts = []
+    quotes = 0
+    block_end = end
+
+    while block_end > data_start and len(starts) < limit:
+        block_start = max(block_end - block_size, data_start)
+        f.seek(block_start)
+        block = f.read(block_end - block_start)
+
+        j = len(block)
+        while len(starts) < limit:
+            i = block.rfind(b'\n', 0, j)
+            if i < 0:
+                quotes += block.count(b'"', 0, j)
+                break
+            quotes += block.count(b'"', i + 1, j)
+            start = block_start + i + 1
+            if quotes % 2 == 0 and start < end:
+                starts.append(start)
+            j = i
+
+        block_end = block_start
+
+    # Reached the first data row without filling the limit
+    if len(starts) < limit and block_end <= data_start < end and data_start not in starts:
+        starts.append(data_start)
+
+    starts.reverse()
+    return starts
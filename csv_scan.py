@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+CSV Scan for VIV Clinic
+Column-projecting scans of the customers CSV over a memory map
+
+Full scans only need a few columns (source and status for stats, phone for
+the index), so rows are split on the raw bytes and only the requested fields
+are decoded - no dict per row and no strings for the other columns. Records
+containing quotes are rare (multi-line notes) and go through the csv module.
+Scanned pages are released as the scan moves on, so peak memory stays at
+one chunk rather than the whole file.
+"""
+
+import mmap
+import os
+from typing import Iterator, List, Optional, Tuple
+from csv_records import parse_record
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+def scan_columns(f, columns: List[int], start: Optional[int] = None,
+                 end: Optional[int] = None) -> Iterator[Tuple[int, int, List]]:
+    """Yield (offset, end offset, values) per record of an open binary file
+
+    Scans from start (default: after the header) to end. values holds the
+    requested columns in order; a column missing from a short row is None.
+    Blank lines are skipped.
+    """
+    size = os.fstat(f.fileno()).st_size
+    if size == 0:
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        if start is None:
+            start = mm.find(b'\n') + 1 or size
+        end = size if end is None else min(end, size)
+        split_limit = max(columns) + 1
+        released = 0
+
+        pos = start
+        chunk_size = CHUNK_SIZE
+        while pos < end:
+            # Work on whole lines, a few MB at a time
+            limit = min(pos + chunk_size, end)
+            chunk_end = end if limit == end else mm.rfind(b'\n', pos, limit) + 1
+            if chunk_end <= pos:
+                chunk_size *= 2  # One line longer than the chunk
+                continue
+
+            lines = mm[pos:chunk_end].split(b'\n')
+            if not lines[-1]:
+                lines.pop()
+            count = len(lines)
+            offset = pos
+            i = 0
+            while i < count:
+                line = lines[i]
+                i += 1
+                if b'"' in line:
+                    # Quoted fields may hold commas and newlines
+                    while line.count(b'"') % 2 and i < count:
+                        line += b'\n' + lines[i]
+                        i += 1
+                    if line.count(b'"') % 2 and chunk_end < end:
+                        break  # Record continues past the chunk, rescan from its start
+                    stop = min(offset + len(line) + 1, chunk_end)
+                    row = parse_record(line)
+                    if row:
+                        yield offset, stop, [row[c] if c < len(row) else None for c in columns]
+                else:
+                    stop = min(offset + len(line) + 1, chunk_end)
+                    line = line.rstrip(b'\r')
+                    if line:
+                        fields = line.split(b',', split_limit)
+                        yield offset, stop, [fields[c].decode('utf-8') if c < len(fields) else None for c in columns]
+                offset = stop
+
+            chunk_size = chunk_size * 2 if offset == pos else CHUNK_SIZE
+            pos = offset
+
+            # Drop scanned pages from this process; they stay in the page cache
+            if hasattr(mmap, 'MADV_DONTNEED'):
+                done = pos - pos % mmap.PAGESIZE
+                if done > released:
+                    mm.madvise(mmap.MADV_DONTNEED, released, done - released)
+                    released = done
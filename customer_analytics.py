@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Customer Analytics for VIV Clinic
+Columnar in-memory snapshot of the customers for dashboard queries
+
+Each sealed partition and the active CSV become NumPy columns: source,
+status and topic are dictionary-encoded (int32 codes into shared value
+lists) and the date is int64 epoch seconds. refresh() only scans rows
+appended since the last refresh and applies new status updates in place;
+a partition is re-read when it is rewritten, and the active columns are
+rebuilt when the CSV is compacted or rotated.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from csv_scan import scan_columns
+from status_log import BEFORE, PHONE, STATUS
+
+CATEGORIES = {"source": "מקור", "status": "סטטוס", "topic": "נושא"}
+SECONDS_PER_DAY = 86400
+NAT = -2 ** 63  # int64 epoch seconds of an unparseable date
+MAX_BINCOUNT = 1 << 24  # Count groups with bincount when the key space is this small
+
+class _Dictionary:
+    """Value <-> int32 code mapping for one categorical column"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value: Optional[str]) -> int:
+        value = 'Unknown' if value is None else value
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, values: List) -> "np.ndarray":
+        return np.fromiter(map(self.code, values), dtype=np.int32, count=len(values))
+
+def _epoch_seconds(dates: List) -> "np.ndarray":
+    """Parse 'YYYY-MM-DD HH:MM' dates to epoch seconds; unparseable dates become NaT"""
+    try:
+        parsed = np.array(dates, dtype='datetime64[m]')
+    except ValueError:
+        parsed = np.empty(len(dates), dtype='datetime64[m]')
+        for i, date in enumerate(dates):
+            try:
+                parsed[i] = np.datetime64(date, 'm')
+            except ValueError:
+                parsed[i] = np.datetime64('NaT')
+    return parsed.astype('datetime64[s]').astype(np.int64)
+
+class CustomerAnalytics:
+    """Vectorized counts over all customers, active and sealed"""
+
+    def __init__(self, csv_manager):
+        if np is None:
+            raise ImportError("numpy is required for customer analytics")
+
+        self.manager = csv_manager
+        headers = csv_manager.headers
+        self.date_column = headers.index("תאריך")
+        self.phone_column = headers.index("טלפון")
+        self.category_columns = {name: headers.index(header) for name, header in CATEGORIES.items()}
+        self.dictionaries = {name: _Dictionary() for name in CATEGORIES}
+
+        self._lock = threading.Lock()
+        self._partitions = {}  # name -> (file signature, columns)
+        self._active = None
+        self._active_inode = None
+        self._active_size = 0
+        self._log_count = 0
+        self._combined = None
+
+    def _columns(self, dates, categories, offsets=None) -> Dict:
+        columns = {name: self.dictionaries[name].encode(categories[name]) for name in CATEGORIES}
+        columns["time"] = _epoch_seconds(dates)
+        if offsets is not None:
+            columns["offset"] = np.array(offsets, dtype=np.int64)
+        return columns
+
+    def _read_partition(self, entry: Dict) -> Dict:
+        dates = []
+        categories = {name: [] for name in CATEGORIES}
+        for row in self.manager.partitions.read_rows(entry):
+            dates.append(row[self.date_column] if len(row) > self.date_column else '')
+            for name, column in self.category_columns.items():
+                categories[name].append(row[column] if len(row) > column else None)
+        return self._columns(dates, categories)
+
+    def _scan_active(self, f, start: int, end: int, by_phone) -> Dict:
+        """Columns for active CSV rows start..end with pending status updates applied"""
+        names = list(CATEGORIES)
+        columns = [self.date_column, self.phone_column] + [self.category_columns[name] for name in names]
+        status_index = names.index("status")
+        effective_status = self.manager.status_log.effective_status
+
+        offsets, dates = [], []
+        categories = {name: [] for name in names}
+        for offset, _, values in scan_columns(f, columns, start or None, end):
+            offsets.append(offset)
+            dates.append(values[0] or '')
+            phone = values[1]
+            for i, name in enumerate(names):
+                value = values[2 + i]
+                if i == status_index and phone is not None and value is not None:
+                    value = effective_status(phone, offset, value, by_phone)
+                categories[name].append(value)
+        return self._columns(dates, categories, offsets)
+
+    def refresh(self):
+        """Bring the snapshot up to date with the customers files"""
+        with self._lock:
+            manager = self.manager
+            with manager.snapshot() as snapshot:
+                f, by_phone, end, inode = snapshot.file, snapshot.updates, snapshot.end, snapshot.inode
+                # Rewritten partitions get a new inode, sealing more rows changes the size
+                sealed = {
+                    entry['name']: ((entry['file'], entry['bytes'], manager.partitions.path(entry).stat().st_ino), dict(entry))
+                    for entry in snapshot.sealed
+                }
+                entries = snapshot.log_entries
+                rebuild = inode != self._active_inode or len(entries) < self._log_count
+                if rebuild:
+                    new_entries = []
+                else:
+                    new_entries = entries[self._log_count:]
+                targets = {
+                    entry[PHONE]: [offset for offset in manager.phone_index.lookup(entry[PHONE]) if offset < self._active_size]
+                    for entry in new_entries
+                }
+                log_count = len(entries)
+
+            changed = rebuild or end != self._active_size or bool(new_entries)
+            with f:
+                if rebuild:
+                    self._active = self._scan_active(f, 0, end, by_phone)
+                else:
+                    # Updates logged since the last refresh, for rows already loaded
+                    status = self.dictionaries["status"]
+                    for entry in new_entries:
+                        if entry[STATUS] is None:
+                            continue  # Notes only
+                        offsets = [offset for offset in targets[entry[PHONE]] if offset < entry[BEFORE]]
+                        if offsets:
+                            rows = np.searchsorted(self._active["offset"], offsets)
+                            self._active["status"][rows] = status.code(entry[STATUS])
+                    if end > self._active_size:
+                        appended = self._scan_active(f, self._active_size, end, by_phone)
+                        self._active = {name: np.concatenate((self._active[name], appended[name])) for name in appended}
+
+            for name in list(self._partitions):
+                if name not in sealed:
+                    del self._partitions[name]
+                    changed = True
+            for name, (signature, entry) in sealed.items():
+                current = self._partitions.get(name)
+                if current is None or current[0] != signature:
+                    self._partitions[name] = (signature, self._read_partition(entry))
+                    changed = True
+
+            self._active_inode = inode
+            self._active_size = end
+            self._log_count = log_count
+            if changed or self._combined is None:
+                segments = [self._partitions[name][1] for name in sorted(self._partitions)] + [self._active]
+                self._combined = {
+                    name: np.concatenate([segment[name] for segment in segments])
+                    for name in list(CATEGORIES) + ["time"]
+                }
+
+    def _mask(self, columns: Dict, start_date: Optional[str], end_date: Optional[str]):
+        """Rows dated start_date..end_date (YYYY-MM-DD, inclusive), or None for all rows"""
+        if not start_date and not end_date:
+            return None
+        times = columns["time"]
+        mask = times != NAT
+        if start_date:
+            mask &= times >= np.datetime64(start_date, 's').astype(np.int64)
+        if end_date:
+            mask &= times < (np.datetime64(end_date, 'D') + 1).astype('datetime64[s]').astype(np.int64)
+        return mask
+
+    def _select(self, start_date, end_date) -> Dict:
+        self.refresh()
+        columns = self._combined
+        mask = self._mask(columns, start_date, end_date)
+        if mask is None:
+            return columns
+        return {name: values[mask] for name, values in columns.items()}
+
+    def _day_codes(self, times):
+        """Day numbers counted from the first day (0 for undated rows) and their labels"""
+        dated = times != NAT
+        if not dated.any():
+            return np.zeros(len(times), dtype=np.int64), [None]
+        days = times // SECONDS_PER_DAY
+        first = int(days[dated].min())
+        codes = np.where(dated, days - first + 1, 0)
+        labels = [None] + [str(day) for day in np.arange(first, int(days.max()) + 1).astype('datetime64[D]')]
+        return codes, labels
+
+    def total(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> int:
+        """Number of customers, optionally dated start_date..end_date"""
+        return int(len(self._select(start_date, end_date)["time"]))
+
+    def count_by(self, *group_by: str, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None) -> List[Dict]:
+        """Customer counts grouped by any of source, status, topic and day, largest first
+
+        Each result is a dict of the group values plus "count"; undated rows have day None.
+        """
+        for name in group_by:
+            if name not in CATEGORIES and name != "day":
+                raise ValueError(f"unknown column: {name}")
+        columns = self._select(start_date, end_date)
+        if not len(columns["time"]):
+            return []
+
+        # Number each group column 0..n-1 and combine them into one int64 key
+        parts = []
+        for name in group_by:
+            if name == "day":
+                parts.append(("day",) + self._day_codes(columns["time"]))
+            else:
+                parts.append((name, columns[name].astype(np.int64), self.dictionaries[name].values))
+
+        key = np.zeros(len(columns["time"]), dtype=np.int64)
+        key_space = 1
+        for _, codes, labels in parts:
+            key = key * len(labels) + codes
+            key_space *= len(labels)
+
+        if key_space <= MAX_BINCOUNT:
+            counts = np.bincount(key, minlength=key_space)
+            keys = np.flatnonzero(counts)
+            counts = counts[keys]
+        else:
+            keys, counts = np.unique(key, return_counts=True)
+
+        results = []
+        for key_value, count in zip(keys.tolist(), counts.tolist()):
+            result = {}
+            for name, _, labels in reversed(parts):
+                key_value, code = divmod(key_value, len(labels))
+                result[name] = labels[code]
+            result = {name: result[name] for name in group_by}
+            result["count"] = count
+            results.append(result)
+        results.sort(key=lambda result: -result["count"])
+        return results
+
+    def top(self, column: str, limit: int = 10, start_date: Optional[str] = None,
+            end_date: Optional[str] = None) -> List[Dict]:
+        """Most common values of source, status or topic"""
+        if column not in CATEGORIES:
+            raise ValueError(f"unknown column: {column}")
+        codes = self._select(start_date, end_date)[column]
+        counts = np.bincount(codes, minlength=len(self.dictionaries[column].values))
+        order = np.argsort(-counts, kind='stable')[:limit]
+        values = self.dictionaries[column].values
+        return [{column: values[code], "count": int(counts[code])} for code in order.tolist() if counts[code]]
+
+    def conversion(self, from_status: str = "חדש", to_status: str = "ממתין לטיפול", by: Optional[str] = None,
+                   start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict]:
+        """Customers still at from_status vs moved to to_status, overall or per source/topic
+
+        rate is to / (from + to): the share of those customers that converted.
+        """
+        groups = self.count_by(*([by] if by else []), "status", start_date=start_date, end_date=end_date)
+        results = {}
+        for group in groups:
+            name = group[by] if by else None
+            result = results.setdefault(name, {**({by: name} if by else {}), "from": 0, "to": 0})
+            if group["status"] == from_status:
+                result["from"] += group["count"]
+            elif group["status"] == to_status:
+                result["to"] += group["count"]
+
+        output = []
+        for result in results.values():
+            considered = result["from"] + result["to"]
+            result["rate"] = round(result["to"] / considered, 4) if considered else 0.0
+            output.append(result)
+        output.sort(key=lambda result: -(result["from"] + result["to"]))
+        return output
+
+    def get_summary(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict:
+        """Dashboard summary: totals, top sources/topics, statuses and conversion"""
+        try:
+            return {
+                "total_customers": self.total(start_date, end_date),
+                "sources": self.top("source", 20, start_date, end_date),
+                "statuses": self.top("status", 20, start_date, end_date),
+                "topics": self.top("topic", 10, start_date, end_date),
+                "conversion": self.conversion(by="source", start_date=start_date, end_date=end_date)
+            }
+        except Exception as e:
+            print(f"❌ Error building customer analytics: {e}")
+            return {}
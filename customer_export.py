@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Customer Export for VIV Clinic
+Streaming export of all customers to JSON, CSV or NDJSON files or a Google Sheets tab
+
+Rows come from the customer store in chunks (iter_customer_rows) and are
+written out as they arrive, so memory stays flat however many customers
+there are. Files are written to a temp file and renamed into place.
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+# Spreadsheet tab upload_to_sheets appends customers to
+EXPORT_SHEET = os.getenv("EXPORT_SHEET", "ייצוא לקוחות")
+
+def _write_json(f, headers: List[str], chunks: Iterator[List]) -> int:
+    """Same layout as before: one JSON array, headers row first"""
+    count = 0
+    f.write('[\n  ' + json.dumps(headers, ensure_ascii=False))
+    for chunk in chunks:
+        f.write(''.join(',\n  ' + json.dumps(row, ensure_ascii=False) for row in chunk))
+        count += len(chunk)
+    f.write('\n]\n')
+    return count
+
+def _write_ndjson(f, headers: List[str], chunks: Iterator[List]) -> int:
+    """One JSON object per customer per line"""
+    count = 0
+    for chunk in chunks:
+        f.write(''.join(json.dumps(dict(zip(headers, row)), ensure_ascii=False) + '\n' for row in chunk))
+        count += len(chunk)
+    return count
+
+def _write_csv(f, headers: List[str], chunks: Iterator[List]) -> int:
+    count = 0
+    writer = csv.writer(f)
+    writer.writerow(headers)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+WRITERS = {
+    'json': _write_json,
+    'ndjson': _write_ndjson,
+    'csv': _write_csv
+}
+
+def export_customers(csv_manager, path, export_format: Optional[str] = None, chunk_size: int = 1000) -> Optional[int]:
+    """Write all customers to path; the format defaults to the file extension. Returns the row count"""
+    path = Path(path)
+    export_format = (export_format or path.suffix.lstrip('.') or 'json').lower()
+    if export_format not in WRITERS:
+        print(f"❌ Unknown export format: {export_format} (use {', '.join(WRITERS)})")
+        return None
+
+    temp_file = path.with_name(path.name + '.tmp')
+    try:
+        with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+            count = WRITERS[export_format](f, csv_manager.headers, csv_manager.iter_customer_rows(chunk_size))
+        os.replace(temp_file, path)
+        print(f"✅ Exported {count} customers to {path}")
+        return count
+
+    except Exception as e:
+        print(f"❌ Error exporting customers: {e}")
+        if temp_file.exists():
+            temp_file.unlink()
+        return None
+
+def sheets_chunks(csv_manager, chunk_size: int = 500, with_headers: bool = True) -> Iterator[List]:
+    """Yield customer rows in Sheets append-sized chunks, the first starting with the headers"""
+    headers = [csv_manager.headers] if with_headers else []
+    for chunk in csv_manager.iter_customer_rows(chunk_size):
+        yield headers + chunk
+        headers = []
+    if headers:
+        yield headers
+
+def upload_to_sheets(csv_manager, sheets_manager=None, chunk_size: int = 500, sheet_name: str = EXPORT_SHEET) -> int:
+    """Append all customers to their own tab of the Google Sheet chunk by chunk; returns the rows uploaded
+
+    Customer rows have the CSV's 7 columns, not the inquiry sheet's 8, so they
+    never go into the first tab. The headers row is written when the tab is empty.
+    """
+    if sheets_manager is None:
+        from google_sheets_manager import GoogleSheetsManager
+        sheets_manager = GoogleSheetsManager()
+    from google_sheets_manager import sheet_prefix
+
+    try:
+        if not sheets_manager.ensure_sheet(sheet_name):
+            return 0
+        response = sheets_manager.get_values(f"{sheet_prefix(sheet_name)}A1:G1")
+        if response.status_code != 200:
+            print(f"❌ Failed to read sheet tab {sheet_name}: {response.text[:200]}")
+            return 0
+        with_headers = not response.json().get("values")
+    except Exception as e:
+        print(f"❌ Error reading sheet tab {sheet_name}: {e}")
+        return 0
+
+    uploaded = -1 if with_headers else 0  # The headers row goes up with the first chunk
+    for chunk in sheets_chunks(csv_manager, chunk_size, with_headers):
+        if not sheets_manager.append_rows(chunk, sheet_name):
+            print(f"❌ Upload stopped after {max(uploaded, 0)} customers")
+            return max(uploaded, 0)
+        uploaded += len(chunk)
+    print(f"✅ Uploaded {max(uploaded, 0)} customers to Google Sheets tab {sheet_name}")
+    return max(uploaded, 0)
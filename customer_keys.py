@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Customer Keys for VIV Clinic
+Who is already a customer, by Facebook user id and normalized phone, with a
+short interaction history per customer
+
+Every contact (a new customer or another message from a known one) is one
+line in <csv>.contacts: [timestamp, user id, phone, source, topic]. Each
+process tails the file, so all workers agree on who exists. The file does
+not depend on the CSV's byte layout, so compactions and rotations leave it
+alone.
+
+So that starting a process does not replay every message ever received,
+the file is rewritten once it holds about twice as many lines as there are
+customers: one JSON object per customer with its ids, phones and history,
+and new contacts appended after them as usual.
+"""
+
+import json
+import os
+import re
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from phone_utils import national_phone
+
+TIMESTAMP, USER_ID, PHONE, SOURCE, TOPIC = range(5)
+HISTORY_LIMIT = 20
+COMPACT_MIN_CONTACTS = 10000  # Lines beyond twice the customers before the file is rewritten
+TOPIC_LENGTH = 100
+
+_USER_ID_NOTE = re.compile(r'Facebook User ID: (\S+)')
+
+def user_id_from_notes(notes: str) -> str:
+    """The Facebook user id the bot writes into a row's notes, or ''"""
+    match = _USER_ID_NOTE.search(notes or '')
+    return match.group(1) if match else ''
+
+class CustomerKeys:
+    """Facebook user id / phone -> customer, kept in step with the contacts file"""
+
+    def __init__(self, csv_file):
+        csv_file = Path(csv_file)
+        self.contacts_file = csv_file.with_name(csv_file.name + '.contacts')
+        self.temp_file = csv_file.with_name(csv_file.name + '.contacts.tmp')
+        self._reset()
+        self._inode = None
+
+    def _reset(self):
+        self.customers = {}  # key -> {"phone": stored phone or '', "history": recent contacts}
+        self.by_user = {}
+        self.by_phone = {}
+        self.contacts = 0
+        self._pos = 0
+
+    def sync(self):
+        """Read contacts added by any process since the last sync"""
+        if not self.contacts_file.exists():
+            return
+        with open(self.contacts_file, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self._inode:
+                self._reset()
+                self._inode = inode
+            f.seek(self._pos)
+            data = f.read()
+
+        complete = data.rfind(b'\n') + 1
+        self._pos += complete
+        for line in data[:complete].splitlines():
+            record = json.loads(line)
+            if isinstance(record, dict):
+                self._restore(record)
+            else:
+                self._add(record)
+
+    def find(self, user_id: str = '', phone: str = '') -> Optional[str]:
+        """Key of the customer with this user id or phone, None for a new customer"""
+        key = self.by_user.get(user_id) if user_id else None
+        if key is None:
+            phone = national_phone(phone)
+            key = self.by_phone.get(phone) if phone else None
+        return key
+
+    def _add(self, contact: List):
+        phone = national_phone(contact[PHONE])
+        user_id = contact[USER_ID]
+        key = self.find(user_id, phone)
+        if key is None:
+            if not user_id and not phone:
+                return  # Nobody to attach an anonymous contact to
+            key = f"fb:{user_id}" if user_id else f"tel:{phone}"
+
+        customer = self.customers.get(key)
+        if customer is None:
+            customer = self.customers[key] = {"phone": '', "history": deque(maxlen=HISTORY_LIMIT)}
+        if phone:
+            customer["phone"] = contact[PHONE]
+            self.by_phone[phone] = key
+        if user_id:
+            self.by_user[user_id] = key
+        customer["history"].append((contact[TIMESTAMP], contact[SOURCE], contact[TOPIC]))
+        self.contacts += 1
+
+    def _restore(self, record: Dict):
+        """Load a customer written by compact()"""
+        key = record["key"]
+        self.customers[key] = {"phone": record["phone"],
+                               "history": deque(map(tuple, record["history"]), maxlen=HISTORY_LIMIT)}
+        for user_id in record["users"]:
+            self.by_user[user_id] = key
+        for phone in record["phones"]:
+            self.by_phone[phone] = key
+        self.contacts += 1
+
+    def _encode(self, contact) -> bytes:
+        return (json.dumps(contact, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def append(self, contacts: List[List]):
+        """Record contacts (caller holds the write lock and has synced)"""
+        with open(self.contacts_file, 'ab') as f:
+            f.write(b''.join(self._encode(contact) for contact in contacts))
+            self._pos = f.tell()
+            self._inode = os.fstat(f.fileno()).st_ino
+        for contact in contacts:
+            self._add(contact)
+        if self.contacts >= 2 * len(self.customers) + COMPACT_MIN_CONTACTS:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the contacts file as one line per customer (caller holds the write lock and has synced)"""
+        users, phones = {}, {}
+        for user_id, key in self.by_user.items():
+            users.setdefault(key, []).append(user_id)
+        for phone, key in self.by_phone.items():
+            phones.setdefault(key, []).append(phone)
+
+        before = self.contacts
+        with open(self.temp_file, 'wb') as f:
+            for key, customer in self.customers.items():
+                if key in users or key in phones:  # Else every id moved to another customer
+                    f.write(self._encode({"key": key, "phone": customer["phone"], "users": users.get(key, []),
+                                          "phones": phones.get(key, []), "history": list(customer["history"])}))
+        os.replace(self.temp_file, self.contacts_file)
+        self._inode = None
+        self.sync()
+        print(f"✅ Compacted {before} contacts into {self.contacts} customers")
+
+    def seed(self, contacts):
+        """Create the contacts file from existing customer rows, once (caller holds the write lock)"""
+        with open(self.temp_file, 'wb') as f:
+            for contact in contacts:
+                f.write(self._encode(contact))
+        os.replace(self.temp_file, self.contacts_file)
+        self._inode = None
+        self.sync()
+        print(f"✅ Indexed {len(self.customers)} customers from {self.contacts} rows")
+
+    def history(self, key: str) -> List[Dict]:
+        """Recent contacts of a customer, oldest first"""
+        customer = self.customers.get(key)
+        if customer is None:
+            return []
+        return [
+            {"timestamp": timestamp, "source": source, "topic": topic}
+            for timestamp, source, topic in customer["history"]
+        ]
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Customer Partitions for VIV Clinic
+Sealed monthly partitions of the customers CSV with a manifest
+
+The customers CSV is the active partition. When a new month starts (or the
+file passes a size limit) its rows move into <stem>_partitions/YYYY-MM.csv,
+optionally gzipped, and the CSV starts over with just the header.
+manifest.json lists every sealed partition with its row count, date range
+and source/status/day counters, so stats never have to open them.
+phones.idx maps phones to the partitions that hold them.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from status_log import join_notes
+
+class PartitionStore:
+    """Manifest, phone map and file access for sealed partitions"""
+
+    def __init__(self, csv_file, headers: List[str], compress: bool = False):
+        self.csv_file = Path(csv_file)
+        self.directory = self.csv_file.with_name(self.csv_file.stem + '_partitions')
+        self.manifest_file = self.directory / 'manifest.json'
+        self.phones_file = self.directory / 'phones.idx'
+        self.headers = headers
+        self.date_column = headers.index("תאריך")
+        self.phone_column = headers.index("טלפון")
+        self.source_column = headers.index("מקור")
+        self.status_column = headers.index("סטטוס")
+        self.notes_column = headers.index("הערות")
+        self.compress = compress
+
+        self.partitions = []
+        self.phones = {}
+        self.rotated_inode = None
+        self._manifest_inode = None
+        self._phones_pos = 0
+
+    def load(self):
+        """Load the manifest and phone map"""
+        self.partitions = []
+        self.phones = {}
+        self.rotated_inode = None
+        self._manifest_inode = None
+        self._phones_pos = 0
+        self.sync()
+
+    def sync(self):
+        """Pick up partitions sealed or rewritten by other processes"""
+        if not self.manifest_file.exists():
+            return
+
+        manifest_inode = self.manifest_file.stat().st_ino
+        if manifest_inode != self._manifest_inode:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.partitions = manifest['partitions']
+            self.rotated_inode = manifest.get('rotated_inode')
+            self._manifest_inode = manifest_inode
+
+        if self.phones_file.exists():
+            with open(self.phones_file, 'rb') as f:
+                f.seek(self._phones_pos)
+                data = f.read()
+            complete = data.rfind(b'\n') + 1
+            self._phones_pos += complete
+            for line in data[:complete].decode('utf-8').splitlines():
+                name, phone = line.split('\t', 1)
+                names = self.phones.setdefault(json.loads(phone), [])
+                if name not in names:
+                    names.append(name)
+
+    def _save_manifest(self):
+        self.directory.mkdir(exist_ok=True)
+        temp_file = self.manifest_file.with_name(self.manifest_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'rotated_inode': self.rotated_inode, 'partitions': self.partitions},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(temp_file, self.manifest_file)
+        self._manifest_inode = self.manifest_file.stat().st_ino
+
+    def get(self, name: str) -> Optional[Dict]:
+        for entry in self.partitions:
+            if entry['name'] == name:
+                return entry
+        return None
+
+    def path(self, entry: Dict) -> Path:
+        return self.directory / entry['file']
+
+    def _field(self, row: List, column: int) -> str:
+        return row[column] if len(row) > column else 'Unknown'
+
+    def _count(self, entry: Dict, row: List):
+        """Add a row to a manifest entry's counters"""
+        day = row[self.date_column][:10] if len(row) > self.date_column else ''
+        source = self._field(row, self.source_column)
+        status = self._field(row, self.status_column)
+
+        entry['rows'] += 1
+        entry['sources'][source] = entry['sources'].get(source, 0) + 1
+        entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+        entry['days'][day] = entry['days'].get(day, 0) + 1
+        if day:
+            entry['first_date'] = min(entry['first_date'] or day, day)
+            entry['last_date'] = max(entry['last_date'] or day, day)
+
+    def read_rows(self, entry: Dict) -> Iterator[List]:
+        """Yield the data rows of a sealed partition, gzipped or not"""
+        path = self.path(entry)
+        opener = gzip.open if entry['compressed'] else open
+        with opener(path, 'rt', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if row:
+                    yield row
+
+    def _encode(self, rows: List[List], header: bool = False) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(self.headers)
+        writer.writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+    def _write_file(self, path: Path, data: bytes, compressed: bool, append: bool):
+        if compressed:
+            # Appending adds a gzip member; readers see one continuous stream
+            with gzip.open(path, 'ab' if append else 'wb') as f:
+                f.write(data)
+        else:
+            with open(path, 'ab' if append else 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def seal(self, rows: List[List], source_inode: int):
+        """Move rows into their monthly partitions (caller holds the write lock)
+
+        The manifest records the inode of the file the rows came from, so a
+        rotation interrupted after this point is finished rather than redone.
+        """
+        by_month = {}
+        for row in rows:
+            date = row[self.date_column] if len(row) > self.date_column else ''
+            by_month.setdefault(date[:7] or 'undated', []).append(row)
+
+        self.directory.mkdir(exist_ok=True)
+        phone_lines = []
+        for month in sorted(by_month):
+            month_rows = by_month[month]
+            entry = self.get(month)
+            if entry is None:
+                entry = {
+                    'name': month,
+                    'file': f"{month}.csv.gz" if self.compress else f"{month}.csv",
+                    'compressed': self.compress,
+                    'rows': 0,
+                    'bytes': 0,
+                    'first_date': None,
+                    'last_date': None,
+                    'sources': {},
+                    'statuses': {},
+                    'days': {}
+                }
+                self.partitions.append(entry)
+                self.partitions.sort(key=lambda p: p['name'])
+                self._write_file(self.path(entry), self._encode(month_rows, header=True), entry['compressed'], append=False)
+            else:
+                # Drop anything a previous interrupted seal appended past the manifest
+                os.truncate(self.path(entry), entry['bytes'])
+                self._write_file(self.path(entry), self._encode(month_rows), entry['compressed'], append=True)
+            entry['bytes'] = self.path(entry).stat().st_size
+
+            for row in month_rows:
+                self._count(entry, row)
+                if len(row) > self.phone_column:
+                    phone = row[self.phone_column]
+                    names = self.phones.setdefault(phone, [])
+                    if month not in names:
+                        names.append(month)
+                        phone_lines.append(f"{month}\t{json.dumps(phone, ensure_ascii=False)}\n")
+
+        with open(self.phones_file, 'a', encoding='utf-8') as f:
+            f.writelines(phone_lines)
+            self._phones_pos = f.tell()
+        self.rotated_inode = source_inode
+        self._save_manifest()
+
+    def update_status(self, phone: str, new_status: str, notes: Optional[str] = "") -> List[str]:
+        """Rewrite the partitions holding this phone, notes None clearing them; returns each updated row's old status"""
+        old_statuses = []
+        for name in self.phones.get(phone, []):
+            entry = self.get(name)
+            if entry is None:
+                continue
+
+            rows = list(self.read_rows(entry))
+            for row in rows:
+                if len(row) > self.notes_column and row[self.phone_column] == phone:
+                    old_status = row[self.status_column]
+                    old_statuses.append(old_status)
+                    row[self.status_column] = new_status
+                    if notes != "":
+                        row[self.notes_column] = notes or ""
+
+                    remaining = entry['statuses'].get(old_status, 0) - 1
+                    if remaining > 0:
+                        entry['statuses'][old_status] = remaining
+                    else:
+                        entry['statuses'].pop(old_status, None)
+                    entry['statuses'][new_status] = entry['statuses'].get(new_status, 0) + 1
+
+            path = self.path(entry)
+            temp_file = path.with_name(path.name + '.tmp')
+            self._write_file(temp_file, self._encode(rows, header=True), entry['compressed'], append=False)
+            os.replace(temp_file, path)
+            entry['bytes'] = path.stat().st_size
+
+        if old_statuses:
+            self._save_manifest()
+        return old_statuses
+
+    def append_notes(self, phone: str, text: str) -> int:
+        """Append text to the notes of this phone's rows; returns how many rows were updated"""
+        updated = 0
+        for name in self.phones.get(phone, []):
+            entry = self.get(name)
+            if entry is None:
+                continue
+
+            rows = list(self.read_rows(entry))
+            for row in rows:
+                if len(row) > self.notes_column and row[self.phone_column] == phone:
+                    row[self.notes_column] = join_notes(row[self.notes_column], text)
+                    updated += 1
+
+            path = self.path(entry)
+            temp_file = path.with_name(path.name + '.tmp')
+            self._write_file(temp_file, self._encode(rows, header=True), entry['compressed'], append=False)
+            os.replace(temp_file, path)
+            entry['bytes'] = path.stat().st_size
+
+        if updated:
+            self._save_manifest()
+        return updated
+
+    def compress_partitions(self, keep_months: int = 1) -> int:
+        """Gzip all but the newest keep_months uncompressed partitions"""
+        candidates = [entry for entry in self.partitions if not entry['compressed']]
+        if keep_months > 0:
+            candidates = candidates[:-keep_months]
+
+        for entry in candidates:
+            path = self.path(entry)
+            entry_file = f"{entry['name']}.csv.gz"
+            with open(path, 'rb') as src, gzip.open(self.directory / entry_file, 'wb') as dst:
+                while chunk := src.read(1024 * 1024):
+                    dst.write(chunk)
+            entry['file'] = entry_file
+            entry['compressed'] = True
+            entry['bytes'] = (self.directory / entry_file).stat().st_size
+            self._save_manifest()
+            os.remove(path)
+
+        return len(candidates)
+
+    def find_first(self, phone: str) -> Optional[List]:
+        """Get the oldest sealed row with this phone"""
+        for name in sorted(self.phones.get(phone, [])):
+            entry = self.get(name)
+            if entry is None:
+                continue
+            for row in self.read_rows(entry):
+                if len(row) > self.phone_column and row[self.phone_column] == phone:
+                    return row
+        return None
+
+    def overlapping(self, start_date: Optional[str], end_date: Optional[str]) -> Iterator[Dict]:
+        """Yield (entry, fully inside the range) for partitions with rows in [start_date, end_date]"""
+        for entry in self.partitions:
+            first, last = entry['first_date'] or '', entry['last_date'] or ''
+            if (end_date and first > end_date) or (start_date and last < start_date):
+                continue
+            inside = (not start_date or first >= start_date) and (not end_date or last <= end_date)
+            yield entry, inside
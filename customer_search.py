@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Customer Search for VIV Clinic
+Inverted index over customer names, phones and topics
+
+Text is normalized for Hebrew: niqqud and geresh are dropped and final
+letters folded, so a half-typed "שלו" is a prefix of "שלום". Each word is
+also indexed without up to two attached prefix letters (ו, ה, ב, ל, מ, ש, כ),
+so "השתלות" finds "בהשתלות". Phones are indexed in international and
+national digit forms, so 050-1234567 and +972 50 123 4567 find each other.
+Query words match exactly, by prefix, or within one typo.
+
+The index follows the customers files incrementally: rows appended by any
+process are indexed on the next search, newly sealed partition rows are
+read once, and after a compaction the position in the new CSV is found
+through the phone index instead of re-reading it.
+"""
+
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Dict, Iterator, List, Set
+
+from csv_scan import scan_columns
+from phone_utils import phone_digits, phone_forms
+
+FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+HEBREW_PREFIXES = "והבלמשכ"
+PHONE_MARK = "#"  # Phone terms share the index with words under this prefix
+
+MIN_PREFIX = 2
+FUZZY_MIN_LENGTH = 4
+MAX_EXPANSION = 1000  # Most terms a prefix or typo expands to
+MAX_CANDIDATES = 20000  # Most candidate rows checked per search
+
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+_NIQQUD = re.compile(r'[\u0591-\u05bd\u05bf-\u05c7]')  # Niqqud and cantillation, not maqaf
+_QUOTES = re.compile(r'[\'"`\u05f3\u05f4]')  # Including geresh and gershayim
+_WORDS = re.compile(r'\w+')
+_PHONE_QUERY = re.compile(r'[\d\s\-+().]+')
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = _QUOTES.sub('', _NIQQUD.sub('', text))
+    return text.translate(FINAL_LETTERS)
+
+def tokenize(text: str) -> List[str]:
+    return _WORDS.findall(normalize_text(text or ''))
+
+def word_forms(word: str) -> List[str]:
+    """The word plus its forms without attached Hebrew prefix letters"""
+    forms = [word]
+    for _ in range(2):
+        if word[0] in HEBREW_PREFIXES and len(word) > 3:
+            word = word[1:]
+            forms.append(word)
+    return forms
+
+def doc_terms(name: str, phone: str, topic: str) -> Set[str]:
+    terms = set()
+    for word in tokenize(name) + tokenize(topic):
+        terms.update(word_forms(word))
+    terms.update(PHONE_MARK + form for form in phone_forms(phone))
+    return terms
+
+def _fuzzy_term(term: str) -> bool:
+    return len(term) >= FUZZY_MIN_LENGTH - 1 and term[0] != PHONE_MARK and not term.isdigit()
+
+def _deletions(word: str) -> List[str]:
+    return [word[:i] + word[i + 1:] for i in range(len(word))]
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by at most one insertion, deletion or substitution"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+class CustomerSearchIndex:
+    """Word, prefix and typo-tolerant search over all customers"""
+
+    def __init__(self, csv_manager):
+        self.manager = csv_manager
+        headers = csv_manager.headers
+        self.columns = [headers.index("שם"), headers.index("טלפון"), headers.index("נושא")]
+        self.fields = ["שם", "טלפון", "נושא"]
+        self._lock = threading.Lock()
+        self._reset()
+        self._partition_rows = {}
+        self._sealed_rows = 0
+        self._active_inode = None
+        self._active_size = 0
+
+    def _reset(self):
+        self.docs = []  # (name, phone, topic), None once removed
+        self.postings = {}
+        self.vocabulary = []  # Sorted terms, for prefix lookups
+        self._new_terms = []  # Terms added since the last refresh, merged into vocabulary after it
+        self._fuzzy = {}  # One-deletion variant -> terms
+        self._removed = 0
+        self._active_docs = []
+
+    def add(self, name: str, phone: str, topic: str) -> int:
+        """Index one customer; returns its document id"""
+        doc_id = len(self.docs)
+        self.docs.append((name, phone, topic))
+        for term in doc_terms(name, phone, topic):
+            postings = self.postings.get(term)
+            if postings is None:
+                self.postings[term] = [doc_id]
+                self._add_term(term)
+            else:
+                postings.append(doc_id)
+        return doc_id
+
+    def _add_term(self, term: str):
+        self._new_terms.append(term)
+        if _fuzzy_term(term):
+            for variant in _deletions(term):
+                self._fuzzy.setdefault(variant, []).append(term)
+
+    def _merge_terms(self):
+        if len(self._new_terms) < 1000:
+            for term in self._new_terms:
+                insort(self.vocabulary, term)  # Just a memmove per term
+        else:
+            self.vocabulary.extend(self._new_terms)
+            self.vocabulary.sort()
+        self._new_terms = []
+
+    def _remove_active(self):
+        for doc_id in self._active_docs:
+            self.docs[doc_id] = None
+        self._removed += len(self._active_docs)
+        self._active_docs = []
+
+    def _rebuild(self):
+        """Drop removed documents from the postings"""
+        docs, active = self.docs, set(self._active_docs)
+        self._reset()
+        for doc_id, doc in enumerate(docs):
+            if doc is not None:
+                new_id = self.add(*doc)
+                if doc_id in active:
+                    self._active_docs.append(new_id)
+
+    def _compacted_start(self, f) -> int:
+        """Where the rows not indexed yet start in a compacted CSV, or 0 to re-read it
+
+        Compaction keeps the rows and their order, so the last indexed row is
+        the same occurrence of its phone in the new file.
+        """
+        if not self._active_docs:
+            return 0
+        phone = self.docs[self._active_docs[-1]][1]
+        occurrence = sum(1 for doc_id in self._active_docs if self.docs[doc_id][1] == phone) - 1
+        offsets = self.manager.phone_index.lookup(phone)
+        if len(offsets) > occurrence:
+            for _, end, (row_phone,) in scan_columns(f, [self.columns[1]], offsets[occurrence]):
+                if row_phone == phone:
+                    return end
+                break
+        self._remove_active()
+        return 0
+
+    def refresh(self):
+        """Index customers added since the last refresh"""
+        with self._lock:
+            manager = self.manager
+            with manager.snapshot() as snapshot:
+                f, end, sealed, inode = snapshot.file, snapshot.end, snapshot.sealed, snapshot.inode
+                sealed_rows = sum(entry['rows'] for entry in sealed)
+                start = self._active_size
+                if inode != self._active_inode and self._active_inode is not None:
+                    if sealed_rows != self._sealed_rows:
+                        # Rotated: the indexed rows are now in sealed partitions
+                        self._remove_active()
+                        start = 0
+                    else:
+                        start = self._compacted_start(f)
+
+            with f:
+                for entry in sealed:
+                    indexed = self._partition_rows.get(entry['name'], 0)
+                    if entry['rows'] > indexed:
+                        for row in islice(self.manager.partitions.read_rows(entry), indexed, entry['rows']):
+                            self.add(*(row[column] if len(row) > column else '' for column in self.columns))
+                        self._partition_rows[entry['name']] = entry['rows']
+
+                for _, _, values in scan_columns(f, self.columns, start or None, end):
+                    self._active_docs.append(self.add(*(value or '' for value in values)))
+
+            self._active_inode = inode
+            self._active_size = end
+            self._sealed_rows = sealed_rows
+            if self._removed > len(self.docs) // 2:
+                self._rebuild()
+            self._merge_terms()
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        terms = []
+        i = bisect_left(self.vocabulary, prefix)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix) and len(terms) < MAX_EXPANSION:
+            terms.append(self.vocabulary[i])
+            i += 1
+        terms.extend(term for term in self._new_terms if term.startswith(prefix))
+        return terms[:MAX_EXPANSION]
+
+    def _fuzzy_terms(self, word: str) -> List[str]:
+        candidates = set(self._fuzzy.get(word, ()))
+        for variant in _deletions(word):
+            candidates.update(self._fuzzy.get(variant, ()))
+            if variant in self.postings:
+                candidates.add(variant)
+        candidates.discard(word)
+        return [term for term in candidates if _within_one_edit(word, term)][:MAX_EXPANSION]
+
+    def _query_groups(self, query: str) -> List[List[str]]:
+        """Alternative terms for each query word; a row must match every group"""
+        if _PHONE_QUERY.fullmatch(query.strip()) and len(phone_digits(query)) >= 3:
+            return [[PHONE_MARK + form for form in phone_forms(query)]]
+
+        groups = []
+        for word in tokenize(query):
+            alternatives = word_forms(word)
+            if word.isdigit() and len(word) >= 3:
+                alternatives += [PHONE_MARK + form for form in phone_forms(word)]
+            groups.append(alternatives)
+        return groups
+
+    def _tiers(self, alternatives: List[str]) -> List:
+        """(weight, postings lists) for exact, prefix and typo matches of a query group"""
+        exact = [self.postings[term] for term in alternatives if term in self.postings]
+        prefixed = []
+        for term in alternatives:
+            if len(term.lstrip(PHONE_MARK)) >= (3 if term[0] == PHONE_MARK else MIN_PREFIX):
+                prefixed.extend(t for t in self._prefix_terms(term) if t not in alternatives)
+        fuzzy = self._fuzzy_terms(alternatives[0]) if len(alternatives[0]) >= FUZZY_MIN_LENGTH and _fuzzy_term(alternatives[0]) else []
+        return [
+            (EXACT, exact),
+            (PREFIX, [self.postings[term] for term in set(prefixed)]),
+            (FUZZY, [self.postings[term] for term in fuzzy])
+        ]
+
+    def _match(self, alternatives: List[str], terms: Set[str]) -> int:
+        """Best weight with which a row's terms match a query group, 0 if none"""
+        if any(term in terms for term in alternatives):
+            return EXACT
+        for term in alternatives:
+            if len(term.lstrip(PHONE_MARK)) >= (3 if term[0] == PHONE_MARK else MIN_PREFIX):
+                if any(t.startswith(term) for t in terms):
+                    return PREFIX
+        word = alternatives[0]
+        if len(word) >= FUZZY_MIN_LENGTH and _fuzzy_term(word):
+            if any(_within_one_edit(word, t) for t in terms if _fuzzy_term(t)):
+                return FUZZY
+        return 0
+
+    def _newest(self, postings_lists: List[List[int]]) -> Iterator[int]:
+        """Document ids from several postings lists, newest first"""
+        return heapq.merge(*(reversed(postings) for postings in postings_lists), reverse=True)
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Customers matching every word of the query, best matches and newest first"""
+        self.refresh()
+        with self._lock:
+            groups = self._query_groups(query)
+            if not groups:
+                return []
+
+            # Candidates come from the most selective word; the other words are checked per row
+            tiers = [self._tiers(group) for group in groups]
+            driving = min(range(len(groups)), key=lambda i: sum(len(p) for _, lists in tiers[i] for p in lists))
+
+            results, seen, checked = [], set(), 0
+            for _, postings_lists in tiers[driving]:
+                for doc_id in self._newest(postings_lists):
+                    if len(results) >= limit or checked >= MAX_CANDIDATES:
+                        break
+                    if doc_id in seen or self.docs[doc_id] is None:
+                        continue
+                    seen.add(doc_id)
+                    checked += 1
+
+                    doc = self.docs[doc_id]
+                    terms = doc_terms(*doc)
+                    weights = [self._match(group, terms) for group in groups]
+                    if all(weights):
+                        results.append((sum(weights), doc_id, doc))
+
+            results.sort(key=lambda result: (-result[0], -result[1]))
+            return [dict(zip(self.fields, doc), score=score) for score, _, doc in results]
+
+    def get_stats(self) -> Dict:
+        """Document and term counts"""
+        return {
+            "documents": len(self.docs) - self._removed,
+            "terms": len(self.postings),
+            "removed": self._removed
+        }
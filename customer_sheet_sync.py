@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Customer Sheet Sync for VIV Clinic
+Two-way delta sync between the customer store and a Google Sheet tab
+
+The customers go to their own tab of the spreadsheet (CUSTOMERS_SHEET,
+"לקוחות" by default, added on the first sync), apart from the inquiries tab
+that GoogleSheetsManager appends to. Row n + 2 of that tab mirrors customer
+n (partitions oldest first, then the CSV), with the customer columns in A:G
+and the time of the row's last change in H. Customers are only ever
+appended and keep their order through compactions and rotations, so a row
+number never changes meaning.
+
+What was last synced is kept per row as a hash of the only columns that
+change, status and notes (<csv>.sheetsync.hashes), next to a watermark of
+how many rows the sheet has. A sync finds local changes without reading the
+whole table: rows appended since the watermark, rows of phones with new
+status-log entries, and rows of partitions that were rewritten. Only a
+compaction of the CSV makes it re-hash the active CSV. The SQLite store has
+no status log to say what changed, so there every sync re-hashes all rows
+(still sending only the changed ones). Changed rows and new rows go out as
+values:batchUpdate requests to explicit ranges, so a retried request never
+duplicates rows.
+
+Staff edit status and notes in the sheet. Each sync reads the narrow F:H
+columns back (the values API cannot tell which rows changed) and compares
+them with the hashes. When both sides changed a row the later write wins:
+the local time is that of the status-log entry, the sheet time is column H
+if staff (or an onEdit script) set it after the last sync, otherwise the
+time the change was found. Notes cleared in the sheet clear the local notes.
+"""
+
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from hashlib import blake2b
+from itertools import islice
+from typing import Dict, List, Optional
+
+from csv_records import iter_records, parse_record, read_record
+from file_lock import FileLock
+from google_sheets_manager import sheet_prefix
+from sheets_sync import BATCH_ROWS, REQUESTS_PER_MINUTE, RateLimiter, send_request
+from status_log import PHONE, TIMESTAMP
+
+CUSTOMERS_SHEET = os.getenv("CUSTOMERS_SHEET", "לקוחות")
+UPDATED_HEADER = "עודכן"
+FIRST_ROW = 2
+
+def row_hash(status: str, notes: str) -> int:
+    """64-bit hash of a row's mutable columns"""
+    return int.from_bytes(blake2b(f"{status}\x1f{notes}".encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _timestamp(value: str) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+class CustomerSheetSync:
+    """Delta sync of the customers (CSV or SQLite store) with a Google Sheet tab"""
+
+    def __init__(self, csv_manager, sheets_manager=None, batch_rows: int = BATCH_ROWS,
+                 requests_per_minute: int = REQUESTS_PER_MINUTE, sheet_name: str = CUSTOMERS_SHEET):
+        if sheets_manager is None:
+            from google_sheets_manager import GoogleSheetsManager
+            sheets_manager = GoogleSheetsManager()
+
+        self.manager = csv_manager
+        self.sheets = sheets_manager
+        self.batch_rows = batch_rows
+        self.limiter = RateLimiter(requests_per_minute)
+        headers = csv_manager.headers
+        self.phone_column = headers.index("טלפון")
+        self.status_column = headers.index("סטטוס")
+        self.notes_column = headers.index("הערות")
+        self.sheet_headers = headers + [UPDATED_HEADER]
+        self.last_column = chr(ord('A') + len(self.sheet_headers) - 1)
+        self.status_letter = chr(ord('A') + self.status_column)
+        self.sheet_name = sheet_name
+        self.prefix = sheet_prefix(sheet_name)
+        self._row_phones = None  # Phone of every customer, read when a pull needs one (SQLite store)
+
+        csv_file = getattr(csv_manager, 'csv_file', None) or csv_manager.db_file
+        self.state_file = csv_file.with_name(csv_file.name + '.sheetsync')
+        self.hashes_file = csv_file.with_name(csv_file.name + '.sheetsync.hashes')
+        self.offsets_file = csv_file.with_name(csv_file.name + '.sheetsync.offsets')
+        self._lock = FileLock(csv_file.with_name(csv_file.name + '.sheetsync.lock'))
+        self.stats = {"syncs": 0, "rows_pushed": 0, "rows_added": 0, "rows_pulled": 0,
+                      "conflicts": 0, "requests": 0, "retries": 0, "active_rescans": 0}
+        self._load()
+
+    def _load(self):
+        self.state = {"sheet_id": None, "partitions": {}, "sealed_rows": 0, "active_inode": None,
+                      "active_size": 0, "log_count": 0, "synced_at": None}
+        self.hashes = array('Q')
+        self.active_offsets = array('q')
+        if not self.state_file.exists():
+            return
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get("sheet_id") != self.sheets.sheet_id or state.get("sheet_name") != self.sheet_name:
+            print("⚠️ Sheet changed since the last sync, starting over")
+            return
+        self.state = state
+        with open(self.hashes_file, 'rb') as f:
+            self.hashes.frombytes(f.read(state["rows"] * self.hashes.itemsize))
+        with open(self.offsets_file, 'rb') as f:
+            self.active_offsets.frombytes(f.read(state["active_rows"] * self.active_offsets.itemsize))
+
+    def _mutable(self, row: List):
+        status = row[self.status_column] if len(row) > self.status_column else ''
+        notes = row[self.notes_column] if len(row) > self.notes_column else ''
+        return status, notes
+
+    def _find_local_changes(self, f, by_phone, end, sealed, entries):
+        """Rows changed since the last sync {index: row} and rows added since it, in order"""
+        synced = len(self.hashes)
+        changed, added = {}, []
+
+        def check(index, row):
+            if index >= synced:
+                added.append(row)
+            elif row_hash(*self._mutable(row)) != self.hashes[index]:
+                changed[index] = row
+
+        partitions = self.manager.partitions
+        signatures = {}
+        base = 0
+        for entry in sealed:
+            path = partitions.path(entry)
+            signature = [entry['file'], entry['bytes'], path.stat().st_ino, base]
+            signatures[entry['name']] = signature
+            if self.state["partitions"].get(entry['name']) != signature:
+                for index, row in enumerate(islice(partitions.read_rows(entry), entry['rows']), base):
+                    check(index, row)
+            base += entry['rows']
+
+        inode = self.manager.phone_index.base_inode
+        log = self.manager.status_log
+        offsets = self.active_offsets
+        if inode != self.state["active_inode"] or base != self.state["sealed_rows"] or len(entries) < self.state["log_count"]:
+            # Compacted or rotated: re-hash the active CSV
+            self.stats["active_rescans"] += 1
+            offsets = array('q')
+            f.seek(0)
+            f.readline()
+            start = f.tell()
+        else:
+            for phone in {entry[PHONE] for entry in entries[self.state["log_count"]:]}:
+                for offset in self.manager.phone_index.lookup(phone):
+                    i = bisect_left(offsets, offset)
+                    if i < len(offsets) and offsets[i] == offset and base + i not in changed:
+                        check(base + i, log.apply(read_record(f, offset), offset, by_phone))
+            start = self.state["active_size"]
+
+        for offset, raw in iter_records(f, start, end):
+            row = parse_record(raw)
+            if row:
+                check(base + len(offsets), log.apply(row, offset, by_phone))
+                offsets.append(offset)
+
+        return changed, added, {"partitions": signatures, "sealed_rows": base, "active_inode": inode,
+                                "active_size": end, "log_count": len(entries)}, offsets
+
+    def _scan_local_changes(self):
+        """Changed and added rows by hashing every customer, for stores without a status log"""
+        synced = len(self.hashes)
+        changed, added = {}, []
+        self._row_phones = []  # From the same snapshot, for pulls
+        index = 0
+        for chunk in self.manager.iter_customer_rows():
+            for row in chunk:
+                self._row_phones.append(row[self.phone_column] if len(row) > self.phone_column else None)
+                if index >= synced:
+                    added.append(row)
+                elif row_hash(*self._mutable(row)) != self.hashes[index]:
+                    changed[index] = row
+                index += 1
+        return changed, added
+
+    def _local_times(self, changed: Dict, entries: List) -> Dict:
+        """When each locally changed row was last changed, from the status log"""
+        latest = {}
+        for entry in entries:
+            latest[entry[PHONE]] = _timestamp(entry[TIMESTAMP])
+        now = time.time()
+        return {index: latest.get(row[self.phone_column]) or now for index, row in changed.items()}
+
+    def _pull(self, changed: Dict, local_times: Dict) -> List[int]:
+        """Apply staff edits from the sheet; returns the rows whose hash now matches the sheet
+
+        Rows where the local change wins stay in changed.
+        """
+        synced_at = self.state["synced_at"] or 0
+        now = time.time()
+        settled = []
+        rows = self.sheets.iter_values(FIRST_ROW, columns=f"{self.status_letter}:{self.last_column}",
+                                       last_row=FIRST_ROW + len(self.hashes) - 1, sheet=self.sheet_name)
+        for index, (status, notes, updated) in enumerate(rows):
+            sheet_hash = row_hash(status, notes)
+            if sheet_hash == self.hashes[index]:
+                continue
+            local = changed.get(index)
+            if local is not None:
+                if self._mutable(local) == (status, notes):
+                    del changed[index]
+                    self.hashes[index] = sheet_hash
+                    settled.append(index)
+                    continue
+                self.stats["conflicts"] += 1
+                sheet_time = _timestamp(updated)
+                if sheet_time is None or sheet_time <= synced_at:
+                    sheet_time = now  # Edited without stamping H: as of now
+                if local_times[index] > sheet_time:
+                    continue
+                del changed[index]
+                phone = local[self.phone_column]
+            else:
+                phone = self._phone_at(index)
+
+            # Updates every row with this phone; the others go out on the next sync. Notes cleared in
+            # the sheet are cleared here too, so the stored row matches the hash taken from the sheet
+            if phone and self.manager.update_customer_status(phone, status, notes, clear_notes=not notes):
+                self.hashes[index] = sheet_hash
+                settled.append(index)
+                self.stats["rows_pulled"] += 1
+        return settled
+
+    def _phone_at(self, index: int) -> Optional[str]:
+        """Phone of customer `index`, from its partition or the CSV"""
+        if not hasattr(self.manager, 'partitions'):
+            if self._row_phones is None:
+                self._row_phones = [row[self.phone_column] if len(row) > self.phone_column else None
+                                    for chunk in self.manager.iter_customer_rows() for row in chunk]
+            return self._row_phones[index] if index < len(self._row_phones) else None
+        base = 0
+        for entry in self.manager.partitions.partitions:
+            if index < base + entry['rows']:
+                row = next(islice(self.manager.partitions.read_rows(entry), index - base, None), None)
+                return row[self.phone_column] if row and len(row) > self.phone_column else None
+            base += entry['rows']
+        i = index - base
+        if 0 <= i < len(self.active_offsets):
+            with open(self.manager.csv_file, 'rb') as f:
+                row = read_record(f, self.active_offsets[i])
+            return row[self.phone_column] if len(row) > self.phone_column else None
+        return None
+
+    def _push(self, changed: Dict, added: List, local_times: Dict):
+        """Write changed and new rows to their sheet rows in batchUpdate requests"""
+        data, rows_in_batch = [], 0
+
+        def flush():
+            nonlocal data, rows_in_batch
+            if data:
+                send_request(self.sheets.batch_update_values, data, limiter=self.limiter, stats=self.stats)
+                self.stats["requests"] += 1
+                data, rows_in_batch = [], 0
+
+        if not len(self.hashes):
+            data.append({"range": f"{self.prefix}A1:{self.last_column}1", "values": [self.sheet_headers]})
+        for index in sorted(changed):
+            row_number = FIRST_ROW + index
+            updated = datetime.fromtimestamp(local_times[index]).isoformat(timespec='seconds')
+            data.append({"range": f"{self.prefix}{self.status_letter}{row_number}:{self.last_column}{row_number}",
+                         "values": [[*self._mutable(changed[index]), updated]]})
+            rows_in_batch += 1
+            if rows_in_batch >= self.batch_rows:
+                flush()
+
+        now = datetime.now().isoformat(timespec='seconds')
+        width = len(self.manager.headers)
+        first = FIRST_ROW + len(self.hashes)
+        for start in range(0, len(added), self.batch_rows):
+            block = [(row + [''] * width)[:width] + [now] for row in added[start:start + self.batch_rows]]
+            data.append({"range": f"{self.prefix}A{first + start}:{self.last_column}{first + start + len(block) - 1}",
+                         "values": block})
+            rows_in_batch += len(block)
+            if rows_in_batch >= self.batch_rows:
+                flush()
+        flush()
+
+    def _save(self, changed: Dict, settled: List[int], added: List, position: Dict, offsets: array, rescanned: bool):
+        """Record what the sheet now holds: changed hashes in place, new ones appended, then the watermark"""
+        for index, row in changed.items():
+            self.hashes[index] = row_hash(*self._mutable(row))
+        previous = self.state.get("rows", 0)
+        self.hashes.extend(row_hash(*self._mutable(row)) for row in added)
+
+        mode = 'r+b' if self.hashes_file.exists() else 'wb'
+        with open(self.hashes_file, mode) as f:
+            for index in sorted(set(changed).union(settled)) if mode == 'r+b' else ():
+                f.seek(index * self.hashes.itemsize)
+                f.write(self.hashes[index:index + 1].tobytes())
+            f.seek(0 if mode == 'wb' else previous * self.hashes.itemsize)
+            f.write(self.hashes[0 if mode == 'wb' else previous:].tobytes())
+            f.truncate()
+
+        if rescanned or not self.offsets_file.exists():
+            temp_file = self.offsets_file.with_name(self.offsets_file.name + '.tmp')
+            with open(temp_file, 'wb') as f:
+                f.write(offsets.tobytes())
+            os.replace(temp_file, self.offsets_file)
+        else:
+            with open(self.offsets_file, 'r+b') as f:
+                f.seek(self.state.get("active_rows", 0) * offsets.itemsize)
+                f.write(offsets[self.state.get("active_rows", 0):].tobytes())
+                f.truncate()
+        self.active_offsets = offsets
+
+        self.state.update(position, sheet_id=self.sheets.sheet_id, sheet_name=self.sheet_name, rows=len(self.hashes),
+                          active_rows=len(offsets), synced_at=time.time())
+        temp_file = self.state_file.with_name(self.state_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(temp_file, self.state_file)
+
+    def sync(self, pull: bool = True) -> Optional[Dict]:
+        """Pull staff edits, then push local changes; returns what was done, None on failure"""
+        try:
+            with self._lock:
+                start = time.perf_counter()
+                manager = self.manager
+                self._row_phones = None
+                if not len(self.hashes) and not self.sheets.ensure_sheet(self.sheet_name):
+                    raise RuntimeError(f"no sheet tab {self.sheet_name}")
+                if hasattr(manager, 'status_log'):
+                    with manager.snapshot() as snapshot:
+                        f, by_phone, end, sealed = snapshot.file, snapshot.updates, snapshot.end, snapshot.sealed
+                        entries = snapshot.log_entries
+                    with f:
+                        rescans = self.stats["active_rescans"]
+                        changed, added, position, offsets = self._find_local_changes(f, by_phone, end, sealed, entries)
+                        rescanned = self.stats["active_rescans"] != rescans
+                else:
+                    changed, added = self._scan_local_changes()
+                    entries, position, offsets, rescanned = [], {}, self.active_offsets, False
+                local_times = self._local_times(changed, entries)
+
+                pulled = self.stats["rows_pulled"]
+                settled = self._pull(changed, local_times) if pull and len(self.hashes) else []
+                self._push(changed, added, local_times)
+                self._save(changed, settled, added, position, offsets, rescanned)
+
+                result = {"pushed": len(changed), "added": len(added), "pulled": self.stats["rows_pulled"] - pulled,
+                          "rows": len(self.hashes), "seconds": round(time.perf_counter() - start, 3)}
+                self.stats["syncs"] += 1
+                self.stats["rows_pushed"] += len(changed)
+                self.stats["rows_added"] += len(added)
+            print(f"✅ Synced with Google Sheets: {result}")
+            return result
+
+        except Exception as e:
+            print(f"❌ Error syncing customers with Google Sheets: {e}")
+            self._load()  # Drop in-memory progress; the next sync redoes it
+            return None
+
+    def get_stats(self) -> Dict:
+        """Sync counts and the watermark"""
+        stats = dict(self.stats)
+        stats["rows"] = len(self.hashes)
+        stats["synced_at"] = self.state["synced_at"]
+        return stats
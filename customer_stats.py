@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Customer Stats for VIV Clinic
+Customer counters kept up to date on every add/update, with a snapshot file
+
+The snapshot records the CSV inode, size and number of pending status updates
+it reflects. On startup a matching snapshot is used as is, a snapshot of a
+shorter CSV is caught up from its rows, and anything else is recomputed.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+class CustomerStats:
+    """Totals per source, status and day for the customers CSV"""
+
+    def __init__(self, csv_file, date_column: int, source_column: int, status_column: int,
+                 save_interval: float = 5.0):
+        self.csv_file = Path(csv_file)
+        self.snapshot_file = self.csv_file.with_name(self.csv_file.name + '.stats')
+        self.date_column = date_column
+        self.source_column = source_column
+        self.status_column = status_column
+        self.save_interval = save_interval
+        self.saved_at = 0.0
+        self.dirty = False
+        self.reset()
+
+    def reset(self):
+        self.total = 0
+        self.sources = {}
+        self.statuses = {}
+        self.days = {}
+
+    def _field(self, row: List, column: int) -> str:
+        return row[column] if len(row) > column else 'Unknown'
+
+    def add_row(self, row: List):
+        """Count one customer row"""
+        self.add(
+            row[self.date_column] if len(row) > self.date_column else '',
+            self._field(row, self.source_column),
+            self._field(row, self.status_column)
+        )
+
+    def add(self, date: Optional[str], source: Optional[str], status: Optional[str]):
+        """Count one customer from just its date, source and status"""
+        day = date[:10] if date else ''
+        source = 'Unknown' if source is None else source
+        status = 'Unknown' if status is None else status
+
+        self.total += 1
+        self.sources[source] = self.sources.get(source, 0) + 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.days[day] = self.days.get(day, 0) + 1
+        self.dirty = True
+
+    def add_rows(self, rows: Iterable[List]):
+        for row in rows:
+            self.add_row(row)
+
+    def change_status(self, row: List, new_status: str):
+        """Move a counted row from its current status to new_status"""
+        old_status = self._field(row, self.status_column)
+        remaining = self.statuses.get(old_status, 0) - 1
+        if remaining > 0:
+            self.statuses[old_status] = remaining
+        else:
+            self.statuses.pop(old_status, None)
+        self.statuses[new_status] = self.statuses.get(new_status, 0) + 1
+        self.dirty = True
+
+    def load(self, state: Dict) -> Optional[int]:
+        """Load the snapshot if it fits the CSV state; returns the CSV size it covers"""
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            covered = snapshot['state']
+            if covered['inode'] != state['inode'] or covered['updates'] != state['updates']:
+                return None
+            if covered['size'] > state['size']:
+                return None
+
+            self.total = snapshot['total']
+            self.sources = snapshot['sources']
+            self.statuses = snapshot['statuses']
+            self.days = snapshot['days']
+            return covered['size']
+
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, state: Dict):
+        """Write the snapshot for the given CSV state"""
+        snapshot = {
+            'state': state,
+            'total': self.total,
+            'sources': self.sources,
+            'statuses': self.statuses,
+            'days': self.days
+        }
+        temp_file = self.snapshot_file.with_name(self.snapshot_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(temp_file, self.snapshot_file)
+        self.saved_at = time.time()
+        self.dirty = False
+
+    def save_due(self) -> bool:
+        return self.dirty and time.time() - self.saved_at >= self.save_interval
+
+    def summary(self, today: str) -> Dict:
+        """Get statistics in the get_stats format"""
+        return {
+            "total_customers": self.total,
+            "sources": dict(self.sources),
+            "statuses": dict(self.statuses),
+            "recent_customers": self.days.get(today, 0)
+        }
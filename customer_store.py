@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Customer Store for VIV Clinic
+Selects the customer storage backend: the CSV file or SQLite
+
+Both backends provide add_customer, upsert_customer, get_customers,
+search_customer, update_customer_status, append_customer_notes,
+iter_customer_rows, export_to_google_sheets_format and get_stats, and a
+snapshot() context manager for consistent reads (a CustomerSnapshot of the
+CSV files, or a SQLite connection inside a read transaction).
+Set CUSTOMER_BACKEND=sqlite to use SQLite; the first start imports the CSV.
+"""
+
+import os
+
+CUSTOMER_BACKEND = os.getenv('CUSTOMER_BACKEND', 'csv').lower()
+
+def get_customer_manager(backend=None):
+    """Create the customer manager for the configured backend"""
+    backend = (backend or CUSTOMER_BACKEND).lower()
+
+    if backend == 'sqlite':
+        from sqlite_manager import SQLiteManager
+        return SQLiteManager()
+
+    if backend != 'csv':
+        print(f"⚠️ Unknown CUSTOMER_BACKEND '{backend}', using csv")
+
+    from csv_manager import CSVManager
+    return CSVManager()
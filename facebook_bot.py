@@ -8,10 +8,12 @@ Collects customer information and updates Google Sheets
 import json
 import time
 import requests
-import re
 from datetime import datetime
 from password_manager import PasswordManager
-from csv_manager import CSVManager
+from phone_utils import extract_phone, national_phone
+from lead_extractor import extract_lead
+from customer_store import get_customer_manager
+from reply_speculator import ReplySpeculator
 try:
     from ai_chat_engine import get_ai_engine
     ai_engine = get_ai_engine()
@@ -24,7 +26,7 @@ except ImportError:
 class FacebookBot:
     def __init__(self):
         self.pm = PasswordManager()
-        self.csv_manager = CSVManager()
+        self.csv_manager = get_customer_manager()
         self.access_token = self.pm.get_api_key("facebook")
         self.page_id = self.pm.credentials.get("FACEBOOK_PAGE_ID")
         self.base_url = "https://graph.facebook.com/v18.0"
@@ -41,6 +43,9 @@ class FacebookBot:
         # Conversation states
         self.conversations = {}
         
+        # Likely follow-up replies prepared while waiting for the user
+        self.speculator = ReplySpeculator(usage=ai_engine.usage if AI_AVAILABLE and ai_engine else None)
+        
     def get_page_access_token(self):
         """Get page access token - we already have it"""
         # הטוקן שיש לנו כבר הוא Page Access Token
@@ -95,22 +100,8 @@ class FacebookBot:
             return False
     
     def extract_phone_number(self, text):
-        """Extract phone number from text"""
-        # Hebrew phone number patterns
-        patterns = [
-            r'0\d{1,2}-?\d{7}',  # Israeli format
-            r'\+972-?\d{1,2}-?\d{7}',  # International format
-            r'05\d-?\d{7}',  # Mobile format
-            r'\d{10}',  # 10 digits
-            r'\d{3}-?\d{7}'  # 3-7 format
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group().replace('-', '').replace(' ', '')
-        
-        return None
+        """Extract phone number from text, normalized to E.164"""
+        return extract_phone(text) or None
     
     def extract_name_from_profile(self, user_id):
         """Get user's name from Facebook profile"""
@@ -185,28 +176,47 @@ class FacebookBot:
         else:
             return "תודה על פנייתכם ל-VIV Clinic! 🏥 נציג שלנו יחזור אליכם בהקדם. לשירות מיידי: 03-1234567"
     
+    def classify_followup(self, message_text, phone):
+        """Classify a reply to the bot's question for speculation matching"""
+        # A message that is (almost) only a phone number answers the phone request
+        if phone:
+            digits = sum(ch.isdigit() for ch in message_text)
+            if len(message_text.strip()) - digits <= 15:
+                return "phone"
+        return None
+    
     def process_message(self, user_id, message_text, source_type="messenger", post_id=None):
         """Process incoming message and respond appropriately using AI"""
         try:
             # Get user info
             user_name = self.extract_name_from_profile(user_id)
             
-            # Generate AI response
-            if AI_AVAILABLE and ai_engine:
+            # Check if user provided contact info, a treatment or a preferred time
+            lead = extract_lead(message_text)
+            phone = lead.phone or None
+            
+            # Serve the speculatively prepared reply if the user answered as predicted (phone as they write it)
+            ai_response = self.speculator.consume(
+                user_id, self.classify_followup(message_text, phone), phone=national_phone(phone or "")
+            )
+            
+            if ai_response:
+                print(f"⚡ Speculative reply served to {user_id}")
+                if AI_AVAILABLE and ai_engine:
+                    ai_engine.record_exchange(user_id, message_text, ai_response)
+            elif AI_AVAILABLE and ai_engine:
+                # Generate AI response
                 ai_response, is_ai_generated = ai_engine.generate_response(user_id, message_text)
                 print(f"🤖 AI Response ({'AI' if is_ai_generated else 'Fallback'}): {ai_response}")
             else:
                 ai_response = self._fallback_response(message_text)
             
-            # Check if user provided contact info during conversation
-            phone = self.extract_phone_number(message_text)
-            
-            # Save conversation data if we have contact info
-            if phone or any(keyword in message_text.lower() for keyword in ['תור', 'לקבוע', 'פגישה']):
+            # Save conversation data if we have contact info or an appointment request
+            if lead.is_lead:
                 customer_data = {
-                    "name": user_name,
+                    "name": lead.name if lead.name and user_name == "לקוח" else user_name,
                     "phone": phone if phone else "לא סופק",
-                    "topic": message_text[:100],  # First 100 chars as topic
+                    "topic": lead.topic or message_text[:100],  # Else the first 100 chars as topic
                     "source": f"Facebook_{source_type}",
                     "post_id": post_id if post_id else "N/A",
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -216,8 +226,14 @@ class FacebookBot:
                 self.save_to_csv(user_id, customer_data)
                 
                 # Add contact collection message if no phone provided
-                if not phone and any(keyword in message_text.lower() for keyword in ['תור', 'לקבוע', 'פגישה']):
+                if not phone and lead.wants_appointment:
                     ai_response += "\n\n📞 כדי לקבוע תור, אשמח אם תשאיר מספר טלפון לחזרה או תתקשר ישירות: 03-1234567"
+                    
+                    # The next message is most likely the phone number - prepare the confirmation
+                    confirmation = self.responses["confirmation"].format(
+                        name=user_name, phone="{phone}", topic=customer_data["topic"]
+                    )
+                    self.speculator.speculate(user_id, "phone", lambda: confirmation)
             
             # Send response
             if source_type == "messenger":
@@ -237,14 +253,14 @@ class FacebookBot:
     def save_to_csv(self, user_id, conversation):
         """Save conversation data to CSV file"""
         try:
-            # Add customer to CSV
-            success = self.csv_manager.add_customer(
+            # Add customer to CSV, or record another contact from a known one
+            success = self.csv_manager.upsert_customer(
                 name=conversation.get("name", ""),
                 phone=conversation.get("phone", ""),
                 topic=conversation.get("topic", ""),
                 source="Facebook",
                 status="ממתין לטיפול",
-                notes=f"Facebook User ID: {user_id}"
+                user_id=user_id
             )
             
             if success:
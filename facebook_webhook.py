@@ -203,6 +203,11 @@ def test_bot():
         print(f"❌ Error in test: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/speculation', methods=['GET'])
+def get_speculation_stats():
+    """Get speculative reply hit rate and wasted generation cost"""
+    return jsonify(bot.speculator.get_stats())
+
 @app.route('/conversations', methods=['GET'])
 def get_conversations():
     """Get current active conversations"""
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+File Lock for VIV Clinic
+Cross-process exclusive lock on a lock file, re-entrant within a process
+
+Uses advisory fcntl locks, so every gunicorn worker writing the customers
+files must go through it. The lock file is opened on each outermost
+acquisition rather than kept open, so processes forked from a parent that
+already created the lock do not share (and silently bypass) it. Where fcntl
+is unavailable only threads in this process are serialized.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class FileLock:
+    """Exclusive lock for all threads and processes using the same lock file"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        self.stats = {"acquisitions": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+        if fcntl is None:
+            print("⚠️ fcntl not available, customer file writes are only safe within one process")
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except Exception:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+
+            wait = time.perf_counter() - start
+            self.stats["acquisitions"] += 1
+            self.stats["wait_seconds"] += wait
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], wait)
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def get_stats(self) -> Dict:
+        """Get lock acquisition count and wait times"""
+        with self._thread_lock:
+            stats = dict(self.stats)
+        acquisitions = stats["acquisitions"]
+        stats["average_wait_ms"] = round(stats["wait_seconds"] / acquisitions * 1000, 3) if acquisitions else 0.0
+        stats["max_wait_ms"] = round(stats.pop("max_wait_seconds") * 1000, 3)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        return stats
@@ -2,19 +2,41 @@
 """
 Google Sheets Manager for VIV Clinic
 Manages customer inquiries in Google Sheets
+
+New inquiries and status changes are written behind: they are queued and a
+background SheetsSync worker sends them in batches, so callers never wait
+for a Sheets round-trip. Set GOOGLE_SHEETS_BASE_URL to point the manager at
+another Sheets API endpoint, such as sheets_test_server.py. Reads are served
+from a SheetMirror that only fetches rows added since its last refresh.
 """
 
+import atexit
 import json
+import os
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from password_manager import PasswordManager
 
+# Large ranges are read as chunks of this many rows, this many at a time
+READ_CHUNK_ROWS = 2000
+READ_WORKERS = 4
+
+def sheet_prefix(title):
+    """A1-notation prefix for ranges in the tab with this title ('לקוחות'!)"""
+    return "'" + title.replace("'", "''") + "'!"
+
 class GoogleSheetsManager:
     def __init__(self):
         self.pm = PasswordManager()
         self.api_key = self.pm.get_api_key("google")
         self.sheet_id = self.pm.credentials.get("GOOGLE_SHEET_ID")
-        self.base_url = "https://sheets.googleapis.com/v4/spreadsheets"
+        # OAuth2 bearer token; writes to a real sheet need it, an API key alone is read-only
+        self.access_token = self.pm.credentials.get("GOOGLE_SHEETS_TOKEN") or os.getenv("GOOGLE_SHEETS_TOKEN")
+        self.base_url = os.getenv("GOOGLE_SHEETS_BASE_URL", "https://sheets.googleapis.com/v4/spreadsheets")
+        self._sync = None
+        self._mirror = None
         
         # Sheet headers
         self.headers = [
@@ -32,10 +54,7 @@ class GoogleSheetsManager:
         """Create the customer inquiries sheet if it doesn't exist"""
         try:
             # First, try to get the sheet to see if it exists
-            url = f"{self.base_url}/{self.sheet_id}"
-            params = {"key": self.api_key}
-            
-            response = requests.get(url, params=params)
+            response = self._get()
             
             if response.status_code == 404:
                 print("📊 Creating new Google Sheet...")
@@ -68,11 +87,7 @@ class GoogleSheetsManager:
         """Set up headers in the sheet"""
         try:
             # Check if headers already exist
-            range_name = "A1:H1"
-            url = f"{self.base_url}/{self.sheet_id}/values/{range_name}"
-            params = {"key": self.api_key}
-            
-            response = requests.get(url, params=params)
+            response = self.get_values("A1:H1")
             
             if response.status_code == 200:
                 data = response.json()
@@ -94,75 +109,210 @@ class GoogleSheetsManager:
             print(f"❌ Error setting up headers: {e}")
             return False
     
+    def get_sync(self):
+        """The write-behind sync worker for this sheet, started on first use"""
+        if self._sync is None:
+            from sheets_sync import SheetsSync
+            self._sync = SheetsSync(self)
+            atexit.register(self._sync.close)
+        return self._sync
+    
     def add_customer_inquiry(self, row_data):
-        """Add a new customer inquiry to the sheet"""
+        """Queue a new customer inquiry for the end of the sheet"""
         try:
-            # For now, we'll use a simple append method
-            # In production, this would use OAuth2 for write access
-            
-            print("📝 Customer inquiry data to add:")
-            for i, (header, value) in enumerate(zip(self.headers, row_data)):
-                print(f"   {header}: {value}")
-            
-            # Simulate successful save
-            print("✅ Data would be saved to Google Sheets")
-            print(f"📊 Sheet ID: {self.sheet_id}")
-            
-            # In a real implementation, you would use:
-            # range_name = "A:H"
-            # url = f"{self.base_url}/{self.sheet_id}/values/{range_name}:append"
-            # payload = {"values": [row_data]}
-            # response = requests.post(url, json=payload, headers=auth_headers)
-            
+            self.get_sync().add_row(list(row_data))
             return True
             
         except Exception as e:
             print(f"❌ Error adding customer inquiry: {e}")
             return False
     
-    def get_customer_inquiries(self, limit=50):
-        """Get recent customer inquiries from the sheet"""
+    def _auth(self, params):
+        """Headers and query params for a request: the bearer token and/or the API key, whichever are set"""
+        headers = {"Authorization": f"Bearer {self.access_token}"} if self.access_token else {}
+        if self.api_key:
+            params["key"] = self.api_key
+        return headers, params
+    
+    def _url(self, path):
+        return f"{self.base_url}/{self.sheet_id}/{path}" if path else f"{self.base_url}/{self.sheet_id}"
+    
+    def _get(self, path="", **params):
+        """GET from the spreadsheet's API (the spreadsheet itself without a path), raising on network errors"""
+        headers, params = self._auth(params)
+        return requests.get(self._url(path), params=params, headers=headers, timeout=30)
+    
+    def _post(self, path, payload, **params):
+        """POST to the sheet's values API, raising on network errors"""
+        headers, params = self._auth(params)
+        return requests.post(self._url(path), params=params, json=payload, headers=headers, timeout=30)
+    
+    def append_values(self, rows, range_name="A:H"):
+        """Append rows after the last row of the sheet in one values:append request"""
+        return self._post(f"values/{range_name}:append", {"values": rows},
+                          valueInputOption="RAW", insertDataOption="INSERT_ROWS")
+    
+    def batch_update_values(self, data):
+        """Write many ranges ([{"range": ..., "values": rows}]) in one values:batchUpdate request"""
+        return self._post("values:batchUpdate", {"valueInputOption": "RAW", "data": data})
+    
+    def update_statuses(self, statuses):
+        """Set status and notes of many rows ({row number: (status, notes)}) in one values:batchUpdate request
+        
+        Empty notes write only the status, keeping the row's notes.
+        """
+        return self.batch_update_values([
+            {"range": f"G{row_number}:H{row_number}", "values": [[status, notes]]} if notes
+            else {"range": f"G{row_number}", "values": [[status]]}
+            for row_number, (status, notes) in statuses.items()
+        ])
+    
+    def append_rows(self, rows, sheet=None):
+        """Append 7-column customer rows after the last row of a tab (the first by default) in one request"""
         try:
-            range_name = f"A2:H{limit+1}"  # Skip header row
-            url = f"{self.base_url}/{self.sheet_id}/values/{range_name}"
-            params = {"key": self.api_key}
+            if not (self.api_key or self.access_token) or not self.sheet_id:
+                print("❌ Missing Google credentials")
+                return False
             
-            response = requests.get(url, params=params)
+            prefix = sheet_prefix(sheet) if sheet else ""
+            response = self.append_values(rows, f"{prefix}A:G")
             
             if response.status_code == 200:
-                data = response.json()
-                if "values" in data:
-                    inquiries = []
-                    for row in data["values"]:
-                        if len(row) >= len(self.headers):
-                            inquiry = dict(zip(self.headers, row))
-                            inquiries.append(inquiry)
-                    return inquiries
-                else:
-                    return []
+                return True
             else:
-                print(f"❌ Error getting inquiries: {response.text}")
-                return []
+                print(f"❌ Failed to append {len(rows)} rows to Google Sheets: {response.text}")
+                return False
+                
+        except Exception as e:
+            print(f"❌ Error appending rows to Google Sheets: {e}")
+            return False
+    
+    def get_values(self, range_name):
+        """GET a range of the sheet's values"""
+        return self._get(f"values/{range_name}")
+    
+    def _get_tabs(self):
+        """Properties of each tab of the spreadsheet, first tab first"""
+        response = self._get(fields="sheets.properties")
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return [tab["properties"] for tab in response.json().get("sheets", [])]
+    
+    def get_row_count(self, sheet=None):
+        """Rows in the grid of a tab (the first one by default, including empty rows), None if unknown"""
+        try:
+            tabs = self._get_tabs()
+            if sheet is not None:
+                tabs = [tab for tab in tabs if tab.get("title") == sheet]
+            return tabs[0]["gridProperties"]["rowCount"]
+        except Exception:
+            return None
+    
+    def ensure_sheet(self, title):
+        """Add a tab with this title unless the spreadsheet has one; False if that failed"""
+        try:
+            if any(tab.get("title") == title for tab in self._get_tabs()):
+                return True
+            headers, params = self._auth({})
+            response = requests.post(f"{self._url('')}:batchUpdate", params=params, headers=headers,
+                                     json={"requests": [{"addSheet": {"properties": {"title": title}}}]}, timeout=30)
+            if response.status_code == 200:
+                print(f"✅ Added sheet tab: {title}")
+                return True
+            print(f"❌ Failed to add sheet tab {title}: {response.text}")
+            return False
+            
+        except Exception as e:
+            print(f"❌ Error adding sheet tab {title}: {e}")
+            return False
+    
+    def _get_chunk(self, columns, first_row, last_row, sheet=None):
+        first_column, last_column = columns.split(':')
+        prefix = sheet_prefix(sheet) if sheet else ""
+        response = self.get_values(f"{prefix}{first_column}{first_row}:{last_column}{last_row}")
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return response.json().get("values", [])
+    
+    def iter_values(self, first_row=2, chunk_rows=READ_CHUNK_ROWS, workers=READ_WORKERS, columns="A:H", last_row=None,
+                    sheet=None):
+        """Yield the rows of a tab (the first one by default) from first_row (to last_row) on, padded to the columns read
+        
+        Ranges of chunk_rows rows are read by up to `workers` requests at once and
+        rows are yielded in sheet order as soon as their chunk arrives. Sheets
+        leaves out empty rows at the end of a range, so gaps inside the sheet come
+        back as empty rows but nothing is yielded after its last filled row.
+        """
+        first_column, last_column = columns.split(':')
+        blank = [''] * (ord(last_column) - ord(first_column) + 1)
+        pending = deque()
+        next_row = first_row
+        empty_run = 0  # Empty rows held back until a filled row follows them
+        
+        with ThreadPoolExecutor(workers + 1) as pool:
+            # The grid size arrives while the first chunks are being read
+            row_count = pool.submit(self.get_row_count, sheet) if last_row is None else None
+            try:
+                while True:
+                    if row_count is not None and row_count.done():
+                        last_row, row_count = row_count.result(), None
+                    while len(pending) < workers and (last_row is None or next_row <= last_row):
+                        end = next_row + chunk_rows - 1 if last_row is None else min(next_row + chunk_rows - 1, last_row)
+                        pending.append((end - next_row + 1, pool.submit(self._get_chunk, columns, next_row, end, sheet)))
+                        next_row = end + 1
+                    if not pending:
+                        return
+                    
+                    size, future = pending.popleft()
+                    rows = future.result()
+                    for row in rows:
+                        if not row:
+                            empty_run += 1
+                            continue
+                        for _ in range(empty_run):
+                            yield list(blank)
+                        empty_run = 0
+                        yield (list(row) + blank)[:len(blank)]
+                    empty_run += size - len(rows)
+                    if not rows and row_count is not None:
+                        last_row, row_count = row_count.result(), None
+                    if last_row is None and not rows:
+                        return  # Without the grid size, an empty chunk ends the sheet
+            finally:
+                for _, future in pending:
+                    future.cancel()
+    
+    def iter_inquiries(self, chunk_rows=READ_CHUNK_ROWS, workers=READ_WORKERS):
+        """Stream every inquiry in the sheet as a dict, straight from the API"""
+        for row in self.iter_values(2, chunk_rows, workers):
+            yield dict(zip(self.headers, row))
+    
+    def get_mirror(self):
+        """The local mirror of the sheet that reads are served from"""
+        if self._mirror is None:
+            from sheets_mirror import SheetMirror
+            self._mirror = SheetMirror(self)
+        return self._mirror
+    
+    def refresh_mirror(self):
+        """Re-read the whole sheet into the mirror now"""
+        return self.get_mirror().refresh(force=True)
+    
+    def get_customer_inquiries(self, limit=50):
+        """Get recent customer inquiries from the sheet"""
+        try:
+            return self.get_mirror().get_inquiries(limit)
                 
         except Exception as e:
             print(f"❌ Error getting customer inquiries: {e}")
             return []
     
     def update_inquiry_status(self, row_number, new_status, notes=""):
-        """Update the status of a customer inquiry"""
+        """Queue a status (and notes) change for a customer inquiry row; empty notes keep the row's notes"""
         try:
-            print(f"📝 Updating row {row_number}:")
-            print(f"   Status: {new_status}")
-            if notes:
-                print(f"   Notes: {notes}")
-            
-            # In a real implementation:
-            # range_name = f"G{row_number}:H{row_number}"  # Status and Notes columns
-            # url = f"{self.base_url}/{self.sheet_id}/values/{range_name}"
-            # payload = {"values": [[new_status, notes]]}
-            # response = requests.put(url, json=payload, headers=auth_headers)
-            
-            print("✅ Status updated successfully")
+            self.get_sync().update_status(row_number, new_status, notes)
+            if self._mirror is not None:
+                self._mirror.set_status(row_number, new_status, notes)
             return True
             
         except Exception as e:
@@ -172,23 +322,7 @@ class GoogleSheetsManager:
     def search_inquiries(self, search_term):
         """Search for inquiries by name, phone, or topic"""
         try:
-            inquiries = self.get_customer_inquiries()
-            results = []
-            
-            search_term = search_term.lower()
-            
-            for inquiry in inquiries:
-                # Search in name, phone, and topic
-                searchable_text = (
-                    inquiry.get("שם הלקוח", "") + " " +
-                    inquiry.get("מספר טלפון", "") + " " +
-                    inquiry.get("נושא התעניינות", "")
-                ).lower()
-                
-                if search_term in searchable_text:
-                    results.append(inquiry)
-            
-            return results
+            return self.get_mirror().search(search_term)
             
         except Exception as e:
             print(f"❌ Error searching inquiries: {e}")
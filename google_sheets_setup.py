@@ -4,8 +4,8 @@ Google Sheets Setup Guide for VIV Clinic
 Instructions for connecting Google Sheets to the bot system
 """
 
-import json
-from csv_manager import CSVManager
+from customer_export import export_customers, upload_to_sheets
+from customer_store import get_customer_manager
 
 def print_setup_instructions():
     """Print step-by-step instructions for Google Sheets setup"""
@@ -49,25 +49,21 @@ def print_setup_instructions():
     print("\n🔄 Step 5: Import Existing Data")
     print("Run this script with --import flag to import CSV data to Google Sheets")
 
-def export_csv_for_google_sheets():
+def export_csv_for_google_sheets(export_format='json'):
     """Export CSV data in Google Sheets format"""
-    csv_manager = CSVManager()
-    data = csv_manager.export_to_google_sheets_format()
+    csv_manager = get_customer_manager()
+    output_file = f"google_sheets_import.{export_format}"
     
     print("\n📤 CSV Data for Google Sheets Import:")
     print("=" * 40)
+    print("Headers:", csv_manager.headers)
     
-    for i, row in enumerate(data):
-        if i == 0:
-            print("Headers:", row)
-        else:
-            print(f"Row {i}:", row)
-    
-    # Save as JSON for easy import
-    with open('google_sheets_import.json', 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # Rows are streamed to the file in chunks, so any number of customers fits
+    count = export_customers(csv_manager, output_file, export_format)
+    if count is None:
+        return
     
-    print(f"\n✅ Data exported to: google_sheets_import.json")
+    print(f"\n✅ {count} customers exported to: {output_file}")
     print("You can use this file to import data to Google Sheets")
 
 def create_google_sheets_manager():
@@ -191,11 +187,18 @@ if __name__ == "__main__":
     import sys
     
     if len(sys.argv) > 1 and sys.argv[1] == "--export":
-        export_csv_for_google_sheets()
+        export_csv_for_google_sheets(sys.argv[2] if len(sys.argv) > 2 else 'json')
+    elif len(sys.argv) > 1 and sys.argv[1] == "--upload":
+        upload_to_sheets(get_customer_manager())
+    elif len(sys.argv) > 1 and sys.argv[1] == "--sync":
+        from customer_sheet_sync import CustomerSheetSync
+        CustomerSheetSync(get_customer_manager()).sync()
     elif len(sys.argv) > 1 and sys.argv[1] == "--create-manager":
         create_google_sheets_manager()
     else:
         print_setup_instructions()
         print("\n🚀 Quick Actions:")
-        print("python google_sheets_setup.py --export     # Export CSV data")
+        print("python google_sheets_setup.py --export [json|csv|ndjson]  # Export CSV data")
+        print("python google_sheets_setup.py --upload     # Append all customers to the sheet")
+        print("python google_sheets_setup.py --sync       # Two-way sync of changes with the sheet")
         print("python google_sheets_setup.py --create-manager  # Create updated manager")
\ No newline at end of file
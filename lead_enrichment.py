@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Lead Enrichment for VIV Clinic
+Batch job that has the AI provider extract lead details the regexes missed
+
+Customers whose topic lead_extractor could not structure (no treatment or
+preferred time found) are collected from the customer store, one record per
+phone, and sent to the configured provider's cheap model many records per
+prompt, asking for JSON back. The treatment, preferred time, name and
+appointment intent found are appended to the customer's notes ("AI: ...")
+in one bulk update, which also marks the customer as enriched; each row keeps
+its own notes and status, including changes made while the job ran. A failed
+batch is left for the next run.
+
+Run it from cron or by hand, away from the message path:
+    python lead_enrichment.py [--limit 500] [--batch-size 25] [--workers 4]
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from ai_chat_engine import AIConfig
+from ai_payloads import PayloadEncoder
+from lead_extractor import TREATMENTS, extract_lead
+from phone_utils import national_phone
+from usage_tracker import UsageTracker
+
+BATCH_SIZE = 25
+WORKERS = 4
+TOKENS_PER_RECORD = 60  # Output budget for one record's JSON
+ENRICHED_MARK = "AI:"
+USAGE_USER = "lead-enrichment"
+
+PHONE, TOPIC, NOTES = 2, 3, 6  # Columns of a customer row
+
+SYSTEM_PROMPT = f"""
+אתה מחלץ פרטים מפניות של לקוחות למרפאת השיניים VIV Clinic.
+תקבל מערך JSON של פניות, כל אחת עם id ו-text.
+החזר JSON בלבד, בצורה: {{"leads": [{{"id": 0, "treatment": "", "when": "", "name": "", "appointment": false}}]}}
+- treatment: אחד מאלה בדיוק, או "" אם לא הוזכר טיפול: {", ".join(TREATMENTS)}
+- when: היום או השעה המועדפים כפי שנכתבו, או ""
+- name: שם הלקוח אם הוזכר, או ""
+- appointment: true אם הלקוח מבקש לקבוע תור
+החזר רשומה אחת לכל id.
+"""
+
+def enrichment_note(fields: Dict) -> str:
+    """The note for the extracted fields; "AI: -" if nothing was found"""
+    parts = [f"{label}: {fields[key]}" for key, label in (("treatment", "טיפול"), ("when", "מועד"), ("name", "שם"))
+             if fields.get(key)]
+    if fields.get("appointment"):
+        parts.append("מבקש תור")
+    return f"{ENRICHED_MARK} {'; '.join(parts) or '-'}"
+
+def parse_leads(text: str) -> Optional[Dict[int, Dict]]:
+    """Provider reply -> {record id: fields}; None if it holds no JSON"""
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return None
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text[min(starts):])
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = data.get("leads", [])
+    if not isinstance(data, list):
+        return None
+
+    leads = {}
+    for item in data:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), int):
+            continue
+        leads[item["id"]] = {
+            "treatment": str(item.get("treatment") or "")[:40],
+            "when": str(item.get("when") or "")[:40],
+            "name": str(item.get("name") or "")[:40],
+            "appointment": item.get("appointment") is True,
+        }
+    return leads
+
+class LeadEnrichment:
+    """Collects unenriched customers and enriches them through the AI provider in batches"""
+
+    def __init__(self, customer_manager=None, provider: Optional[str] = None, model: Optional[str] = None,
+                 batch_size: int = BATCH_SIZE, workers: int = WORKERS):
+        if customer_manager is None:
+            from customer_store import get_customer_manager
+            customer_manager = get_customer_manager()
+        self.customers = customer_manager
+        self.config = AIConfig()
+        self.provider = provider or self._select_provider()
+        prefix = {'openai': 'OPENAI', 'gemini': 'GEMINI', 'claude': 'CLAUDE'}.get(self.provider)
+        self.model = model or (getattr(self.config, prefix + '_CHEAP_MODEL') if prefix else None)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.encoder = self._build_encoder()
+        self.usage = UsageTracker(log_file=self.config.USAGE_LOG, flush_interval=self.config.USAGE_FLUSH_SECONDS)
+        self.stats = {"records": 0, "enriched": 0, "failed": 0, "requests": 0, "seconds": 0.0, "cost_usd": 0.0}
+
+    def _select_provider(self) -> Optional[str]:
+        keys = {'openai': self.config.OPENAI_API_KEY, 'gemini': self.config.GEMINI_API_KEY,
+                'claude': self.config.CLAUDE_API_KEY}
+        if keys.get(self.config.DEFAULT_PROVIDER):
+            return self.config.DEFAULT_PROVIDER
+        return next((provider for provider, key in keys.items() if key), None)
+
+    def _build_encoder(self) -> PayloadEncoder:
+        max_tokens = TOKENS_PER_RECORD * self.batch_size + 50
+        if self.provider == 'gemini':
+            return PayloadEncoder({
+                'systemInstruction': {'parts': [{'text': SYSTEM_PROMPT}]},
+                'generationConfig': {'temperature': 0, 'maxOutputTokens': max_tokens,
+                                     'responseMimeType': 'application/json'}
+            }, 'contents')
+        if self.provider == 'claude':
+            return PayloadEncoder({'model': self.model, 'max_tokens': max_tokens, 'system': SYSTEM_PROMPT},
+                                  'messages')
+        return PayloadEncoder(
+            {'model': self.model, 'max_tokens': max_tokens, 'temperature': 0,
+             'response_format': {'type': 'json_object'}},
+            'messages',
+            leading_items=[{'role': 'system', 'content': SYSTEM_PROMPT}]
+        )
+
+    def find_unenriched(self, limit: Optional[int] = None) -> List[Dict]:
+        """Customers with a phone whose topic the regexes could not structure, latest row per phone"""
+        records = {}
+        for chunk in self.customers.iter_customer_rows():
+            for row in chunk:
+                if len(row) <= NOTES or not national_phone(row[PHONE]):
+                    continue
+                if ENRICHED_MARK in row[NOTES]:
+                    records.pop(row[PHONE], None)
+                    continue
+                lead = extract_lead(row[TOPIC])
+                if row[TOPIC].strip() and not lead.treatments and not lead.when:
+                    records[row[PHONE]] = {"phone": row[PHONE], "text": row[TOPIC]}
+        records = list(records.values())
+        return records[:limit] if limit else records
+
+    def _send(self, body: bytes) -> requests.Response:
+        if self.provider == 'gemini':
+            url = self.config.GEMINI_URL_TEMPLATE.format(model=self.model)
+            return requests.post(f"{url}?key={self.config.GEMINI_API_KEY}", data=body,
+                                 headers={'Content-Type': 'application/json'}, timeout=120)
+        if self.provider == 'claude':
+            return requests.post(self.config.CLAUDE_URL, data=body, timeout=120, headers={
+                'x-api-key': self.config.CLAUDE_API_KEY,
+                'Content-Type': 'application/json',
+                'anthropic-version': '2023-06-01'
+            })
+        return requests.post(self.config.OPENAI_URL, data=body, timeout=120, headers={
+            'Authorization': f'Bearer {self.config.OPENAI_API_KEY}',
+            'Content-Type': 'application/json'
+        })
+
+    def _enrich_batch(self, records: List[Dict]) -> Tuple[Optional[Dict[int, Dict]], float]:
+        """One provider request for a batch: ({index in batch: fields} or None if it failed, cost)"""
+        prompt = json.dumps([{"id": i, "text": record["text"]} for i, record in enumerate(records)],
+                            ensure_ascii=False)
+        try:
+            if self.provider == 'gemini':
+                body = self.encoder.encode([{'role': 'user', 'parts': [{'text': prompt}]}])
+            else:
+                body = self.encoder.encode([{'role': 'user', 'content': prompt}])
+            response = self._send(body)
+            if response.status_code != 200:
+                print(f"❌ Lead enrichment API error: {response.status_code} - {response.text[:200]}")
+                return None, 0.0
+
+            result = response.json()
+            if self.provider == 'gemini':
+                usage = result.get('usageMetadata', {})
+                tokens = (usage.get('promptTokenCount', 0), usage.get('candidatesTokenCount', 0))
+                text = result['candidates'][0]['content']['parts'][0]['text']
+            elif self.provider == 'claude':
+                usage = result.get('usage', {})
+                tokens = (usage.get('input_tokens', 0), usage.get('output_tokens', 0))
+                text = result['content'][0]['text']
+            else:
+                usage = result.get('usage', {})
+                tokens = (usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+                text = result['choices'][0]['message']['content']
+            cost = self.usage.record(self.provider, self.model, USAGE_USER, *tokens)
+
+            leads = parse_leads(text)
+            if leads is None:
+                print(f"⚠️ Lead enrichment reply was not JSON: {text[:200]}")
+            return leads, cost
+
+        except Exception as e:
+            print(f"❌ Error enriching leads: {e}")
+            return None, 0.0
+
+    def run(self, limit: Optional[int] = None) -> Dict:
+        """Enrich up to `limit` customers; returns this run's stats"""
+        if not self.provider:
+            print("⚠️ No AI provider configured, skipping lead enrichment")
+            return self.get_stats()
+
+        start = time.perf_counter()
+        records = self.find_unenriched(limit)
+        batches = [records[i:i + self.batch_size] for i in range(0, len(records), self.batch_size)]
+
+        additions = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch, (leads, cost) in zip(batches, pool.map(self._enrich_batch, batches)):
+                self.stats["requests"] += 1
+                self.stats["cost_usd"] += cost
+                if leads is None:
+                    self.stats["failed"] += len(batch)
+                    continue
+                for i, record in enumerate(batch):
+                    fields = leads.get(i, {})
+                    additions[record["phone"]] = enrichment_note(fields)
+                    self.stats["enriched"] += any(fields.values())
+
+        if additions:
+            self.customers.append_customer_notes(additions)
+        self.usage.flush()
+        self.stats["records"] += len(records)
+        self.stats["seconds"] += time.perf_counter() - start
+        return self.get_stats()
+
+    def get_stats(self) -> Dict:
+        """Records sent, enriched and failed, requests, time and cost, with records per second and per dollar"""
+        stats = dict(self.stats)
+        sent = stats["records"] - stats["failed"]
+        stats["provider"], stats["model"] = self.provider, self.model
+        stats["records_per_request"] = round(stats["records"] / stats["requests"], 1) if stats["requests"] else 0.0
+        stats["records_per_second"] = round(sent / stats["seconds"], 1) if stats["seconds"] else 0.0
+        stats["records_per_dollar"] = round(sent / stats["cost_usd"]) if stats["cost_usd"] else None
+        stats["seconds"] = round(stats["seconds"], 2)
+        stats["cost_usd"] = round(stats["cost_usd"], 6)
+        return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract lead details for unenriched customers with the AI provider")
+    parser.add_argument('--limit', type=int, default=None, help="Customers to enrich this run")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Customers per prompt")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="Requests in flight")
+    args = parser.parse_args()
+
+    job = LeadEnrichment(batch_size=args.batch_size, workers=args.workers)
+    stats = job.run(args.limit)
+    print(f"📊 Lead enrichment: {json.dumps(stats, ensure_ascii=False)}")
+
+if __name__ == "__main__":
+    main()
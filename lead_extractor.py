@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Lead Extractor for VIV Clinic
+Structured lead details from a customer's message, in one regex pass
+
+A single compiled pattern finds, left to right: the phone number (see
+phone_utils.PHONE_PATTERN), the treatments asked about, preferred days and
+times (מחר, יום ראשון, בבוקר, בשעה 10:00, 12.5), a stated name (שמי, קוראים
+לי, השם שלי) and appointment words (תור, לקבוע, פגישה). Hebrew words may carry
+up to two attached prefix letters (ו, ה, ב, ל, מ, ש, כ), so "ולהשתלה" is found.
+Nothing is looked up or sent anywhere, so this runs on every message; the
+result is a Lead used to decide whether and how the message is stored.
+"""
+
+import re
+from typing import NamedTuple, Tuple
+
+from customer_keys import TOPIC_LENGTH
+from phone_utils import PHONE_PATTERN, phone_from_match
+
+# Canonical treatment -> word stems that name it (any ending is accepted)
+TREATMENTS = {
+    "השתלות": ("השתל", "שתל"),
+    "הלבנת שיניים": ("הלבנ", "להלבין"),
+    "יישור שיניים": ("יישור", "ישור", "אורתודונט", "קשתיות", "אינויזליין"),
+    "ניקוי אבנית": ("ניקוי", "אבנית", "שיננית"),
+    "סתימות": ("סתימ",),
+    "טיפול שורש": ("טיפול שורש", "טיפולי שורש"),
+    "כתרים וגשרים": ("כתר", "גשר"),
+    "עקירה": ("עקיר", "לעקור"),
+    "ציפויים": ("ציפוי", "ונירים", "למינייט"),
+    "כאב שיניים": ("כאב", "כואב"),
+}
+
+DAYS = ("מחרתיים", "מחר", "היום", "הערב", "יום ראשון", "יום שני", "יום שלישי", "יום רביעי",
+        "יום חמישי", "יום שישי", "שבוע הבא", "סוף השבוע")
+APPOINTMENT_WORDS = ("תור", "תורים", "פגישה", "פגישות", "לקבוע", "לתאם", "קביעת")
+NAME_INTRODUCTIONS = ("שמי", "קוראים לי", "השם שלי הוא", "השם שלי")
+# A name is one or two words; a second word like these is the rest of the sentence
+NAME_STOPWORDS = {"אני", "רוצה", "רציתי", "אשמח", "מבקש", "מבקשת", "תודה", "שלום", "היי"}
+
+def _words(words) -> str:
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+def _treatment_group(index: int) -> str:
+    return f"treatment{index}"
+
+_TREATMENT_NAMES = {_treatment_group(i): name for i, name in enumerate(TREATMENTS)}
+_HEBREW_WORD = r"[א-תA-Za-z][א-תA-Za-z'׳-]*"
+
+# Parts of the day need a prefix (בבוקר, לערב): alone they are usually greetings (ערב טוב)
+_LEAD_PARTS = re.compile(rf"""
+    (?= [\d+(] | (?<![א-ת])[א-ת] )  # Only try where something can start: skips the inside of words
+    (?:
+        (?P<phone>{PHONE_PATTERN})
+      | (?P<time> (?<![\d.:]) (?:\d{{1,2}}:\d{{2}} | \d{{1,2}}[./]\d{{1,2}}(?:[./]\d{{2,4}})?) (?![\d.:]) )
+      | (?<![א-ת]) (?:
+            (?P<name> (?:{_words(NAME_INTRODUCTIONS)}) \s+ (?P<name_value>{_HEBREW_WORD}(?:\ {_HEBREW_WORD})?) )
+          | (?P<part> ו?[בל](?:בוקר|צהריים|צהרים|ערב) (?![א-ת]) | ו?אחה"צ | ו?אחר\ הצהריים )
+          | [והבלמשכ]{{0,2}} (?:
+                {"|".join(f"(?P<{_treatment_group(i)}>(?:{_words(stems)})[א-ת]*)" for i, stems in enumerate(TREATMENTS.values()))}
+              | (?P<appointment> (?:{_words(APPOINTMENT_WORDS)}) (?![א-ת]) )
+              | (?P<day> (?:{_words(DAYS)}) (?![א-ת]) )
+              | (?P<hour> שעה \s* \d{{1,2}}(?::\d{{2}})? (?!\d) )
+            )
+        )
+    )
+""", re.VERBOSE)
+
+class Lead(NamedTuple):
+    """What a message tells about the customer; empty fields were not mentioned"""
+    phone: str = ""  # E.164
+    name: str = ""
+    treatments: Tuple[str, ...] = ()
+    when: Tuple[str, ...] = ()
+    wants_appointment: bool = False
+
+    @property
+    def is_lead(self) -> bool:
+        """Worth storing: a phone number or an appointment request"""
+        return bool(self.phone) or self.wants_appointment
+
+    @property
+    def topic(self) -> str:
+        """Treatments and preferred time for the customers file, '' if neither was mentioned"""
+        parts = [", ".join(self.treatments), " ".join(self.when)]
+        return " | ".join(part for part in parts if part)[:TOPIC_LENGTH]
+
+def extract_lead(text: str) -> Lead:
+    """Extract phone, name, treatments, preferred time and appointment intent from a message"""
+    phone, name = "", ""
+    treatments, when = [], []
+    wants_appointment = False
+
+    for match in _LEAD_PARTS.finditer(text or ""):
+        kind = match.lastgroup
+        if kind == "phone":
+            phone = phone or phone_from_match(match)
+        elif kind in _TREATMENT_NAMES:
+            treatment = _TREATMENT_NAMES[kind]
+            if treatment not in treatments:
+                treatments.append(treatment)
+        elif kind == "appointment":
+            wants_appointment = True
+        elif kind == "name":
+            if not name:
+                words = match.group("name_value").split()
+                if len(words) > 1 and (words[1] in NAME_STOPWORDS or words[1][0] == "ו"):
+                    words = words[:1]
+                name = " ".join(words)
+        else:
+            # Day (without its prefix letters), part of day, hour, or a clock time / date, as written
+            when.append(match.group("day") if kind == "day" else match.group())
+
+    return Lead(phone, name, tuple(treatments), tuple(when), wants_appointment)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Phone Index for VIV Clinic
+Persistent phone -> row byte offsets index over the customers CSV
+
+The index file is append-only, one line per row: offset<TAB>"phone", after a
+header line naming the CSV's inode. It is extended as rows are appended and
+validated on startup against the CSV's inode, size and modification time; it
+is rebuilt if it does not match.
+"""
+
+import json
+import os
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Optional
+from csv_records import iter_records, parse_record
+from csv_scan import scan_columns
+
+class PhoneIndex:
+    """Secondary index from phone number to the byte offsets of its rows"""
+
+    def __init__(self, csv_file, phone_column: int):
+        self.csv_file = Path(csv_file)
+        self.index_file = self.csv_file.with_name(self.csv_file.name + '.idx')
+        self.phone_column = phone_column
+        self.offsets = {}
+        self.indexed_size = 0
+        self.base_inode = None
+        self.index_file_pos = 0
+        self.index_inode = None
+
+    def load(self):
+        """Load the index, catching up on new rows or rebuilding if it is stale"""
+        if not self.index_file.exists():
+            self.rebuild()
+            return
+
+        csv_stat = self.csv_file.stat()
+        index_mtime = self.index_file.stat().st_mtime_ns
+        indexed_size = self._spot_check(self._read_index_file())
+
+        # Swapped for another file, or modified without growing: rewritten
+        rewritten = self.base_inode != csv_stat.st_ino or (
+            csv_stat.st_mtime_ns > index_mtime and csv_stat.st_size <= (indexed_size or 0))
+
+        if indexed_size is None or rewritten or indexed_size > csv_stat.st_size:
+            self.rebuild()
+            return
+
+        self.indexed_size = indexed_size
+        if indexed_size < csv_stat.st_size:
+            self.catch_up()
+
+    def _read_index_file(self):
+        """Read the persisted entries; returns the last (offset, phone) entry"""
+        self.offsets = {}
+        self.base_inode = None
+        self.index_file_pos = 0
+        self.index_inode = self.index_file.stat().st_ino
+        return self._read_index_entries()
+
+    def _read_index_entries(self):
+        """Read entries from index_file_pos on; returns the last (offset, phone) entry"""
+        with open(self.index_file, 'rb') as f:
+            f.seek(self.index_file_pos)
+            data = f.read()
+
+        # Only complete lines; a line still being written is picked up next time
+        complete = data.rfind(b'\n') + 1
+        self.index_file_pos += complete
+        lines = data[:complete].decode('utf-8').split('\n')
+
+        if lines and lines[0].startswith('#inode\t'):
+            self.base_inode = int(lines[0].split('\t', 1)[1])
+
+        offsets = self.offsets
+        last_entry = None
+        for line in lines:
+            parts = line.split('\t', 1)
+            if len(parts) != 2 or parts[0] == '#inode':
+                continue
+            # Phones are JSON strings; only escaped ones need a real decode
+            phone = json.loads(parts[1]) if '\\' in parts[1] else parts[1][1:-1]
+            offset = int(parts[0])
+            if phone in offsets:
+                offsets[phone].append(offset)
+            else:
+                offsets[phone] = [offset]
+            last_entry = (offset, phone)
+        return last_entry
+
+    def sync(self):
+        """Pick up rows indexed by other processes, then any rows the index lacks"""
+        if self.index_file.stat().st_ino != self.index_inode:
+            self.load()  # Rebuilt by another process
+            return
+
+        last_entry = self._read_index_entries()
+        if last_entry is not None:
+            indexed_size = self._spot_check(last_entry)
+            if indexed_size is None:
+                self.rebuild()
+                return
+            self.indexed_size = max(self.indexed_size, indexed_size)
+
+        if self.indexed_size < self.csv_file.stat().st_size:
+            self.catch_up()
+
+    def _spot_check(self, entry) -> Optional[int]:
+        """Check the last indexed row is where the index says; returns where it ends"""
+        with open(self.csv_file, 'rb') as f:
+            if entry is None:
+                return len(f.readline())
+            offset, phone = entry
+            for _, raw in iter_records(f, offset):
+                row = parse_record(raw)
+                if len(row) > self.phone_column and row[self.phone_column] == phone:
+                    return offset + len(raw)
+        return None
+
+    def _scan(self, start: int):
+        """Scan the CSV from start, yielding (offset, end, phone) entries"""
+        with open(self.csv_file, 'rb') as f:
+            # start 0 means from the first row after the header
+            for offset, end, (phone,) in scan_columns(f, [self.phone_column], start or None):
+                if phone is not None:
+                    yield offset, end, phone
+
+    def rebuild(self):
+        """Rebuild the index from a full scan of the CSV"""
+        csv_size = self.csv_file.stat().st_size
+        self.replace(((offset, phone) for offset, _, phone in self._scan(0)), csv_size)
+        print(f"✅ Rebuilt phone index: {sum(len(o) for o in self.offsets.values())} rows")
+
+    def catch_up(self):
+        """Index rows appended to the CSV since the index was written"""
+        self.extend(list(self._scan(self.indexed_size)))
+
+    def replace(self, entries, csv_size: int):
+        """Replace the whole index from (offset, phone) entries in file order"""
+        self.offsets = {}
+        self.indexed_size = csv_size
+        self.base_inode = self.csv_file.stat().st_ino
+
+        temp_file = self.index_file.with_name(self.index_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(f"#inode\t{self.base_inode}\n")
+            for offset, phone in entries:
+                self.offsets.setdefault(phone, []).append(offset)
+                f.write(self._format_entry(offset, phone))
+            self.index_file_pos = f.tell()
+        os.replace(temp_file, self.index_file)
+        self.index_inode = self.index_file.stat().st_ino
+
+    def remap(self, changes: List, csv_size: int):
+        """Shift offsets after rows were rewritten with a different length
+
+        changes: (old_offset, length_delta) per rewritten row, in file order.
+        Every row after a rewritten row moves by that row's length delta.
+        """
+        points = []
+        shifts = []
+        total = 0
+        for old_offset, delta in changes:
+            total += delta
+            points.append(old_offset)
+            shifts.append(total)
+
+        def new_offset(offset):
+            i = bisect_left(points, offset)
+            return offset + shifts[i - 1] if i else offset
+
+        entries = sorted(
+            (new_offset(offset), phone)
+            for phone, offsets in self.offsets.items()
+            for offset in offsets
+        )
+        self.replace(entries, csv_size)
+
+    def _format_entry(self, offset: int, phone: str) -> str:
+        return f"{offset}\t{json.dumps(phone, ensure_ascii=False)}\n"
+
+    def extend(self, entries: List):
+        """Index appended rows given as (offset, end, phone) entries"""
+        if not entries:
+            return
+        for offset, end, phone in entries:
+            self.offsets.setdefault(phone, []).append(offset)
+            self.indexed_size = max(self.indexed_size, end)
+        with open(self.index_file, 'a', encoding='utf-8') as f:
+            f.writelines(self._format_entry(offset, phone) for offset, _, phone in entries)
+            self.index_file_pos = f.tell()
+
+    def lookup(self, phone: str) -> List[int]:
+        """Get the byte offsets of all rows with this phone, oldest first"""
+        return self.offsets.get(phone, [])
+
+    def verify(self) -> Dict:
+        """Compare the index with a full scan of the CSV"""
+        expected = {}
+        for offset, _, phone in self._scan(0):
+            expected.setdefault(phone, []).append(offset)
+
+        missing = sorted(phone for phone in expected if self.offsets.get(phone) != expected[phone])
+        extra = sorted(phone for phone in self.offsets if phone not in expected)
+        return {
+            "consistent": not missing and not extra,
+            "indexed_phones": len(self.offsets),
+            "csv_phones": len(expected),
+            "mismatched_phones": missing[:20],
+            "unknown_phones": extra[:20]
+        }
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Phone Utils for VIV Clinic
+Normalization of Israeli phone numbers
+
+Customers leave numbers as 050-1234567, 0501234567, +972-50-1234567 or
+972501234567; these all normalize to the same E.164 form.
+
+extract_phone finds a number inside a free-text message with one compiled
+pattern: an Israeli prefix (0, +972, 00972 or 972, optionally with (0) or the
+area code in parentheses), the area code (mobile 05X, 07X, or landline 02,
+03, 04, 08, 09) and seven subscriber digits, split by single spaces, dashes
+or dots. Digits on either side rule a match out, so longer numbers such as
+order or card numbers are not cut down into a phone.
+"""
+
+import re
+from typing import List
+
+COUNTRY_CODE = "972"
+_NON_DIGITS = re.compile(r'\D')
+# A national number without its leading 0: mobile 5X/7X (9 digits), or landline 2, 3, 4, 8, 9 (8 digits)
+_BARE_NATIONAL = re.compile(r'[57]\d{8}|[2-489]\d{7}')
+PHONE_PATTERN = r"""
+    (?<![\d+])
+    (?:
+        (?:\+|00)?972 [-. ]? (?:\(0\)[-. ]?)? \(? (?P<international>[57]\d|[2-489]) \)?
+      | \(? 0 (?P<national>[57]\d|[2-489]) \)?
+    )
+    [-. ]?
+    (?P<subscriber>\d{3}[-. ]?\d{2}[-. ]?\d{2})
+    (?!\d)
+"""  # Verbose; groups: international or national area code, subscriber
+_PHONE_IN_TEXT = re.compile(PHONE_PATTERN, re.VERBOSE)
+
+def phone_digits(phone: str) -> str:
+    """Just the digits of a phone number"""
+    return _NON_DIGITS.sub('', phone or '')
+
+def normalize_phone(phone: str) -> str:
+    """Normalize a phone number to E.164 (+972501234567); '' if it is not a phone number
+
+    Non-Israeli numbers need an explicit + or 00; other long digit strings are
+    order or ID numbers, not phones.
+    """
+    digits = phone_digits(phone)
+    if not digits:
+        return ''
+    if phone.strip().startswith('+'):
+        international = digits
+    elif digits.startswith('00'):
+        international = digits[2:]
+    elif digits.startswith(COUNTRY_CODE) and len(digits) >= 11:
+        international = digits
+    elif digits.startswith('0'):
+        return '+' + COUNTRY_CODE + digits[1:]
+    elif len(digits) in (8, 9) and _BARE_NATIONAL.fullmatch(digits):
+        return '+' + COUNTRY_CODE + digits  # National number without the leading 0
+    else:
+        return ''
+    if international.startswith(COUNTRY_CODE + '0'):
+        international = COUNTRY_CODE + international[len(COUNTRY_CODE) + 1:]  # +972 (0)50-...: drop the trunk 0
+    return '+' + international
+
+def extract_phone(text: str) -> str:
+    """The first Israeli phone number in a message, in E.164 (+972501234567); '' if there is none"""
+    match = _PHONE_IN_TEXT.search(text or '')
+    return phone_from_match(match) if match else ''
+
+def phone_from_match(match) -> str:
+    """E.164 form of a PHONE_PATTERN match (also inside a larger pattern)"""
+    area = match.group('international') or match.group('national')
+    return '+' + COUNTRY_CODE + area + phone_digits(match.group('subscriber'))
+
+def phone_forms(phone: str) -> List[str]:
+    """Digit forms a number is searched by: international (972...) and, for Israeli numbers, national (0...)
+
+    Digits that are not a whole phone number (a partial search) are searched as written.
+    """
+    international = normalize_phone(phone)[1:]
+    if not international:
+        digits = phone_digits(phone)
+        return [digits] if digits else []
+    if international.startswith(COUNTRY_CODE):
+        return [international, '0' + international[len(COUNTRY_CODE):]]
+    return [international]
+
+def national_phone(phone: str) -> str:
+    """Israeli numbers as stored in the customers file (0501234567); other numbers in E.164; '' if not a phone"""
+    if len(phone_digits(phone)) < 9:
+        return ''
+    e164 = normalize_phone(phone)
+    if e164.startswith('+' + COUNTRY_CODE):
+        national = e164[len(COUNTRY_CODE) + 1:]
+        return '0' + national if _BARE_NATIONAL.fullmatch(national) else ''  # No Israeli area code starts 0 or 1
+    return e164
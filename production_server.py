@@ -27,8 +27,8 @@ FACEBOOK_VERIFY_TOKEN = os.environ.get('FACEBOOK_VERIFY_TOKEN', 'VIV_CLINIC_VERI
 
 # Initialize CSV manager
 try:
-    from csv_manager import CSVManager
-    csv_manager = CSVManager()
+    from customer_store import get_customer_manager
+    csv_manager = get_customer_manager()
 except ImportError:
     csv_manager = None
 
@@ -207,10 +207,66 @@ def customer_stats():
     """Get customer statistics"""
     try:
         stats = csv_manager.get_stats()
+        response = {
+            "status": "✅ Success",
+            "statistics": stats
+        }
+        if hasattr(csv_manager, 'get_lock_stats'):
+            response["write_lock"] = csv_manager.get_lock_stats()
         
+        return jsonify(response)
+        
+    except Exception as e:
         return jsonify({
+            "status": "❌ Error",
+            "error": str(e)
+        })
+
+@app.route('/analytics')
+def customer_analytics():
+    """Dashboard counts, optionally for ?start=YYYY-MM-DD&end=YYYY-MM-DD and ?group_by=source,status,day"""
+    try:
+        if not hasattr(csv_manager, 'get_analytics'):
+            return jsonify({
+                "status": "❌ Error",
+                "error": "Analytics not available for this customer backend"
+            })
+        
+        analytics = csv_manager.get_analytics()
+        start_date = request.args.get('start')
+        end_date = request.args.get('end')
+        response = {
             "status": "✅ Success",
-            "statistics": stats
+            "analytics": analytics.get_summary(start_date, end_date)
+        }
+        group_by = [name for name in request.args.get('group_by', '').split(',') if name]
+        if group_by:
+            response["groups"] = analytics.count_by(*group_by, start_date=start_date, end_date=end_date)
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({
+            "status": "❌ Error",
+            "error": str(e)
+        })
+
+@app.route('/search')
+def search_customers():
+    """Search customers by name, phone or topic: ?q=...&limit=20"""
+    try:
+        if not hasattr(csv_manager, 'search_customers'):
+            return jsonify({
+                "status": "❌ Error",
+                "error": "Search not available for this customer backend"
+            })
+        
+        query = request.args.get('q', '')
+        limit = int(request.args.get('limit', 20))
+        return jsonify({
+            "status": "✅ Success",
+            "query": query,
+            "results": csv_manager.search_customers(query, limit)
         })
         
     except Exception as e:
@@ -251,13 +307,13 @@ def webhook():
                         # Save customer data if CSV manager available
                         if csv_manager:
                             try:
-                                csv_manager.save_customer({
-                                    'name': f'Customer_{sender_id[-4:]}',
-                                    'phone': 'Unknown',
-                                    'message': message_text,
-                                    'source': 'Facebook',
-                                    'status': 'New'
-                                })
+                                csv_manager.upsert_customer(
+                                    name=f'Customer_{sender_id[-4:]}',
+                                    phone='Unknown',
+                                    topic=message_text[:100],
+                                    source='Facebook',
+                                    user_id=sender_id
+                                )
                             except Exception as e:
                                 print(f"Error saving customer: {e}")
                         
@@ -565,13 +621,14 @@ def chat_send():
         # Save customer data if CSV manager available
         if csv_manager:
             try:
-                csv_manager.save_customer({
-                    'name': f'Test_User_{sender_id[-4:]}',
-                    'phone': 'Test',
-                    'message': message,
-                    'source': 'Test_Chat',
-                    'status': 'Test'
-                })
+                csv_manager.upsert_customer(
+                    name=f'Test_User_{sender_id[-4:]}',
+                    phone='Test',
+                    topic=message[:100],
+                    source='Test_Chat',
+                    status='Test',
+                    user_id=sender_id
+                )
             except Exception as e:
                 print(f"Error saving test customer: {e}")
         
@@ -625,7 +682,12 @@ def ai_status():
         'status': 'active',
         'provider': ai_engine.active_provider,
         'available_providers': ai_engine.available_providers,
-        'message': f'AI engine running with {ai_engine.active_provider}'
+        'message': f'AI engine running with {ai_engine.active_provider}',
+        'usage': ai_engine.usage.snapshot(),
+        'cascade': {
+            'enabled': ai_engine.config.CASCADE_ENABLED,
+            'by_intent': ai_engine.cascade_stats
+        }
     })
 
 @app.route('/ai/test')
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Reply Speculator for VIV Clinic Bot
+Prepares the most likely follow-up reply while waiting for the user's next message
+
+When the bot asks for a phone number, the next message is almost always the
+number itself and the confirmation reply is predictable. The speculator builds
+that reply on a low-priority background thread and serves it instantly if the
+user answers as predicted, discarding it otherwise.
+
+A generation that calls a model returns its token usage with the reply; it is
+charged to the UsageTracker when the generation completes, whether or not the
+reply is ever served.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, Union
+
+def _lower_thread_priority():
+    """Run speculative work at a lower OS priority where supported (Linux)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+class ReplySpeculator:
+    """Per-user speculative replies with hit-rate and wasted-work accounting"""
+
+    def __init__(self, ttl_seconds: int = 600, usage=None):
+        self.ttl_seconds = ttl_seconds
+        self.usage = usage  # UsageTracker that model calls made while speculating are charged to
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="reply-speculator",
+            initializer=_lower_thread_priority
+        )
+        self._pending = {}
+        # Re-entrant: cancelling a queued speculation runs its done callback under the lock
+        self._lock = threading.RLock()
+        self.stats = {
+            "predicted": 0,
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "generation_seconds": 0.0,
+            "wasted_generations": 0,
+            "wasted_seconds": 0.0,
+            "generation_cost_usd": 0.0,
+            "wasted_cost_usd": 0.0
+        }
+
+    def speculate(self, user_id: str, intent: str, generate: Callable[[], Union[str, Tuple[str, Tuple]]]):
+        """Start preparing the reply to serve if the user's next message matches intent
+
+        generate returns the reply, or (reply, usage) when it called a model, with usage
+        as (provider, model, input_tokens, output_tokens, cached_tokens).
+        """
+        entry = {"intent": intent, "created": time.time(), "seconds": 0.0, "discarded": False,
+                 "cost": 0.0, "charged": False}
+
+        def run():
+            start = time.perf_counter()
+            try:
+                return generate()
+            finally:
+                with self._lock:
+                    entry["seconds"] = time.perf_counter() - start
+                    self.stats["generation_seconds"] += entry["seconds"]
+                    if entry["discarded"]:
+                        self.stats["wasted_seconds"] += entry["seconds"]
+
+        # The callback may run right away, so it is added outside the lock
+        entry["future"] = self._executor.submit(run)
+        entry["future"].add_done_callback(lambda future: self._charge(user_id, entry, future))
+
+        with self._lock:
+            previous = self._pending.pop(user_id, None)
+            if previous:
+                self._discard(previous, "misses")
+            self._pending[user_id] = entry
+            self.stats["predicted"] += 1
+
+    def _charge(self, user_id: str, entry: Dict, future):
+        """Charge a completed generation's model usage, served or not"""
+        usage = None
+        if not future.cancelled() and future.exception() is None and isinstance(future.result(), tuple):
+            usage = future.result()[1]
+        cost = self.usage.record(usage[0], usage[1], user_id, *usage[2:]) if usage and self.usage else 0.0
+
+        with self._lock:
+            entry["cost"] = cost
+            entry["charged"] = True
+            self.stats["generation_cost_usd"] += cost
+            if entry["discarded"]:
+                self.stats["wasted_cost_usd"] += cost
+
+    def consume(self, user_id: str, intent: Optional[str], **values) -> Optional[str]:
+        """Return the prepared reply if intent matches the prediction, else discard it
+
+        Placeholders like {phone} in the prepared reply are filled from values.
+        """
+        with self._lock:
+            entry = self._pending.pop(user_id, None)
+            if entry is None:
+                return None
+
+            if time.time() - entry["created"] > self.ttl_seconds:
+                self._discard(entry, "expired")
+                return None
+
+            # Never block the reply on a speculation that is still running
+            future = entry["future"]
+            if entry["intent"] != intent or not future.done() or future.exception():
+                self._discard(entry, "misses")
+                return None
+
+            self.stats["hits"] += 1
+
+        reply = future.result()
+        if isinstance(reply, tuple):
+            reply = reply[0]
+        for key, value in values.items():
+            reply = reply.replace("{" + key + "}", str(value))
+        return reply
+
+    def _discard(self, entry: Dict, outcome: str):
+        """Drop a speculation and charge its generation time and cost as waste"""
+        self.stats[outcome] += 1
+        self.stats["wasted_generations"] += 1
+        entry["discarded"] = True
+        # A finished generation is charged now, a running one when it completes
+        if entry["future"].done() and not entry["future"].cancelled():
+            self.stats["wasted_seconds"] += entry["seconds"]
+        else:
+            entry["future"].cancel()
+        if entry["charged"]:
+            self.stats["wasted_cost_usd"] += entry["cost"]
+
+    def get_stats(self) -> Dict:
+        """Get speculation hit rate and wasted generation cost"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["pending"] = len(self._pending)
+
+        resolved = stats["hits"] + stats["misses"] + stats["expired"]
+        stats["hit_rate"] = round(stats["hits"] / resolved, 3) if resolved else 0.0
+        stats["generation_cost_usd"] = round(stats["generation_cost_usd"], 6)
+        stats["wasted_cost_usd"] = round(stats["wasted_cost_usd"], 6)
+        return stats
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Sheets Mirror for VIV Clinic
+Local copy of the customer inquiries sheet, so reads don't call the Sheets API
+
+The mirror keeps the sheet's rows as inquiry dicts in memory and, if given a
+cache file, on disk, so a restarted process can serve reads at once. A read
+refreshes it when it is older than max_age seconds. The values API has no
+last-modified time, so a refresh fetches the rows after the last one it has
+plus that last row again: if the last row still matches, only the new rows
+are added; if it changed or is gone, rows were edited or deleted and the
+whole sheet is fetched again. A full fetch also happens every full_every
+seconds to pick up edits further up, and on refresh(force=True).
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MAX_AGE = 30
+FULL_EVERY = 600
+FIRST_ROW = 2  # Row 1 holds the headers
+
+class SheetMirror:
+    """In-memory (and optionally on-disk) mirror of the inquiries sheet"""
+
+    def __init__(self, sheets_manager, cache_file: Optional[str] = "sheets_mirror.json",
+                 max_age: float = MAX_AGE, full_every: float = FULL_EVERY):
+        self.sheets = sheets_manager
+        self.headers = sheets_manager.headers
+        self.cache_file = Path(__file__).parent / cache_file if cache_file else None
+        self.max_age = max_age
+        self.full_every = full_every
+        self._lock = threading.Lock()
+        self.rows = []  # Raw sheet rows from FIRST_ROW on, padded to the headers
+        self.inquiries = []
+        self._searchable = []
+        self.refreshed_at = None
+        self._full_at = None
+        self.stats = {"refreshes": 0, "full_refreshes": 0, "skipped": 0, "fetches": 0,
+                      "rows_fetched": 0, "failures": 0, "last_refresh_ms": 0.0, "total_refresh_ms": 0.0}
+        self._load_cache()
+
+    def _pad(self, row: List) -> List:
+        return (list(row) + [''] * len(self.headers))[:len(self.headers)]
+
+    def _add_rows(self, rows: List[List]):
+        for row in rows:
+            row = self._pad(row)
+            inquiry = dict(zip(self.headers, row))
+            self.rows.append(row)
+            self.inquiries.append(inquiry)
+            self._searchable.append(self._search_text(inquiry))
+
+    def _search_text(self, inquiry: Dict) -> str:
+        return (inquiry["שם הלקוח"] + " " + inquiry["מספר טלפון"] + " " + inquiry["נושא התעניינות"]).lower()
+
+    def _replace_rows(self, rows: List[List]):
+        self.rows, self.inquiries, self._searchable = [], [], []
+        self._add_rows(rows)
+
+    def _load_cache(self):
+        if not self.cache_file or not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get("sheet_id") != self.sheets.sheet_id:
+                return
+            self._replace_rows(cache["rows"])
+            self.refreshed_at = cache["refreshed_at"]
+            self._full_at = cache["full_at"]
+        except Exception as e:
+            print(f"⚠️ Ignoring sheet mirror cache: {e}")
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        temp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({"sheet_id": self.sheets.sheet_id, "refreshed_at": self.refreshed_at,
+                       "full_at": self._full_at, "rows": self.rows}, f, ensure_ascii=False)
+        os.replace(temp_file, self.cache_file)
+
+    def _fetch(self, first_row: int) -> List[List]:
+        """Sheet rows from first_row to the end, read in concurrent chunks"""
+        self.stats["fetches"] += 1
+        rows = list(self.sheets.iter_values(first_row))
+        self.stats["rows_fetched"] += len(rows)
+        return rows
+
+    def refresh(self, force: bool = False) -> bool:
+        """Bring the mirror up to date if it is stale (or always, if forced); False if the sheet could not be read"""
+        with self._lock:
+            now = time.time()
+            if not force and self.refreshed_at is not None and now - self.refreshed_at < self.max_age:
+                self.stats["skipped"] += 1
+                return True
+
+            start = time.perf_counter()
+            try:
+                full = force or self._full_at is None or now - self._full_at >= self.full_every
+                if not full:
+                    # The last known row again, then anything after it
+                    last = len(self.rows)
+                    fetched = self._fetch(FIRST_ROW + last - 1) if last else self._fetch(FIRST_ROW)
+                    if last and (not fetched or self._pad(fetched[0]) != self.rows[-1]):
+                        full = True  # Edited or deleted rows: positions can't be trusted
+                    else:
+                        self._add_rows(fetched[1:] if last else fetched)
+                if full:
+                    self._replace_rows(self._fetch(FIRST_ROW))
+                    self._full_at = now
+                    self.stats["full_refreshes"] += 1
+                self.refreshed_at = now
+                self._save_cache()
+
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"❌ Error refreshing sheet mirror: {e}")
+                return False
+
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stats["refreshes"] += 1
+            self.stats["last_refresh_ms"] = round(elapsed, 2)
+            self.stats["total_refresh_ms"] += elapsed
+            return True
+
+    def set_status(self, row_number: int, status: str, notes: str = ""):
+        """Apply a status change made through this process, before it reaches the sheet"""
+        with self._lock:
+            index = row_number - FIRST_ROW
+            if 0 <= index < len(self.rows):
+                row = self.rows[index]
+                row[6] = status
+                if notes:
+                    row[7] = notes
+                self.inquiries[index] = dict(zip(self.headers, row))
+
+    def get_inquiries(self, limit: int = 50) -> List[Dict]:
+        """The first `limit` inquiries of the sheet"""
+        self.refresh()
+        with self._lock:
+            return [dict(inquiry) for inquiry in self.inquiries[:limit]]
+
+    def search(self, search_term: str) -> List[Dict]:
+        """Inquiries whose name, phone or topic contain the search term"""
+        self.refresh()
+        search_term = search_term.lower()
+        with self._lock:
+            return [dict(inquiry) for inquiry, text in zip(self.inquiries, self._searchable) if search_term in text]
+
+    def get_stats(self) -> Dict:
+        """Staleness and refresh cost"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["rows"] = len(self.rows)
+            stats["staleness_seconds"] = round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None
+            stats["since_full_refresh_seconds"] = round(time.time() - self._full_at, 1) if self._full_at else None
+        stats["total_refresh_ms"] = round(stats["total_refresh_ms"], 2)
+        return stats
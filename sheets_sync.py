@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Sheets Sync for VIV Clinic
+Write-behind sync of customer inquiries to Google Sheets
+
+New rows and status changes are appended to a queue file and the caller
+returns at once. A background worker sends them in batches: a run of new
+rows becomes one values:append request and the status changes one
+values:batchUpdate request (the last change to a row wins), up to
+batch_rows rows each. Requests are rate limited to stay inside the Sheets
+write quota and retried with backoff on 429 and 5xx answers.
+
+How far the queue has been sent is kept in a checkpoint file, so after a
+restart the worker resumes where it stopped. Delivery is at least once: a
+crash between a successful append and its checkpoint sends those rows again.
+Only one process drains the queue at a time; all processes may add to it.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from file_lock import FileLock
+
+APPEND, STATUS = "append", "status"
+BATCH_ROWS = 500
+REQUESTS_PER_MINUTE = 60  # Sheets API default write quota per user
+MAX_DELAY_MS = 1000
+MAX_BACKOFF = 60
+CLOSE_RETRIES = 5  # Per request, for the final flush in close()
+
+class RateLimiter:
+    """Token bucket: at most `per_minute` requests per minute, in bursts of up to `burst`"""
+
+    def __init__(self, per_minute: int = REQUESTS_PER_MINUTE, burst: int = 5):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request may be sent"""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                time.sleep((1 - self._tokens) / self.rate)
+
+def send_request(send, *args, limiter: RateLimiter, stats: Dict, stop=lambda: False,
+                 max_retries: Optional[int] = None):
+    """Send one Sheets request, waiting out rate limits and retrying failures with backoff
+
+    Raises if the request is refused for good, fails once stop() is true, or
+    fails after max_retries retries.
+    """
+    backoff = 1
+    retries = 0
+    while True:
+        limiter.acquire()
+        try:
+            response = send(*args)
+            if response.status_code == 200:
+                return response
+            retryable = response.status_code == 429 or response.status_code >= 500
+            try:
+                delay = float(response.headers.get('Retry-After') or backoff)
+            except ValueError:
+                delay = backoff
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+        except Exception as e:
+            retryable, delay, error = True, backoff, str(e)
+
+        if not retryable or stop() or (max_retries is not None and retries >= max_retries):
+            raise RuntimeError(error)
+        print(f"⚠️ Google Sheets sync retrying in {delay:.0f}s: {error}")
+        stats["retries"] = stats.get("retries", 0) + 1
+        retries += 1
+        time.sleep(delay)
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+class SheetsSync:
+    """Durable queue of sheet appends and status updates, sent in batches by a background worker"""
+
+    def __init__(self, sheets_manager, queue_file="sheets_sync.queue", batch_rows: int = BATCH_ROWS,
+                 requests_per_minute: int = REQUESTS_PER_MINUTE, max_delay_ms: int = MAX_DELAY_MS):
+        self.sheets = sheets_manager
+        self.queue_file = Path(__file__).parent / queue_file
+        self.checkpoint_file = self.queue_file.with_name(self.queue_file.name + '.checkpoint')
+        self._lock = FileLock(self.queue_file.with_name(self.queue_file.name + '.lock'))
+        self._drain_lock_file = self.queue_file.with_name(self.queue_file.name + '.drain')
+        self.batch_rows = batch_rows
+        self.max_delay = max_delay_ms / 1000
+        self.limiter = RateLimiter(requests_per_minute)
+
+        self._cond = threading.Condition()
+        self._drain_lock = threading.Lock()
+        self._closed = False
+        self._flushing = False  # The final flush in close() retries a bounded number of times
+        self._thread = None
+        self._queued = 0  # Changes this process queued since the last drain
+        self.stats = {"rows_appended": 0, "statuses_updated": 0, "append_requests": 0,
+                      "update_requests": 0, "retries": 0}
+
+    def add_row(self, row: List):
+        """Queue a new row for the end of the sheet"""
+        self._enqueue([APPEND, row])
+
+    def update_status(self, row_number: int, status: str, notes: str = ""):
+        """Queue a status (and notes) change for a sheet row; empty notes keep the row's notes"""
+        self._enqueue([STATUS, row_number, status, notes])
+
+    def _enqueue(self, op: List):
+        line = (json.dumps(op, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            with open(self.queue_file, 'ab') as f:
+                f.write(line)
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="sheets-sync", daemon=True)
+                self._thread.start()
+            self._queued += 1
+            if self._queued >= self.batch_rows:
+                self._cond.notify()
+
+    def _read_checkpoint(self) -> Dict:
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"offset": 0, "appended": 0}
+
+    def _write_checkpoint(self, offset: int, appended: int = 0):
+        """appended: the queue up to this offset has had its rows (not its status changes) sent"""
+        temp_file = self.checkpoint_file.with_name(self.checkpoint_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({"offset": offset, "appended": appended}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.checkpoint_file)
+
+    def _read_batch(self, offset: int, stop: Optional[int] = None):
+        """Ops from offset (to stop) on, up to batch_rows rows or status changes; returns (ops, end offset)"""
+        ops, appends, statuses = [], 0, 0
+        end = offset
+        try:
+            with open(self.queue_file, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Being written
+                    op = json.loads(line)
+                    if op[0] == APPEND:
+                        appends += 1
+                    else:
+                        statuses += 1
+                    ops.append(op)
+                    end += len(line)
+                    if appends >= self.batch_rows or statuses >= self.batch_rows or end == stop:
+                        break
+        except FileNotFoundError:
+            pass
+        return ops, end
+
+    def _send(self, send, *args):
+        if self._flushing:
+            send_request(send, *args, limiter=self.limiter, stats=self.stats, max_retries=CLOSE_RETRIES)
+        else:
+            send_request(send, *args, limiter=self.limiter, stats=self.stats, stop=lambda: self._closed)
+
+    def drain(self) -> int:
+        """Send everything queued so far; returns the number of ops sent"""
+        with self._drain_lock:
+            fd = None
+            try:
+                if fcntl is not None:
+                    fd = os.open(self._drain_lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        return 0  # Another process is draining
+                return self._drain()
+            finally:
+                if fd is not None:
+                    os.close(fd)
+
+    def _drain(self) -> int:
+        sent = 0
+        checkpoint = self._read_checkpoint()
+        offset, appended = checkpoint["offset"], checkpoint.get("appended", 0)
+        while True:
+            ops, end = self._read_batch(offset, appended if appended > offset else None)
+            if not ops:
+                break
+
+            rows = [op[1] for op in ops if op[0] == APPEND]
+            if rows and end > appended:
+                self._send(self.sheets.append_values, rows)
+                self._write_checkpoint(offset, end)
+                self.stats["rows_appended"] += len(rows)
+                self.stats["append_requests"] += 1
+
+            statuses = {}
+            for op in ops:
+                if op[0] == STATUS:
+                    status, notes = op[2:]
+                    # Empty notes keep the row's notes, including ones set earlier in this batch
+                    notes = notes or statuses.pop(op[1], ("", ""))[1]
+                    statuses.pop(op[1], None)
+                    statuses[op[1]] = (status, notes)
+            if statuses:
+                self._send(self.sheets.update_statuses, statuses)
+                self.stats["statuses_updated"] += len(statuses)
+                self.stats["update_requests"] += 1
+
+            self._write_checkpoint(end)
+            offset, appended = end, 0
+            sent += len(ops)
+
+        self._truncate_if_sent(offset)
+        return sent
+
+    def _truncate_if_sent(self, offset: int):
+        """Start a fresh queue once everything in it has been sent"""
+        if not offset:
+            return
+        with self._lock:
+            if self.queue_file.exists() and self.queue_file.stat().st_size == offset:
+                with open(self.queue_file, 'wb'):
+                    pass
+                self._write_checkpoint(0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Let a batch gather; waking every max_delay also picks up other processes' changes
+                deadline = time.monotonic() + self.max_delay
+                while self._queued < self.batch_rows and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                self._queued = 0
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"❌ Error syncing to Google Sheets: {e}")
+                time.sleep(self.max_delay)
+
+    def close(self, flush: bool = True) -> bool:
+        """Stop the background worker, sending what is queued first
+
+        Each request of the final flush is retried up to CLOSE_RETRIES times.
+        Returns False if it still failed; the unsent changes stay queued for the next start.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        if not flush:
+            return True
+        self._flushing = True
+        try:
+            self.drain()
+            return True
+        except Exception as e:
+            print(f"❌ Error syncing to Google Sheets: {e}")
+            return False
+        finally:
+            self._flushing = False
+
+    def pending(self) -> int:
+        """Queued bytes not yet sent"""
+        try:
+            size = self.queue_file.stat().st_size
+        except FileNotFoundError:
+            return 0
+        return max(size - self._read_checkpoint()["offset"], 0)
+
+    def get_stats(self) -> Dict:
+        """Rows and status changes sent, requests made and retries"""
+        stats = dict(self.stats)
+        requests_made = stats["append_requests"] + stats["update_requests"]
+        stats["pending_bytes"] = self.pending()
+        stats["rows_per_request"] = round((stats["rows_appended"] + stats["statuses_updated"]) / requests_made, 1) if requests_made else 0.0
+        return stats
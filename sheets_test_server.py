@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Sheets Test Server for VIV Clinic
+Local in-memory stand-in for the Google Sheets values API
+
+Serves the calls GoogleSheetsManager makes (tab list and addSheet, values
+get, values:append and values:batchUpdate) so the write-behind sync can be
+tried without a real sheet. It can also enforce a per-minute write quota (answering 429 with
+Retry-After), fail a share of writes with 503 and add latency to every
+request, like the round-trip to Google.
+
+Usage:
+    python sheets_test_server.py [--port 8099] [--quota 60] [--error-rate 0.1] [--latency-ms 80]
+    GOOGLE_SHEETS_BASE_URL=http://localhost:8099/v4/spreadsheets python google_sheets_manager.py
+"""
+
+import argparse
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from flask import Flask, jsonify, request
+
+_CELL = re.compile(r'([A-Z]+)(\d*)')
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number - 1
+
+def _tab_title(range_name):
+    """Tab a range is in ("'לקוחות'!A1:H1" -> לקוחות), None for the first tab"""
+    if '!' not in range_name:
+        return None
+    title = range_name.rsplit('!', 1)[0]
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title
+
+def _parse_range(range_name):
+    """'G5:H5' -> (first row, last row or None, first column, last column), 0-based"""
+    range_name = range_name.rsplit('!', 1)[-1]
+    start, _, end = range_name.partition(':')
+    start_column, start_row = _CELL.fullmatch(start).groups()
+    end_column, end_row = _CELL.fullmatch(end or start).groups()
+    first_row = int(start_row) - 1 if start_row else 0
+    last_row = int(end_row) - 1 if end_row else None
+    return first_row, last_row, _column_number(start_column), _column_number(end_column)
+
+def create_app(quota_per_minute=None, error_rate=0.0, latency_ms=0):
+    """Flask app holding the spreadsheets in memory: the first tab's rows by sheet id, other tabs by (id, title)"""
+    app = Flask(__name__)
+    sheets = {}
+    tabs = {}  # sheet id -> titles of the tabs after the first
+    writes = deque()
+    lock = threading.Lock()
+    app.stats = {"append_requests": 0, "update_requests": 0, "rows_appended": 0,
+                 "cells_updated": 0, "throttled": 0, "failed": 0}
+    app.sheets = sheets
+    app.tabs = tabs
+
+    def tab_rows(sheet_id, range_name, create=False):
+        """The rows of the tab a range is in (None if there is no such tab)"""
+        title = _tab_title(range_name)
+        if title is None or title == "Sheet1":
+            return sheets.setdefault(sheet_id, []) if create else sheets.get(sheet_id, [])
+        if title not in tabs.get(sheet_id, []):
+            return None
+        return sheets.setdefault((sheet_id, title), [])
+
+    @app.before_request
+    def add_latency():
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+    def refuse_write():
+        """A 429 or 503 response if this write is over quota or picked to fail, else None"""
+        now = time.monotonic()
+        while writes and writes[0] < now - 60:
+            writes.popleft()
+        if quota_per_minute and len(writes) >= quota_per_minute:
+            app.stats["throttled"] += 1
+            retry_after = int(writes[0] + 60 - now) + 1
+            return jsonify({"error": {"code": 429, "message": "Quota exceeded"}}), 429, {"Retry-After": str(retry_after)}
+        if error_rate and random.random() < error_rate:
+            app.stats["failed"] += 1
+            return jsonify({"error": {"code": 503, "message": "The service is currently unavailable."}}), 503
+        writes.append(now)
+        return None
+
+    @app.route('/v4/spreadsheets/<sheet_id>')
+    def get_sheet(sheet_id):
+        with lock:
+            titles = [None] + tabs.get(sheet_id, [])
+            # New sheets have a 1000-row grid
+            row_counts = [max(len(sheets.get(sheet_id if title is None else (sheet_id, title), [])), 1000)
+                          for title in titles]
+        return jsonify({"spreadsheetId": sheet_id, "sheets": [
+            {"properties": {"title": title or "Sheet1", "gridProperties": {"rowCount": row_count, "columnCount": 26}}}
+            for title, row_count in zip(titles, row_counts)
+        ]})
+
+    @app.route('/v4/spreadsheets/<sheet_id>:batchUpdate', methods=['POST'])
+    def add_tabs(sheet_id):
+        with lock:
+            for change in request.get_json()["requests"]:
+                title = change["addSheet"]["properties"]["title"]
+                if title == "Sheet1" or title in tabs.get(sheet_id, []):
+                    return jsonify({"error": {"code": 400, "message": f"A sheet with the name \"{title}\" already exists."}}), 400
+                tabs.setdefault(sheet_id, []).append(title)
+        return jsonify({"spreadsheetId": sheet_id, "replies": [{}]})
+
+    @app.route('/v4/spreadsheets/<sheet_id>/values/<path:range_name>', methods=['GET', 'POST'])
+    def values(sheet_id, range_name):
+        if request.method == 'GET':
+            first_row, last_row, first_column, last_column = _parse_range(range_name)
+            with lock:
+                rows = tab_rows(sheet_id, range_name)
+                if rows is None:
+                    return jsonify({"error": {"code": 400, "message": f"Unable to parse range: {range_name}"}}), 400
+                selected = [row[first_column:last_column + 1] for row in rows[first_row:None if last_row is None else last_row + 1]]
+            while selected and not selected[-1]:
+                selected.pop()  # Like Sheets, trailing empty rows are left out
+            return jsonify({"range": range_name, "values": selected} if selected else {"range": range_name})
+
+        with lock:
+            if not range_name.endswith(':append'):
+                return jsonify({"error": {"code": 404, "message": "Not found"}}), 404
+            rows = tab_rows(sheet_id, range_name[:-len(':append')], create=True)
+            if rows is None:
+                return jsonify({"error": {"code": 400, "message": f"Unable to parse range: {range_name}"}}), 400
+            refused = refuse_write()
+            if refused:
+                return refused
+            new_rows = request.get_json()["values"]
+            first = len(rows) + 1
+            rows.extend([list(row) for row in new_rows])
+            app.stats["append_requests"] += 1
+            app.stats["rows_appended"] += len(new_rows)
+            return jsonify({"updates": {"updatedRange": f"Sheet1!A{first}:H{len(rows)}", "updatedRows": len(new_rows)}})
+
+    @app.route('/v4/spreadsheets/<sheet_id>/values:batchUpdate', methods=['POST'])
+    def batch_update(sheet_id):
+        with lock:
+            data_list = request.get_json()["data"]
+            if any(tab_rows(sheet_id, data["range"]) is None for data in data_list):
+                return jsonify({"error": {"code": 400, "message": "Unable to parse range"}}), 400
+            refused = refuse_write()
+            if refused:
+                return refused
+            cells = 0
+            for data in data_list:
+                rows = tab_rows(sheet_id, data["range"], create=True)
+                first_row, _, first_column, _ = _parse_range(data["range"])
+                for i, values in enumerate(data["values"]):
+                    while len(rows) <= first_row + i:
+                        rows.append([])
+                    row = rows[first_row + i]
+                    row.extend([''] * (first_column + len(values) - len(row)))
+                    row[first_column:first_column + len(values)] = values
+                    cells += len(values)
+            app.stats["update_requests"] += 1
+            app.stats["cells_updated"] += cells
+            return jsonify({"spreadsheetId": sheet_id, "totalUpdatedCells": cells})
+
+    @app.route('/stats')
+    def stats():
+        return jsonify(app.stats)
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Google Sheets values API")
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--quota', type=int, default=None, help="Writes allowed per minute")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of writes answered with 503")
+    parser.add_argument('--latency-ms', type=int, default=0, help="Delay added to every request")
+    args = parser.parse_args()
+
+    print(f"📊 Sheets test server: http://localhost:{args.port}/v4/spreadsheets")
+    create_app(args.quota, args.error_rate, args.latency_ms).run(port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
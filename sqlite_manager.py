@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+SQLite Manager for VIV Clinic
+Customer storage in SQLite with the same interface as CSVManager
+
+Runs in WAL mode so readers never block the writer, with indexes on phone,
+date, source and status. Each thread gets its own connection, and sqlite3
+keeps the fixed SQL statements below prepared in its per-connection cache.
+"""
+
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from customer_keys import user_id_from_notes
+from phone_utils import national_phone
+from status_log import NOTES_SEPARATOR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL,
+    notes TEXT NOT NULL DEFAULT '',
+    user_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_customers_phone ON customers (phone);
+CREATE INDEX IF NOT EXISTS idx_customers_date ON customers (date);
+CREATE INDEX IF NOT EXISTS idx_customers_source ON customers (source);
+CREATE INDEX IF NOT EXISTS idx_customers_status ON customers (status);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# Column order matches CSVManager.headers
+# user_id (the Facebook user id, '' if none) follows the CSV columns
+INSERT_CUSTOMER = "INSERT INTO customers (date, name, phone, topic, source, status, notes, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+SELECT_RECENT = "SELECT date, name, phone, topic, source, status, notes FROM customers ORDER BY id DESC LIMIT ?"
+SELECT_ALL = "SELECT date, name, phone, topic, source, status, notes FROM customers ORDER BY id"
+SELECT_BY_PHONE = "SELECT date, name, phone, topic, source, status, notes FROM customers WHERE phone = ? ORDER BY id LIMIT 1"
+SELECT_KNOWN = "SELECT phone FROM customers WHERE (user_id = ? AND user_id != '') OR (phone = ? AND phone != '') ORDER BY id DESC LIMIT 1"
+UPDATE_STATUS = "UPDATE customers SET status = ? WHERE phone = ?"
+UPDATE_STATUS_NOTES = "UPDATE customers SET status = ?, notes = ? WHERE phone = ?"
+APPEND_NOTES = "UPDATE customers SET notes = CASE WHEN notes = '' THEN ? ELSE notes || ? || ? END WHERE phone = ?"
+COUNT_CUSTOMERS = "SELECT COUNT(*) FROM customers"
+COUNT_BY_SOURCE = "SELECT source, COUNT(*) FROM customers GROUP BY source"
+COUNT_BY_STATUS = "SELECT status, COUNT(*) FROM customers GROUP BY status"
+COUNT_BETWEEN_DATES = "SELECT COUNT(*) FROM customers WHERE date >= ? AND date < ?"
+
+class SQLiteManager:
+    def __init__(self, db_file="viv_clinic_customers.db", import_csv_file="viv_clinic_customers.csv"):
+        self.db_file = Path(__file__).parent / db_file
+        self.headers = [
+            "תאריך",
+            "שם",
+            "טלפון",
+            "נושא",
+            "מקור",
+            "סטטוס",
+            "הערות"
+        ]
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.init_db()
+
+        # One-shot migration of the existing CSV into a new, empty database
+        csv_path = Path(__file__).parent / import_csv_file if import_csv_file else None
+        if csv_path and csv_path.exists() and not self._get_meta("csv_imported"):
+            if not self._connection().execute(COUNT_CUSTOMERS).fetchone()[0]:
+                self.import_csv(csv_path)
+
+    def _connection(self):
+        """Get this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def init_db(self):
+        """Create the database schema if it doesn't exist"""
+        conn = self._connection()
+        with conn:
+            conn.executescript(SCHEMA)
+            self._migrate_user_id(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_user_id ON customers (user_id)")
+        print(f"✅ SQLite database ready: {self.db_file}")
+
+    def _migrate_user_id(self, conn):
+        """Add the user_id column to databases created without it, filled from the notes"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(customers)")]
+        if "user_id" in columns:
+            return
+        conn.execute("ALTER TABLE customers ADD COLUMN user_id TEXT NOT NULL DEFAULT ''")
+        rows = conn.execute("SELECT id, notes FROM customers WHERE notes LIKE '%Facebook User ID:%'").fetchall()
+        conn.executemany("UPDATE customers SET user_id = ? WHERE id = ?",
+                         [(user_id_from_notes(notes), row_id) for row_id, notes in rows])
+        print(f"✅ Added user_id column ({len(rows)} customers with a Facebook user id)")
+
+    def _get_meta(self, key):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def import_csv(self, csv_path):
+        """Import all customers from a CSVManager file, including pending status updates"""
+        try:
+            from csv_manager import CSVManager
+
+            csv_path = Path(csv_path)
+            manager = CSVManager(csv_path)
+            rows = [
+                [customer.get(header) or '' for header in self.headers]
+                for customer in manager.get_customers(limit=0)
+            ]
+            for row in rows:
+                row.append(user_id_from_notes(row[-1]))
+
+            conn = self._connection()
+            with self._write_lock, conn:
+                conn.executemany(INSERT_CUSTOMER, rows)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_imported', ?)",
+                    (f"{csv_path.name} ({len(rows)} rows, {datetime.now().isoformat(timespec='seconds')})",)
+                )
+
+            print(f"✅ Imported {len(rows)} customers from {csv_path.name}")
+            return len(rows)
+
+        except Exception as e:
+            print(f"❌ Error importing CSV: {e}")
+            return 0
+
+    def add_customer(self, name, phone, topic, source="Facebook", status="חדש", notes=""):
+        """Add new customer to the database"""
+        try:
+            date = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+            conn = self._connection()
+            with self._write_lock, conn:
+                conn.execute(INSERT_CUSTOMER, (date, name, phone, topic, source, status, notes, user_id_from_notes(notes)))
+
+            print(f"✅ Added customer: {name} - {phone}")
+            return True
+
+        except Exception as e:
+            print(f"❌ Error adding customer: {e}")
+            return False
+
+    def upsert_customer(self, name, phone, topic, source="Facebook", status="חדש", notes="", user_id=None):
+        """Add a customer unless one with this Facebook user id or phone exists (phones stored normalized)
+
+        A known customer who gives a different phone number gets a new row with it.
+        """
+        try:
+            date = datetime.now().strftime("%Y-%m-%d %H:%M")
+            phone = national_phone(phone) or phone
+            if user_id and not notes:
+                notes = f"Facebook User ID: {user_id}"
+
+            conn = self._connection()
+            with self._write_lock, conn:
+                if national_phone(phone):
+                    known = conn.execute(SELECT_KNOWN, ('', national_phone(phone))).fetchone()  # A number not stored yet gets its own row
+                else:
+                    known = conn.execute(SELECT_KNOWN, (user_id or '', '')).fetchone()
+                if known is None:
+                    conn.execute(INSERT_CUSTOMER, (date, name, phone, topic, source, status, notes,
+                                                   user_id or user_id_from_notes(notes)))
+                    print(f"✅ Added customer: {name} - {phone}")
+                else:
+                    print(f"✅ Customer already known: {name} - {known[0]}")
+            return True
+
+        except Exception as e:
+            print(f"❌ Error upserting customer: {e}")
+            return False
+
+    def _to_dict(self, row):
+        return dict(zip(self.headers, row))
+
+    def get_customers(self, limit=10):
+        """Get recent customers, oldest first like CSVManager"""
+        try:
+            conn = self._connection()
+            if limit <= 0:
+                return [self._to_dict(row) for row in conn.execute(SELECT_ALL)]
+
+            rows = conn.execute(SELECT_RECENT, (limit,)).fetchall()
+            rows.reverse()
+            return [self._to_dict(row) for row in rows]
+
+        except Exception as e:
+            print(f"❌ Error reading customers: {e}")
+            return []
+
+    def search_customer(self, phone):
+        """Search for customer by phone number"""
+        try:
+            row = self._connection().execute(SELECT_BY_PHONE, (phone,)).fetchone()
+            return self._to_dict(row) if row else None
+
+        except Exception as e:
+            print(f"❌ Error searching customer: {e}")
+            return None
+
+    def update_customer_status(self, phone, new_status, notes="", clear_notes=False):
+        """Update customer status; empty notes keep the current notes unless clear_notes"""
+        try:
+            conn = self._connection()
+            with self._write_lock, conn:
+                if notes or clear_notes:
+                    cursor = conn.execute(UPDATE_STATUS_NOTES, (new_status, notes, phone))
+                else:
+                    cursor = conn.execute(UPDATE_STATUS, (new_status, phone))
+
+            if not cursor.rowcount:
+                print(f"⚠️  Customer {phone} not found")
+                return False
+
+            print(f"✅ Updated customer {phone} status to: {new_status}")
+            return True
+
+        except Exception as e:
+            print(f"❌ Error updating customer: {e}")
+            return False
+
+    def append_customer_notes(self, additions):
+        """Append text to customers' notes, keeping each row's status and notes: additions maps phone -> text
+
+        Returns how many phones were found.
+        """
+        try:
+            conn = self._connection()
+            updated = 0
+            with self._write_lock, conn:
+                for phone, text in additions.items():
+                    cursor = conn.execute(APPEND_NOTES, (text, NOTES_SEPARATOR, text, phone))
+                    updated += cursor.rowcount > 0
+
+            print(f"✅ Added notes for {updated} of {len(additions)} customers")
+            return updated
+
+        except Exception as e:
+            print(f"❌ Error updating customer notes: {e}")
+            return 0
+
+    @contextmanager
+    def snapshot(self):
+        """Consistent view of the customers: this thread's connection inside a read transaction
+
+        Every query in the with block sees the database as of the first one; in
+        WAL mode writers are not blocked meanwhile. Only read in the block.
+        """
+        conn = self._connection()
+        if conn.in_transaction:
+            yield conn  # Already inside a snapshot or a write
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+
+    def iter_customer_rows(self, chunk_size=1000):
+        """Yield all customers as rows in header order, oldest first, chunk_size rows at a time"""
+        with self.snapshot() as conn:
+            cursor = conn.execute(SELECT_ALL)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield [list(row) for row in rows]
+
+    def export_to_google_sheets_format(self):
+        """Export all customers in format ready for Google Sheets import (headers first)"""
+        try:
+            sheets_data = [self.headers]
+            for chunk in self.iter_customer_rows():
+                sheets_data.extend(chunk)
+            return sheets_data
+
+        except Exception as e:
+            print(f"❌ Error exporting to Google Sheets format: {e}")
+            return []
+
+    def get_stats(self):
+        """Get customer statistics"""
+        try:
+            conn = self._connection()
+            today = datetime.now()
+            tomorrow = today + timedelta(days=1)
+
+            return {
+                "total_customers": conn.execute(COUNT_CUSTOMERS).fetchone()[0],
+                "sources": dict(conn.execute(COUNT_BY_SOURCE).fetchall()),
+                "statuses": dict(conn.execute(COUNT_BY_STATUS).fetchall()),
+                "recent_customers": conn.execute(
+                    COUNT_BETWEEN_DATES, (today.strftime("%Y-%m-%d"), tomorrow.strftime("%Y-%m-%d"))
+                ).fetchone()[0]
+            }
+
+        except Exception as e:
+            print(f"❌ Error getting stats: {e}")
+            return {}
+
+if __name__ == "__main__":
+    # python sqlite_manager.py [customers.csv] - create the database and import the CSV once
+    csv_name = sys.argv[1] if len(sys.argv) > 1 else "viv_clinic_customers.csv"
+    manager = SQLiteManager(import_csv_file=csv_name)
+
+    stats = manager.get_stats()
+    print(f"\n📊 Statistics:")
+    print(f"  Total customers: {stats['total_customers']}")
+    print(f"  Sources: {stats['sources']}")
+    print(f"  Statuses: {stats['statuses']}")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Status Log for VIV Clinic
+Append-only log of customer status/notes changes, merged into rows at read time
+
+Each entry applies to the rows with its phone that existed when the change was
+made, i.e. rows starting before the CSV size recorded in the entry. An entry
+without a status (null) adds text to each row's own notes and leaves the
+status alone, so background jobs never undo a change made meanwhile. The first
+line names the inode of the CSV the offsets refer to, so a log left over from
+before a compaction is never applied to the rewritten file.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+# Entry slots: phone, CSV size when logged, new status (None: notes only),
+# new notes ("" keeps notes, None clears them), time
+PHONE, BEFORE, STATUS, NOTES, TIMESTAMP = range(5)
+NOTES_SEPARATOR = " | "
+
+def join_notes(notes: str, text: str) -> str:
+    """Notes with text appended"""
+    return f"{notes}{NOTES_SEPARATOR}{text}" if notes else text
+
+class StatusLog:
+    """Pending status/notes updates for the customers CSV"""
+
+    def __init__(self, csv_file, phone_column: int, status_column: int, notes_column: int):
+        self.csv_file = Path(csv_file)
+        self.log_file = self.csv_file.with_name(self.csv_file.name + '.updates')
+        self.temp_file = self.log_file.with_name(self.log_file.name + '.tmp')
+        self.phone_column = phone_column
+        self.status_column = status_column
+        self.notes_column = notes_column
+        self.entries = []
+        self.by_phone = {}
+        self.log_pos = 0
+        self.log_inode = None
+
+    def load(self):
+        """Load pending updates for the current CSV file"""
+        base_inode = self.csv_file.stat().st_ino
+
+        # A compaction that stopped after swapping the CSV leaves the new log as .tmp
+        for candidate in (self.log_file, self.temp_file):
+            entries = self._read(candidate, base_inode)
+            if entries is not None:
+                if candidate == self.temp_file:
+                    os.replace(self.temp_file, self.log_file)
+                # Drop a torn final write so new entries start on a fresh line
+                if self.log_file.stat().st_size > self.log_pos:
+                    os.truncate(self.log_file, self.log_pos)
+                self._set_entries(entries)
+                self.log_inode = self.log_file.stat().st_ino
+                return
+
+        self.replace([], base_inode)
+
+    def _read(self, path: Path, base_inode: int):
+        """Read a log file's entries, or None if it is missing or for another CSV"""
+        if not path.exists():
+            return None
+        with open(path, 'rb') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return None
+            if header.get('base_inode') != base_inode:
+                return None
+            self.log_pos = f.tell()
+            return self._read_entries(f)
+
+    def _read_entries(self, f) -> List:
+        """Read complete entries from the current position of an open log file"""
+        entries = []
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # Torn or still being written
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+            self.log_pos += len(line)
+        return entries
+
+    def sync(self) -> Optional[List]:
+        """Read entries appended by other processes (not yet added to memory)
+
+        Returns None if the log file was replaced and must be reloaded.
+        """
+        if self.log_file.stat().st_ino != self.log_inode:
+            return None
+        with open(self.log_file, 'rb') as f:
+            f.seek(self.log_pos)
+            return self._read_entries(f)
+
+    def _set_entries(self, entries: List):
+        self.entries = entries
+        self.by_phone = {}
+        for entry in entries:
+            self.by_phone.setdefault(entry[PHONE], []).append(entry)
+
+    def write_file(self, path: Path, entries: List, base_inode: int):
+        """Write a complete log file for the CSV with the given inode"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'base_inode': base_inode}) + '\n')
+            f.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+
+    def replace(self, entries: List, base_inode: int):
+        """Atomically replace the log"""
+        self.write_file(self.temp_file, entries, base_inode)
+        self.install(entries)
+
+    def install(self, entries: List):
+        """Switch to the log already written to temp_file, e.g. after a compaction"""
+        self.log_pos = self.temp_file.stat().st_size
+        os.replace(self.temp_file, self.log_file)
+        self.log_inode = self.log_file.stat().st_ino
+        self._set_entries(entries)
+
+    def append(self, phone: str, before: int, status: Optional[str], notes: Optional[str] = ""):
+        """Log a status (and optionally notes) change for rows before `before`
+
+        Status None appends notes instead; notes None clears them.
+        """
+        entry = [phone, before, status, notes, datetime.now().isoformat(timespec='seconds')]
+        with open(self.log_file, 'ab') as f:
+            f.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+            self.log_pos = f.tell()
+        self.add_entry(entry)
+
+    def add_entry(self, entry: List):
+        """Add an entry that is already in the log file"""
+        self.entries.append(entry)
+        self.by_phone.setdefault(entry[PHONE], []).append(entry)
+
+    def apply(self, row: List, offset: int, by_phone=None) -> List:
+        """Merge pending updates into a parsed row that starts at offset"""
+        by_phone = self.by_phone if by_phone is None else by_phone
+        if not by_phone or len(row) <= max(self.phone_column, self.status_column):
+            return row
+        for entry in by_phone.get(row[self.phone_column], ()):
+            if offset < entry[BEFORE]:
+                if entry[STATUS] is None:
+                    if len(row) > self.notes_column:
+                        row[self.notes_column] = join_notes(row[self.notes_column], entry[NOTES])
+                    continue
+                row[self.status_column] = entry[STATUS]
+                if entry[NOTES] != "" and len(row) > self.notes_column:
+                    row[self.notes_column] = entry[NOTES] or ""
+        return row
+
+    def effective_status(self, phone: str, offset: int, status: str, by_phone=None) -> str:
+        """Get the status of the row at offset with pending updates applied"""
+        by_phone = self.by_phone if by_phone is None else by_phone
+        for entry in by_phone.get(phone, ()):
+            if offset < entry[BEFORE] and entry[STATUS] is not None:
+                status = entry[STATUS]
+        return status
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Test Google Sheets Manager for VIV Clinic
+Reads must authenticate like writes: a token-only setup has no API key
+"""
+
+from unittest import mock
+
+from google_sheets_manager import GoogleSheetsManager
+
+def _token_only_manager():
+    sheets = GoogleSheetsManager()
+    sheets.api_key = None
+    sheets.access_token = "test-token"
+    sheets.sheet_id = "test-sheet"
+    sheets.base_url = "http://sheets.invalid/v4/spreadsheets"
+    return sheets
+
+def _response(payload):
+    response = mock.Mock(status_code=200, text="")
+    response.json.return_value = payload
+    return response
+
+def test_token_only_reads_send_authorization():
+    """get_values and the tab lookup send the bearer token and no empty key"""
+    sheets = _token_only_manager()
+    tabs = {"sheets": [{"properties": {"title": "Sheet1", "gridProperties": {"rowCount": 3}}}]}
+
+    with mock.patch("google_sheets_manager.requests.get", return_value=_response(tabs)) as get:
+        assert sheets.get_row_count() == 3
+        sheets.get_values("A1:H1")
+
+    assert get.call_count == 2
+    for call in get.call_args_list:
+        assert call.kwargs["headers"] == {"Authorization": "Bearer test-token"}
+        assert "key" not in call.kwargs["params"]
+
+def test_token_only_ensure_sheet_reads_tabs_with_token():
+    sheets = _token_only_manager()
+    tabs = {"sheets": [{"properties": {"title": "לקוחות"}}]}
+
+    with mock.patch("google_sheets_manager.requests.get", return_value=_response(tabs)) as get, \
+            mock.patch("google_sheets_manager.requests.post") as post:
+        assert sheets.ensure_sheet("לקוחות")
+
+    assert get.call_args.kwargs["headers"] == {"Authorization": "Bearer test-token"}
+    post.assert_not_called()
+
+if __name__ == "__main__":
+    test_token_only_reads_send_authorization()
+    test_token_only_ensure_sheet_reads_tabs_with_token()
+    print("✅ Google Sheets manager tests passed")
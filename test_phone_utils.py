@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Test Phone Utils for VIV Clinic
+Numbers customers write normalize to one form; other digit strings are not phones
+"""
+
+from phone_utils import extract_phone, national_phone, normalize_phone
+
+def test_trunk_zero_after_country_code():
+    """+972 (0)50-... is accepted by extract_phone, so it must normalize to a valid number"""
+    for phone in ("+972 (0)50-123-4567", "00972-050-1234567", "+9720501234567"):
+        assert normalize_phone(phone) == "+972501234567", phone
+        assert national_phone(phone) == "0501234567", phone
+    assert extract_phone("הטלפון שלי +972 (0)50-123-4567") == "+972501234567"
+
+def test_long_digit_strings_need_an_explicit_prefix():
+    """Order and ID numbers are not phones; foreign numbers need + or 00"""
+    for digits in ("12345678901", "1234567890123", "123456789", "0123456789"):
+        assert national_phone(digits) == "", digits
+    assert normalize_phone("12345678901") == ""
+    assert national_phone("+1 555 123 4567") == "+15551234567"
+    assert national_phone("0015551234567") == "+15551234567"
+
+def test_israeli_forms():
+    for phone in ("050-1234567", "0501234567", "501234567", "972501234567", "+972-50-1234567"):
+        assert national_phone(phone) == "0501234567", phone
+    assert national_phone("03-1234567") == "031234567"
+
+if __name__ == "__main__":
+    test_trunk_zero_after_country_code()
+    test_long_digit_strings_need_an_explicit_prefix()
+    test_israeli_forms()
+    print("✅ Phone utils tests passed")
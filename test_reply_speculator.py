@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test Reply Speculator for VIV Clinic
+Model usage of a speculation is charged whether or not its reply is served
+"""
+
+import threading
+
+from reply_speculator import ReplySpeculator
+from usage_tracker import UsageTracker
+
+USAGE = ("gemini", "gemini-1.5-flash", 1000, 200, 0)
+
+def test_discarded_speculation_is_charged_when_it_finishes():
+    """The user answers before the generation completes; its usage still reaches the tracker"""
+    tracker = UsageTracker()
+    speculator = ReplySpeculator(usage=tracker)
+    release = threading.Event()
+
+    def generate():
+        release.wait(5)
+        return "תודה! קיבלנו את המספר {phone}", USAGE
+
+    speculator.speculate("user-1", "phone", generate)
+    assert speculator.consume("user-1", "phone", phone="0501234567") is None  # Still running
+    release.set()
+    speculator._executor.shutdown(wait=True)
+
+    cost = tracker.estimate_cost(*USAGE[1:])
+    stats = speculator.get_stats()
+    assert cost > 0
+    assert stats["generation_cost_usd"] == round(cost, 6)
+    assert stats["wasted_cost_usd"] == round(cost, 6)
+    assert tracker.user_summary("user-1")["requests"] == 1
+
+def test_served_speculation_is_charged_once():
+    tracker = UsageTracker()
+    speculator = ReplySpeculator(usage=tracker)
+    speculator.speculate("user-1", "phone", lambda: ("טלפון: {phone}", USAGE))
+    speculator._executor.submit(lambda: None).result()  # Let the generation finish
+
+    assert speculator.consume("user-1", "phone", phone="0501234567") == "טלפון: 0501234567"
+    stats = speculator.get_stats()
+    assert stats["wasted_cost_usd"] == 0.0
+    assert tracker.user_summary("user-1")["requests"] == 1
+
+if __name__ == "__main__":
+    test_discarded_speculation_is_charged_when_it_finishes()
+    test_served_speculation_is_charged_once()
+    print("✅ Reply speculator tests passed")
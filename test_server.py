@@ -5,12 +5,12 @@ Test server for VIV Clinic Facebook Bot
 
 from flask import Flask, request, jsonify
 from facebook_bot import FacebookBot
-from csv_manager import CSVManager
+from customer_store import get_customer_manager
 import json
 
 app = Flask(__name__)
 bot = FacebookBot()
-csv_manager = CSVManager()
+csv_manager = get_customer_manager()
 
 @app.route('/')
 def home():
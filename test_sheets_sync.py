@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Test Sheets Sync for VIV Clinic
+The shutdown flush retries a few times and reports whether everything was sent
+"""
+
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from sheets_sync import CLOSE_RETRIES, SheetsSync
+
+class _FlakySheets:
+    """Answers 429 to the first `failures` appends, then 200"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.rows = []
+
+    def append_values(self, rows):
+        if self.failures:
+            self.failures -= 1
+            return mock.Mock(status_code=429, headers={"Retry-After": "0"}, text="rate limited")
+        self.rows.extend(rows)
+        return mock.Mock(status_code=200)
+
+def _sync(sheets):
+    queue_file = Path(tempfile.mkdtemp()) / "test.queue"
+    return SheetsSync(sheets, str(queue_file), requests_per_minute=6000, max_delay_ms=60000)
+
+def test_close_retries_the_final_flush():
+    sheets = _FlakySheets(failures=2)
+    sync = _sync(sheets)
+    sync.add_row(["2026-10-19", "דנה", "0501234567"])
+
+    assert sync.close() is True
+    assert sheets.rows == [["2026-10-19", "דנה", "0501234567"]]
+    assert sync.pending() == 0
+
+def test_close_reports_a_failed_flush():
+    sheets = _FlakySheets(failures=CLOSE_RETRIES + 1)
+    sync = _sync(sheets)
+    sync.add_row(["2026-10-19", "דנה", "0501234567"])
+
+    assert sync.close() is False
+    assert sheets.rows == []
+    assert sync.pending() > 0
+
+if __name__ == "__main__":
+    test_close_retries_the_final_flush()
+    test_close_reports_a_failed_flush()
+    print("✅ Sheets sync tests passed")
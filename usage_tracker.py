@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Usage Tracker for VIV Clinic Bot
+Token and cost accounting per request, user and provider with daily budgets
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# Estimated USD price per 1M tokens: (input, output, cached input)
+MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50, 0.50),
+    'gpt-4o-mini': (0.15, 0.60, 0.075),
+    'gpt-4o': (2.50, 10.00, 1.25),
+    'gemini-pro': (0.50, 1.50, 0.50),
+    'gemini-1.5-flash': (0.075, 0.30, 0.01875),
+    'gemini-1.5-pro': (1.25, 5.00, 0.3125),
+    'claude-3-haiku-20240307': (0.25, 1.25, 0.03),
+    'claude-3-5-sonnet-20241022': (3.00, 15.00, 0.30),
+}
+
+# Used for models missing from the table so their cost is not silently zero
+DEFAULT_PRICE = (1.00, 3.00, 1.00)
+
+# Counter slots: requests, input tokens, output tokens, cached tokens, cost
+REQUESTS, INPUT, OUTPUT, CACHED, COST = range(5)
+
+def _new_counter():
+    return [0, 0, 0, 0, 0.0]
+
+def _counter_dict(counter) -> Dict:
+    return {
+        'requests': counter[REQUESTS],
+        'input_tokens': counter[INPUT],
+        'output_tokens': counter[OUTPUT],
+        'cached_tokens': counter[CACHED],
+        'cost_usd': round(counter[COST], 6)
+    }
+
+class UsageTracker:
+    """In-memory usage aggregator with periodic flush and budget checks"""
+
+    def __init__(self, log_file: Optional[str] = None, flush_interval: int = 60,
+                 user_daily_budget: float = 0.0, daily_budget: float = 0.0,
+                 degrade_ratio: float = 0.8):
+        self.log_file = Path(log_file) if log_file else None
+        self.flush_interval = flush_interval
+        self.user_daily_budget = user_daily_budget
+        self.daily_budget = daily_budget
+        self.degrade_ratio = degrade_ratio
+
+        self._lock = threading.Lock()
+        self._day = datetime.now().strftime("%Y-%m-%d")
+        self._totals = _new_counter()
+        self._by_provider = {}
+        self._by_model = {}
+        self._today = _new_counter()
+        self._today_by_user = {}
+        self._unflushed = {}
+        self._last_flush = time.time()
+
+    def estimate_cost(self, model: str, input_tokens: int, output_tokens: int,
+                      cached_tokens: int = 0) -> float:
+        """Estimate the USD cost of a request; cached tokens are billed at the cached rate"""
+        input_price, output_price, cached_price = MODEL_PRICES.get(model, DEFAULT_PRICE)
+        uncached = max(input_tokens - cached_tokens, 0)
+        return (uncached * input_price + cached_tokens * cached_price
+                + output_tokens * output_price) / 1_000_000
+
+    def record(self, provider: str, model: str, user_id: str, input_tokens: int,
+               output_tokens: int, cached_tokens: int = 0) -> float:
+        """Record one provider request and return its estimated cost"""
+        cost = self.estimate_cost(model, input_tokens, output_tokens, cached_tokens)
+        values = (1, input_tokens, output_tokens, cached_tokens, cost)
+
+        with self._lock:
+            self._roll_day()
+            counters = (
+                self._totals,
+                self._today,
+                self._by_provider.setdefault(provider, _new_counter()),
+                self._by_model.setdefault(model, _new_counter()),
+                self._today_by_user.setdefault(user_id, _new_counter()),
+                self._unflushed.setdefault((provider, model), _new_counter()),
+            )
+            for counter in counters:
+                for slot, value in enumerate(values):
+                    counter[slot] += value
+
+            should_flush = time.time() - self._last_flush >= self.flush_interval
+
+        if should_flush:
+            self.flush()
+        return cost
+
+    def _roll_day(self):
+        """Reset daily counters when the date changes (caller holds the lock)"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today != self._day:
+            self._day = today
+            self._today = _new_counter()
+            self._today_by_user = {}
+
+    def budget_state(self, user_id: str) -> str:
+        """Return 'ok', 'degrade' (use a cheaper model) or 'exhausted' (use fallback)"""
+        with self._lock:
+            self._roll_day()
+            user_cost = self._today_by_user.get(user_id, _new_counter())[COST]
+            day_cost = self._today[COST]
+
+        usage_ratio = 0.0
+        if self.user_daily_budget:
+            usage_ratio = max(usage_ratio, user_cost / self.user_daily_budget)
+        if self.daily_budget:
+            usage_ratio = max(usage_ratio, day_cost / self.daily_budget)
+
+        if usage_ratio >= 1.0:
+            return 'exhausted'
+        if usage_ratio >= self.degrade_ratio:
+            return 'degrade'
+        return 'ok'
+
+    def flush(self):
+        """Append usage accumulated since the last flush to the usage log"""
+        with self._lock:
+            pending, self._unflushed = self._unflushed, {}
+            self._last_flush = time.time()
+            day = self._day
+
+        if not pending or not self.log_file:
+            return
+
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                for (provider, model), counter in pending.items():
+                    entry = {'date': day, 'provider': provider, 'model': model}
+                    entry.update(_counter_dict(counter))
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except Exception as e:
+            print(f"❌ Error flushing AI usage: {e}")
+
+    def user_summary(self, user_id: str) -> Dict:
+        """Get today's usage for one user"""
+        with self._lock:
+            return _counter_dict(self._today_by_user.get(user_id, _new_counter()))
+
+    def snapshot(self) -> Dict:
+        """Get aggregated usage for status endpoints"""
+        with self._lock:
+            top_users = sorted(self._today_by_user.items(), key=lambda item: item[1][COST], reverse=True)[:10]
+            return {
+                'totals': _counter_dict(self._totals),
+                'today': dict(_counter_dict(self._today), date=self._day, users=len(self._today_by_user)),
+                'by_provider': {name: _counter_dict(c) for name, c in self._by_provider.items()},
+                'by_model': {name: _counter_dict(c) for name, c in self._by_model.items()},
+                'top_users_today': {user: _counter_dict(c) for user, c in top_users},
+                'budgets': {
+                    'user_daily_usd': self.user_daily_budget,
+                    'daily_usd': self.daily_budget,
+                    'degrade_ratio': self.degrade_ratio
+                }
+            }
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Write Buffer for VIV Clinic
+Group commit for customer inserts: rows from all request threads are written
+together every few milliseconds, or as soon as a batch fills up
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List
+
+class WriteBuffer:
+    """Write-behind buffer that hands batches of rows to a writer function"""
+
+    def __init__(self, write_rows: Callable[[List], None], max_rows: int = 100, max_delay_ms: int = 50):
+        self.write_rows = write_rows
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._rows = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self.stats = {"rows": 0, "batches": 0, "largest_batch": 0, "failed_batches": 0}
+
+        self._thread = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+        self._thread.start()
+
+    def add(self, row: List):
+        """Queue a row for the next batch"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write buffer is closed")
+            self._rows.append(row)
+            if len(self._rows) == 1 or len(self._rows) >= self.max_rows:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._rows and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+
+                # Let the batch fill up until it is full or the oldest row is due
+                deadline = time.monotonic() + self.max_delay
+                while len(self._rows) < self.max_rows and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            if not self.flush():
+                time.sleep(self.max_delay)  # Back off before retrying
+
+    def flush(self) -> bool:
+        """Write all queued rows now, in the order they were added"""
+        with self._write_lock:
+            with self._cond:
+                batch, self._rows = self._rows, []
+            if not batch:
+                return True
+
+            try:
+                self.write_rows(batch)
+            except Exception as e:
+                print(f"❌ Error writing {len(batch)} buffered rows: {e}")
+                with self._cond:
+                    self._rows[:0] = batch
+                    self.stats["failed_batches"] += 1
+                return False
+
+            with self._cond:
+                self.stats["rows"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            return True
+
+    def close(self):
+        """Stop the background writer and synchronously flush what is left"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._rows)
+
+    def get_stats(self) -> Dict:
+        """Get batch counts and sizes"""
+        with self._cond:
+            stats = dict(self.stats)
+            stats["pending"] = len(self._rows)
+        stats["average_batch"] = round(stats["rows"] / stats["batches"], 1) if stats["batches"] else 0.0
+        return stats